@@ -0,0 +1,220 @@
+import os
+import logging
+from datetime import timedelta
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.db.models import Q, F, Count, Max
+from django.utils import timezone
+
+from .models import AttemptAnalysis, QuizAnalysis
+from .services import (
+    analyze_weak_topics_with_ai, analyze_class_weak_topics_with_ai,
+    ANALYSIS_PROMPT_VERSION, CLASS_ANALYSIS_PROMPT_VERSION,
+)
+from .llm_client import GROK_MODEL
+from .scheduler import llm_user
+
+
+logger = logging.getLogger(__name__)
+
+# A running analysis whose worker died is picked up again after this long
+ANALYSIS_STALE_AFTER = int(os.getenv("AI_QUIZ_ANALYSIS_STALE_AFTER", 10 * 60))  # seconds
+
+
+def attempt_quiz_results(attempt) -> List[Dict[str, Any]]:
+    """The attempt's answers in the shape analyze_weak_topics_with_ai expects."""
+    from attempts.models import SavedAnswer
+
+    results = []
+    for sa in SavedAnswer.objects.filter(attempt=attempt).select_related("question"):
+        q = sa.question
+        option_text_map = q.options_by_letter()
+        results.append({
+            "question_id": q.id,
+            "question_text": q.text,
+            "selected_option": sa.selected_option,
+            "selected_option_text": option_text_map.get(sa.selected_option, ""),
+            "correct_option": q.correct_option,
+            "correct_option_text": option_text_map.get(q.correct_option, ""),
+            "is_correct": sa.selected_option == q.correct_option,
+        })
+    return results
+
+
+def is_current(analysis: AttemptAnalysis) -> bool:
+    return analysis.model == GROK_MODEL and analysis.prompt_version == ANALYSIS_PROMPT_VERSION
+
+
+def enqueue_attempt_analysis(attempt) -> AttemptAnalysis:
+    """
+    Queues the analysis of a freshly saved attempt for the generation workers, so
+    it is usually ready before anyone opens it. Runs inline with AI_QUIZ_JOBS_INLINE.
+    """
+    analysis, _ = AttemptAnalysis.objects.get_or_create(attempt=attempt)
+    if settings.AI_QUIZ_JOBS_INLINE:
+        claimed = claim_analysis(analysis)
+        if claimed:
+            run_analysis(claimed)
+    return analysis
+
+
+def _claimable():
+    stale = timezone.now() - timedelta(seconds=ANALYSIS_STALE_AFTER)
+    return Q(status=AttemptAnalysis.STATUS_QUEUED) | Q(status=AttemptAnalysis.STATUS_RUNNING, started_at__lt=stale)
+
+
+def claim_analysis(analysis: AttemptAnalysis) -> Optional[AttemptAnalysis]:
+    """Atomically moves a queued (or stale running) analysis to running. None if someone else has it."""
+    now = timezone.now()
+    claimed = AttemptAnalysis.objects.filter(_claimable(), id=analysis.id).update(
+        status=AttemptAnalysis.STATUS_RUNNING, started_at=now
+    )
+    if not claimed:
+        return None
+    analysis.status = AttemptAnalysis.STATUS_RUNNING
+    analysis.started_at = now
+    return analysis
+
+
+def claim_next_analysis() -> Optional[AttemptAnalysis]:
+    while True:
+        analysis = AttemptAnalysis.objects.filter(_claimable()).order_by("created_at", "id").first()
+        if analysis is None:
+            return None
+        claimed = claim_analysis(analysis)
+        if claimed:
+            return claimed
+
+
+def run_analysis(analysis: AttemptAnalysis) -> AttemptAnalysis:
+    """Calls the LLM for a claimed analysis and stores the outcome."""
+    logger.info(f"Analyzing attempt {analysis.attempt_id}")
+    try:
+        with llm_user(analysis.attempt.student_id):
+            result = analyze_weak_topics_with_ai(attempt_quiz_results(analysis.attempt), analysis.attempt.quiz_id)
+    except Exception as e:
+        logger.exception(f"Analysis of attempt {analysis.attempt_id} crashed")
+        result = {"success": False, "error": str(e)}
+
+    analysis.status = AttemptAnalysis.STATUS_SUCCEEDED if result.get("success") else AttemptAnalysis.STATUS_FAILED
+    analysis.result = result
+    analysis.nlp_metadata = result.get("nlp_metadata")
+    analysis.model = GROK_MODEL
+    analysis.prompt_version = ANALYSIS_PROMPT_VERSION
+    analysis.error = "" if result.get("success") else str(result.get("error", "unknown_error"))
+    analysis.finished_at = timezone.now()
+    analysis.save(update_fields=["status", "result", "nlp_metadata", "model", "prompt_version", "error", "finished_at"])
+    return analysis
+
+
+def get_attempt_analysis(attempt) -> AttemptAnalysis:
+    """
+    Returns the attempt's analysis, running it in this request if nobody has.
+    Failed and out-of-date (other model / prompt version) analyses are redone;
+    one another process is working on comes back with status "running".
+    """
+    analysis, _ = AttemptAnalysis.objects.get_or_create(attempt=attempt)
+
+    if analysis.status == AttemptAnalysis.STATUS_SUCCEEDED and is_current(analysis):
+        return analysis
+
+    if analysis.status in (AttemptAnalysis.STATUS_SUCCEEDED, AttemptAnalysis.STATUS_FAILED):
+        logger.info(f"Regenerating analysis of attempt {attempt.id} ({analysis.status}, {analysis.model} v{analysis.prompt_version})")
+        AttemptAnalysis.objects.filter(id=analysis.id, status=analysis.status).update(status=AttemptAnalysis.STATUS_QUEUED)
+
+    claimed = claim_analysis(analysis)
+    if claimed:
+        return run_analysis(claimed)
+
+    analysis.refresh_from_db()
+    return analysis
+
+
+def quiz_question_stats(quiz) -> List[Dict[str, Any]]:
+    """
+    Wrong answers across every attempt of `quiz`, counted in SQL per question and
+    chosen option (None = skipped). Most-missed questions first; questions nobody
+    got wrong are left out.
+    """
+    from attempts.models import SavedAnswer
+    from quiz.models import Question
+
+    answers = SavedAnswer.objects.filter(attempt__quiz=quiz)
+    answered = dict(answers.values("question_id").annotate(n=Count("id")).order_by().values_list("question_id", "n"))
+    wrong_rows = (
+        answers.exclude(selected_option=F("question__correct_option"))
+        .values("question_id", "selected_option")
+        .annotate(n=Count("id"))
+        .order_by("question_id", "-n")
+    )
+
+    wrong_choices = {}
+    for row in wrong_rows:
+        wrong_choices.setdefault(row["question_id"], []).append((row["selected_option"], row["n"]))
+    if not wrong_choices:
+        return []
+
+    questions = Question.objects.filter(quiz=quiz).order_by("id").only(
+        "id", "text", "option_a", "option_b", "option_c", "option_d", "correct_option", "question_type"
+    )
+    stats = []
+    for number, question in enumerate(questions, 1):
+        choices = wrong_choices.get(question.id)
+        if not choices:
+            continue
+        options = question.options_by_letter()
+        stats.append({
+            "number": number,
+            "question_id": question.id,
+            "question": question.text,
+            "question_type": question.question_type,
+            "answered": answered.get(question.id, 0),
+            "wrong": sum(n for _, n in choices),
+            "correct_option": question.correct_option,
+            "correct_text": options.get(question.correct_option, ""),
+            "wrong_choices": [
+                {"option": option, "text": options.get(option, "") if option else "", "count": n}
+                for option, n in choices
+            ],
+        })
+    stats.sort(key=lambda s: (-s["wrong"] / max(s["answered"], 1), -s["wrong"], s["number"]))
+    return stats
+
+
+def get_quiz_analysis(quiz) -> Dict[str, Any]:
+    """
+    Class-wide weak-topic analysis of `quiz`, one LLM call per quiz. The stored
+    result is reused until a new attempt arrives or the model / prompt version changes.
+    """
+    from attempts.models import Attempt
+
+    version = Attempt.objects.filter(quiz=quiz).aggregate(count=Count("id"), last_id=Max("id"))
+    stored = QuizAnalysis.objects.filter(quiz=quiz).first()
+    if (
+        stored is not None
+        and stored.attempts_count == version["count"]
+        and stored.last_attempt_id == version["last_id"]
+        and stored.model == GROK_MODEL
+        and stored.prompt_version == CLASS_ANALYSIS_PROMPT_VERSION
+    ):
+        return {**stored.result, "stored": True}
+
+    stats = quiz_question_stats(quiz)
+    result = analyze_class_weak_topics_with_ai(quiz.title, version["count"], stats)
+    if not result.get("success"):
+        return result
+
+    result["attempts_analyzed"] = version["count"]
+    result["question_stats"] = stats
+    QuizAnalysis.objects.update_or_create(
+        quiz=quiz,
+        defaults={
+            "result": result,
+            "attempts_count": version["count"],
+            "last_attempt_id": version["last_id"],
+            "model": GROK_MODEL,
+            "prompt_version": CLASS_ANALYSIS_PROMPT_VERSION,
+        },
+    )
+    return {**result, "stored": False}
@@ -0,0 +1,179 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Any, Dict, Optional
+
+from django.db import DatabaseError
+from django.utils import timezone
+
+
+logger = logging.getLogger(__name__)
+
+QUIZ_CACHE_TTL = int(os.getenv("AI_QUIZ_CACHE_TTL", 7 * 24 * 3600))  # seconds
+QUIZ_CACHE_MAX_ENTRIES = int(os.getenv("AI_QUIZ_CACHE_MAX_ENTRIES", 256))
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    Thread-safe in-process LRU cache where every entry also expires after `ttl` seconds.
+    Keeps hit/miss/eviction counters so callers can report how well it is doing.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._data),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+def normalize_source_text(text: str) -> str:
+    """Collapse whitespace so re-extracted or re-pasted text hashes the same."""
+    return " ".join((text or "").split())
+
+
+class QuizResultCache:
+    """
+    Two-tier cache for generate_quiz_with_ai results.
+
+    Keys are a SHA-256 over the normalized source text and every parameter that
+    changes the completion (question count, difficulty, model, temperature).
+    The first tier is an in-process LRU; the second is the GeneratedQuizCache
+    table, so results survive restarts and are shared between workers.
+    """
+
+    def __init__(self, max_entries: int = QUIZ_CACHE_MAX_ENTRIES, ttl: int = QUIZ_CACHE_TTL):
+        self.ttl = ttl
+        self.memory = LRUCache(max_entries=max_entries, ttl=ttl)
+        self.db_hits = 0
+        self.db_misses = 0
+
+    @staticmethod
+    def make_key(source_text: str, num_questions: int, difficulty: str, model: str, temperature: float, avoid_questions=None) -> str:
+        params = {
+            "text": normalize_source_text(source_text),
+            "num_questions": int(num_questions),
+            "difficulty": (difficulty or "").strip().lower(),
+            "model": model,
+            "temperature": float(temperature),
+        }
+        if avoid_questions:
+            params["avoid"] = [normalize_source_text(q) for q in avoid_questions]
+        material = json.dumps(params, sort_keys=True)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        result = self.memory.get(key)
+        if result is not None:
+            return result
+
+        result = self._db_get(key)
+        if result is None:
+            self.db_misses += 1
+            return None
+
+        self.db_hits += 1
+        self.memory.set(key, result)
+        return result
+
+    def set(self, key: str, result: Dict[str, Any]):
+        self.memory.set(key, result)
+        self._db_set(key, result)
+
+    def _db_get(self, key: str) -> Optional[Dict[str, Any]]:
+        from .models import GeneratedQuizCache
+
+        try:
+            entry = GeneratedQuizCache.objects.filter(key=key).first()
+            if entry is None:
+                return None
+            if entry.created_at < timezone.now() - timedelta(seconds=self.ttl):
+                entry.delete()
+                return None
+            return entry.result
+        except DatabaseError as e:
+            logger.warning(f"Quiz cache DB read failed: {e}")
+            return None
+
+    def _db_set(self, key: str, result: Dict[str, Any]):
+        from .models import GeneratedQuizCache
+
+        try:
+            GeneratedQuizCache.objects.update_or_create(
+                key=key,
+                defaults={"result": result, "created_at": timezone.now()},
+            )
+        except DatabaseError as e:
+            logger.warning(f"Quiz cache DB write failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        memory = self.memory.stats()
+        return {
+            "hits": memory["hits"] + self.db_hits,
+            "misses": self.db_misses,
+            "evictions": memory["evictions"],
+            "memory": memory,
+            "db": {"hits": self.db_hits, "misses": self.db_misses},
+        }
+
+
+quiz_cache = QuizResultCache()
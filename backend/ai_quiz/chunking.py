@@ -0,0 +1,126 @@
+import os
+import re
+from dataclasses import dataclass
+from typing import List, Tuple
+
+from .tokens import estimate_tokens, CHARS_PER_TOKEN
+
+
+CHUNK_TOKENS = int(os.getenv("AI_QUIZ_CHUNK_TOKENS", 3000))
+
+_KEYWORD_HEADING_RE = re.compile(r"^(?:chapter|section|unit|part|module|lesson)\s+[\w.-]+", re.IGNORECASE)
+_NUMBERED_HEADING_RE = re.compile(r"^\d+(?:\.\d+)*\.?\s+[A-Z]")  # "2.1 Photosynthesis"
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+@dataclass
+class Chunk:
+    index: int
+    text: str
+    tokens: int
+    heading: str = ""
+
+
+def _is_heading(line: str) -> bool:
+    line = line.strip()
+    if not line or len(line) > 80 or line.endswith((".", ",", ";", ":")):
+        return False
+    if _KEYWORD_HEADING_RE.match(line) or _NUMBERED_HEADING_RE.match(line):
+        return True
+    # "CELL STRUCTURE"-style all-caps titles
+    return sum(c.isalpha() for c in line) >= 4 and line.upper() == line
+
+
+def split_sections(text: str) -> List[Tuple[str, str]]:
+    """Splits text into (heading, body) sections at lines that look like headings."""
+    sections = []
+    heading = ""
+    body = []
+    for line in text.splitlines():
+        if _is_heading(line):
+            if any(part.strip() for part in body):
+                sections.append((heading, "\n".join(body).strip()))
+            heading = line.strip()
+            body = []
+        else:
+            body.append(line)
+    if any(part.strip() for part in body):
+        sections.append((heading, "\n".join(body).strip()))
+    return sections
+
+
+def _pieces_within_budget(text: str, max_tokens: int) -> List[str]:
+    """Breaks text into paragraph, then sentence, then hard character slices that each fit the budget."""
+    if estimate_tokens(text) <= max_tokens:
+        return [text]
+
+    pieces = []
+    for paragraph in _PARAGRAPH_RE.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if estimate_tokens(paragraph) <= max_tokens:
+            pieces.append(paragraph)
+            continue
+        for sentence in _SENTENCE_RE.split(paragraph):
+            if estimate_tokens(sentence) <= max_tokens:
+                pieces.append(sentence)
+                continue
+            step = max_tokens * CHARS_PER_TOKEN
+            pieces.extend(sentence[i:i + step] for i in range(0, len(sentence), step))
+    return pieces
+
+
+def split_into_chunks(text: str, max_tokens: int = CHUNK_TOKENS) -> List[Chunk]:
+    """
+    Packs the text into chunks of at most `max_tokens` (estimated), preferring to
+    break at section headings and then paragraph/sentence boundaries.
+    """
+    chunks = []
+    current = []
+    current_tokens = 0
+    current_heading = ""
+
+    def flush():
+        nonlocal current, current_tokens
+        if current:
+            body = "\n\n".join(current)
+            chunks.append(Chunk(index=len(chunks), text=body, tokens=estimate_tokens(body), heading=current_heading))
+        current = []
+        current_tokens = 0
+
+    for heading, body in split_sections(text):
+        # A new section starts a new chunk unless the current one is still mostly empty
+        if current and current_tokens >= max_tokens // 2:
+            flush()
+        for n, piece in enumerate(_pieces_within_budget(body, max_tokens)):
+            if n == 0 and heading:
+                piece = f"{heading}\n{piece}"
+            piece_tokens = estimate_tokens(piece)
+            if current and current_tokens + piece_tokens > max_tokens:
+                flush()
+            if not current:
+                current_heading = heading
+            current.append(piece)
+            current_tokens += piece_tokens
+    flush()
+    return chunks
+
+
+def allocate_questions(chunks: List[Chunk], num_questions: int) -> List[int]:
+    """
+    Splits num_questions across chunks in proportion to their size (largest
+    remainder method). With fewer questions than chunks, small chunks get none.
+    """
+    total = sum(c.tokens for c in chunks)
+    if not chunks or num_questions <= 0 or total == 0:
+        return [0] * len(chunks)
+
+    shares = [num_questions * c.tokens / total for c in chunks]
+    counts = [int(share) for share in shares]
+    leftover = num_questions - sum(counts)
+    by_remainder = sorted(range(len(chunks)), key=lambda i: shares[i] - counts[i], reverse=True)
+    for i in by_remainder[:leftover]:
+        counts[i] += 1
+    return counts
@@ -0,0 +1,189 @@
+import os
+import re
+import random
+import hashlib
+import logging
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db.models import Count, Max
+
+from .cache import LRUCache
+
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_THRESHOLD = float(os.getenv("AI_QUIZ_DUPLICATE_THRESHOLD", 0.6))
+MAX_TOPUP_ROUNDS = int(os.getenv("AI_QUIZ_MAX_TOPUP_ROUNDS", 2))
+
+# The question wording matters more than the options: two different questions
+# about the same four organelles must not look like duplicates.
+QUESTION_WEIGHT = 0.75
+
+NUM_PERM = 32
+BANDS = 16  # 16 bands x 2 rows: pairs above ~0.4 question similarity almost always share a bucket
+ROWS = NUM_PERM // BANDS
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(1729)  # fixed seed: signatures must be comparable across processes
+_PERMUTATIONS = [(_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME)) for _ in range(NUM_PERM)]
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_STOP_WORDS = frozenset({
+    "the", "a", "an", "of", "is", "are", "was", "were", "be", "which", "what", "following", "in", "on",
+    "to", "and", "or", "for", "with", "by", "does", "do", "did", "its", "it", "this", "that", "these",
+    "those", "as", "at", "from", "can", "not", "most", "best", "correct", "true", "statement",
+})
+
+
+def _terms(text: str) -> frozenset:
+    """Content words, lower-cased, with a plural/verb 's' stripped so 'absorbs' matches 'absorb'."""
+    terms = set()
+    for word in _WORD_RE.findall(str(text or "").lower()):
+        if word in _STOP_WORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        terms.add(word)
+    return frozenset(terms)
+
+
+def shingles(question: str, options: Iterable[str] = ()) -> Tuple[frozenset, frozenset]:
+    """(question terms, option terms) of a question."""
+    return _terms(question), _terms(" ".join(str(o) for o in options or ()))
+
+
+def _hash(shingle: str) -> int:
+    return int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def minhash(shingle_set: frozenset) -> Tuple[int, ...]:
+    if not shingle_set:
+        return tuple([_MERSENNE_PRIME] * NUM_PERM)
+    hashes = [_hash(s) for s in shingle_set]
+    return tuple(min([(a * h + b) % _MERSENNE_PRIME for h in hashes]) for a, b in _PERMUTATIONS)
+
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def similarity(a: Tuple[frozenset, frozenset], b: Tuple[frozenset, frozenset]) -> float:
+    """Weighted Jaccard of question terms and option terms."""
+    question_sim = jaccard(a[0], b[0])
+    if not a[1] or not b[1]:
+        return question_sim
+    return QUESTION_WEIGHT * question_sim + (1 - QUESTION_WEIGHT) * jaccard(a[1], b[1])
+
+
+class QuestionIndex:
+    """
+    MinHash/LSH index of questions. query() only compares against the few
+    entries whose question-term signature shares an LSH band with the new
+    question, then confirms with the exact weighted similarity.
+    """
+
+    def __init__(self, threshold: float = DUPLICATE_THRESHOLD):
+        self.threshold = threshold
+        self._buckets = defaultdict(set)
+        self._shingles: Dict[object, Tuple[frozenset, frozenset]] = {}
+        self._meta: Dict[object, dict] = {}
+
+    def __len__(self):
+        return len(self._shingles)
+
+    def _bands(self, signature):
+        for band in range(BANDS):
+            yield band, signature[band * ROWS:(band + 1) * ROWS]
+
+    def add(self, key, question: str, options: Iterable[str] = (), **meta):
+        shingle_sets = shingles(question, options)
+        self._shingles[key] = shingle_sets
+        self._meta[key] = meta
+        for band_key in self._bands(minhash(shingle_sets[0])):
+            self._buckets[band_key].add(key)
+
+    def query(self, question: str, options: Iterable[str] = ()) -> Optional[Tuple[object, float, dict]]:
+        """Returns (key, similarity, meta) of the closest indexed question at or above the threshold."""
+        shingle_sets = shingles(question, options)
+        candidates = set()
+        for band_key in self._bands(minhash(shingle_sets[0])):
+            candidates.update(self._buckets.get(band_key, ()))
+
+        best = None
+        for key in candidates:
+            score = similarity(shingle_sets, self._shingles[key])
+            if score >= self.threshold and (best is None or score > best[1]):
+                best = (key, score, self._meta[key])
+        return best
+
+
+def _question_options(q: dict) -> List[str]:
+    options = q.get("options")
+    return list(options) if isinstance(options, (list, tuple)) else []
+
+
+class TeacherQuestionIndexes:
+    """
+    Per-teacher indexes over their saved Question rows (tagged with quiz id),
+    kept in an LRU. Each lookup checks the teacher's question count / max id and
+    only indexes new rows; when the new rows don't account for the whole change
+    in count (a delete, even one followed by an add), the index is rebuilt.
+    """
+
+    FIELDS = ("id", "quiz_id", "text", "option_a", "option_b", "option_c", "option_d")
+
+    def __init__(self, max_entries: int = 64):
+        self._indexes = LRUCache(max_entries=max_entries)
+        self._lock = threading.Lock()
+
+    def get(self, teacher_id: int) -> QuestionIndex:
+        from quiz.models import Question
+
+        rows = Question.objects.filter(quiz__teacher_id=teacher_id)
+        version = rows.aggregate(count=Count("id"), max_id=Max("id"))
+
+        with self._lock:
+            entry = self._indexes.get(teacher_id)
+            if entry is None:
+                entry = {"index": QuestionIndex(), "count": 0, "max_id": 0}
+
+            if version["count"] != entry["count"] or (version["max_id"] or 0) != entry["max_id"]:
+                new_rows = list(rows.filter(id__gt=entry["max_id"]).values_list(*self.FIELDS))
+                if entry["count"] + len(new_rows) != version["count"]:
+                    entry = {"index": QuestionIndex(), "count": 0, "max_id": 0}
+                    new_rows = list(rows.values_list(*self.FIELDS))
+                for qid, quiz_id, text, *options in new_rows:
+                    entry["index"].add(qid, text, options, quiz_id=quiz_id)
+                    entry["max_id"] = max(entry["max_id"], qid)
+                entry["count"] += len(new_rows)
+
+            self._indexes.set(teacher_id, entry)
+            return entry["index"]
+
+
+teacher_indexes = TeacherQuestionIndexes()
+
+
+def filter_duplicates(questions: List[dict], index: QuestionIndex, batch_index: QuestionIndex = None):
+    """
+    Splits generated questions into (accepted, rejected). A question is rejected
+    if it is a near-duplicate of an indexed (saved) question or of one accepted
+    earlier in the same batch. Accepted questions are added to `batch_index`.
+    """
+    batch_index = batch_index if batch_index is not None else QuestionIndex(index.threshold)
+    accepted, rejected = [], []
+    for q in questions:
+        text, options = q.get("question", ""), _question_options(q)
+        match = index.query(text, options)
+        if match is None:
+            match = batch_index.query(text, options)
+        if match is not None:
+            key, similarity, meta = match
+            rejected.append({**q, "duplicate_of": {"id": key, "similarity": round(similarity, 2), **meta}})
+            continue
+        batch_index.add(f"new-{len(batch_index)}", text, options)
+        accepted.append(q)
+    return accepted, rejected
@@ -0,0 +1,83 @@
+import os
+import re
+from collections import Counter
+from typing import List, Optional
+
+from .features import STOP_WORDS
+
+
+# Requests for more questions than this are split into concurrent batches
+FANOUT_BATCH_SIZE = int(os.getenv("AI_QUIZ_FANOUT_BATCH_SIZE", 8))
+# An upper bound only: GROK_TOKENS_PER_MINUTE also caps it. A batch costs about
+# 2000-3000 tokens, so the default 6000/min runs 1-2 at a time; raise it for more.
+FANOUT_CONCURRENCY = int(os.getenv("AI_QUIZ_FANOUT_CONCURRENCY", 4))
+
+# Completion budget per question (JSON object plus explanation) and for the array around it
+TOKENS_PER_QUESTION = 300
+COMPLETION_OVERHEAD_TOKENS = 300
+MAX_COMPLETION_TOKENS = 4500
+
+# Angles handed out to batches so their questions don't overlap, even for a one-word topic
+ASPECTS = [
+    "definitions and key facts",
+    "processes and how things work",
+    "causes, effects and relationships",
+    "comparisons and differences",
+    "applications and real-world examples",
+    "exceptions, limits and common misconceptions",
+]
+TERMS_PER_HINT = 4
+
+_WORD_RE = re.compile(r"\b[a-z]{4,}\b")
+_GENERIC_WORDS = frozenset({
+    "that", "this", "these", "those", "with", "from", "into", "also", "have", "been", "their",
+    "they", "them", "than", "then", "when", "which", "while", "where", "there", "such", "each",
+    "other", "more", "most", "some", "many", "used", "using", "only", "both", "will", "would",
+    "could", "should", "about", "between", "through", "during", "after", "before", "generate",
+    "question", "questions", "topic", "passage", "title", "difficulty",
+})
+
+
+def completion_tokens(num_questions: int) -> int:
+    """max_tokens for a call generating `num_questions` questions."""
+    return min(MAX_COMPLETION_TOKENS, TOKENS_PER_QUESTION * num_questions + COMPLETION_OVERHEAD_TOKENS)
+
+
+def split_count(num_questions: int, batch_size: int = FANOUT_BATCH_SIZE) -> List[int]:
+    """Near-equal batch sizes of at most `batch_size`: 20 -> [7, 7, 6]."""
+    batches = -(-num_questions // max(1, batch_size))
+    base, extra = divmod(num_questions, batches)
+    return [base + (1 if i < extra else 0) for i in range(batches)]
+
+
+def subtopic_hints(source_text: str, batches: int) -> List[str]:
+    """
+    One focus per batch: a distinct aspect plus a distinct slice of the source's
+    most frequent content words, so concurrent batches cover different ground.
+    """
+    counts = Counter(
+        word for word in _WORD_RE.findall((source_text or "").lower())
+        if word not in STOP_WORDS and word not in _GENERIC_WORDS
+    )
+    terms = [term for term, _ in counts.most_common(batches * TERMS_PER_HINT)]
+
+    hints = []
+    for i in range(batches):
+        hint = ASPECTS[i % len(ASPECTS)]
+        own_terms = terms[i::batches][:TERMS_PER_HINT]
+        if own_terms:
+            hint += f", especially around: {', '.join(own_terms)}"
+        hints.append(hint)
+    return hints
+
+
+def fanout_workers(batches: int, call_tokens: int, tokens_per_minute: Optional[float]) -> int:
+    """
+    Threads to run `batches` with: FANOUT_CONCURRENCY at most, and no more
+    calls at once than the tokens/min budget admits (the rest would only queue).
+    With the default budget that is 1-2, so batches beyond that run in series.
+    """
+    workers = max(1, min(FANOUT_CONCURRENCY, batches))
+    if tokens_per_minute:
+        workers = min(workers, max(1, int(tokens_per_minute // max(call_tokens, 1))))
+    return workers
@@ -0,0 +1,92 @@
+import re
+from typing import Dict, List, Optional
+
+
+# Features weak-topic analysis needs from a question. They only depend on the
+# question text and options, so they are computed once when the Question is
+# saved (see quiz.models.Question.save) instead of on every analysis.
+
+MAX_KEY_TERMS = 10
+
+STOP_WORDS = frozenset({
+    "the", "a", "an", "is", "are", "was", "were", "in", "on", "at",
+    "to", "for", "of", "with", "by", "from", "what", "which", "how",
+})
+
+_TERM_RE = re.compile(r"\b[a-zA-Z]{3,}\b")
+
+# Checked in order; the first match wins. Word-prefix matches, so "explained"
+# counts as conceptual but "because" no longer counts as application ("use").
+QUESTION_TYPE_PATTERNS = [
+    ("conceptual", re.compile(r"\b(?:why|explain|describe)")),
+    ("computational", re.compile(r"\b(?:calculate|compute|solve)")),
+    ("comparative", re.compile(r"\b(?:compare|contrast|difference)")),
+    ("factual", re.compile(r"\b(?:when|where|who|what year)\b")),
+    ("application", re.compile(r"\b(?:apply|use|implement)")),
+]
+DEFAULT_QUESTION_TYPE = "general"
+
+OPTION_LETTERS = ("A", "B", "C", "D")
+
+
+def extract_key_terms(text: str) -> List[str]:
+    """First MAX_KEY_TERMS words of 3+ letters that are not stop words."""
+    terms = []
+    for word in _TERM_RE.findall((text or "").lower()):
+        if word not in STOP_WORDS:
+            terms.append(word)
+            if len(terms) == MAX_KEY_TERMS:
+                break
+    return terms
+
+
+def identify_question_type(question: str) -> str:
+    """Classify question type based on linguistic patterns"""
+    q_lower = (question or "").lower()
+    for question_type, pattern in QUESTION_TYPE_PATTERNS:
+        if pattern.search(q_lower):
+            return question_type
+    return DEFAULT_QUESTION_TYPE
+
+
+def answer_similarity(wrong_terms: Optional[List[str]], correct_terms: Optional[List[str]]) -> str:
+    """Error pattern from the key-term overlap of the chosen and the correct option."""
+    wrong_terms, correct_terms = set(wrong_terms or ()), set(correct_terms or ())
+    if not wrong_terms or not correct_terms:
+        return "fundamental_gap"
+
+    overlap = len(wrong_terms & correct_terms) / len(correct_terms)
+    if overlap > 0.5:
+        return "partial_understanding"  # Student has some related knowledge
+    elif overlap > 0.2:
+        return "confused_concepts"  # Student confusing similar concepts
+    return "fundamental_gap"  # Complete misunderstanding
+
+
+def question_features(text: str, options: Dict[str, str]) -> Dict[str, object]:
+    """
+    Everything analysis reads for one question:
+        {"key_terms": [...], "question_type": str, "option_terms": {"A": [...], ...}}
+    """
+    return {
+        "key_terms": extract_key_terms(text),
+        "question_type": identify_question_type(text),
+        "option_terms": {letter: extract_key_terms(option) for letter, option in options.items()},
+    }
+
+
+def load_question_features(question_ids, quiz_id: int) -> Dict[int, Dict[str, object]]:
+    """
+    Precomputed features of saved questions of quiz `quiz_id`, keyed by id, in one
+    query. Ids from other quizzes and questions not yet backfilled (empty
+    question_type) are left out so callers recompute them.
+    """
+    from quiz.models import Question
+
+    ids = {int(qid) for qid in question_ids if str(qid or "").isdigit()}
+    if not ids:
+        return {}
+    rows = Question.objects.filter(id__in=ids, quiz_id=quiz_id).exclude(question_type="").values(
+        "id", "key_terms", "question_type", "option_terms"
+    )
+    return {row.pop("id"): row for row in rows}
@@ -0,0 +1,185 @@
+import os
+import logging
+import threading
+from datetime import timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import GenerationJob
+from .services import generate_unique_quiz, extract_pdf_text, build_source_text
+from .analysis import claim_next_analysis, run_analysis
+from .scheduler import llm_user
+
+
+logger = logging.getLogger(__name__)
+
+# A running job whose worker died (deploy, OOM) is handed to another worker after this long
+JOB_STALE_AFTER = int(os.getenv("AI_QUIZ_JOB_STALE_AFTER", 15 * 60))  # seconds
+
+
+def enqueue_generation_job(teacher, title, topic, pdf_file, num_questions, difficulty, use_cache=True) -> GenerationJob:
+    """
+    Persists a GenerationJob for the workers to pick up.
+    With AI_QUIZ_JOBS_INLINE enabled (tests / local dev) the job is run right away in this process.
+    """
+    job = GenerationJob.objects.create(
+        teacher=teacher,
+        title=title or "",
+        topic=topic or "",
+        pdf=pdf_file,
+        num_questions=num_questions,
+        difficulty=difficulty,
+        use_cache=use_cache,
+    )
+
+    if settings.AI_QUIZ_JOBS_INLINE:
+        claimed = claim_job(job)
+        if claimed:
+            run_job(claimed)
+            job.refresh_from_db()
+
+    return job
+
+
+def _claimable():
+    stale = timezone.now() - timedelta(seconds=JOB_STALE_AFTER)
+    return Q(status=GenerationJob.STATUS_QUEUED) | Q(status=GenerationJob.STATUS_RUNNING, started_at__lt=stale)
+
+
+def claim_job(job: GenerationJob) -> Optional[GenerationJob]:
+    """
+    Atomically moves a queued (or stale running) job to running. Returns None if
+    another worker (or a cancellation) got there first.
+    """
+    now = timezone.now()
+    claimed = GenerationJob.objects.filter(_claimable(), id=job.id).update(
+        status=GenerationJob.STATUS_RUNNING, started_at=now
+    )
+    if not claimed:
+        return None
+    job.status = GenerationJob.STATUS_RUNNING
+    job.started_at = now
+    return job
+
+
+def claim_next_job() -> Optional[GenerationJob]:
+    """Claims the oldest queued or stale job, retrying if we lose the race for it."""
+    while True:
+        job = GenerationJob.objects.filter(_claimable()).order_by("created_at", "id").first()
+        if job is None:
+            return None
+        claimed = claim_job(job)
+        if claimed:
+            return claimed
+
+
+def _finish_job(job: GenerationJob, status: str, result=None, error: str = "") -> bool:
+    # Only the worker holding the current claim can finish the job: after a stale reclaim
+    # started_at is the new worker's, and the original one must neither write nor delete
+    # the upload the new one is reading. A job cancelled mid-flight keeps its cancelled status.
+    own_claim = GenerationJob.objects.filter(id=job.id, started_at=job.started_at)
+    finished = own_claim.filter(status=GenerationJob.STATUS_RUNNING).update(
+        status=status, result=result, error=error, finished_at=timezone.now()
+    )
+    if job.pdf and (finished or own_claim.filter(status=GenerationJob.STATUS_CANCELLED).exists()):
+        job.pdf.delete(save=False)
+    if not finished:
+        logger.info(f"Generation job {job.id} was cancelled or reclaimed; not recording this run")
+    return bool(finished)
+
+
+def is_cancelled(job: GenerationJob) -> bool:
+    return GenerationJob.objects.filter(id=job.id, status=GenerationJob.STATUS_CANCELLED).exists()
+
+
+def run_job(job: GenerationJob):
+    """Extracts the PDF (if any) and calls the LLM for a claimed job."""
+    logger.info(f"Running generation job {job.id}")
+    try:
+        pdf_text = ""
+        if job.pdf:
+            with job.pdf.open("rb") as pdf_file:
+                pdf_text = extract_pdf_text(pdf_file)
+
+        if not build_source_text(job.title, job.topic, pdf_text).strip():
+            _finish_job(job, GenerationJob.STATUS_FAILED, error="topic_or_pdf_required")
+            return
+
+        if is_cancelled(job):
+            logger.info(f"Generation job {job.id} cancelled before LLM call")
+            _finish_job(job, GenerationJob.STATUS_CANCELLED)
+            return
+
+        with llm_user(job.teacher_id):
+            result = generate_unique_quiz(
+                job.teacher_id, job.title, job.topic, pdf_text, job.num_questions, job.difficulty, use_cache=job.use_cache
+            )
+    except Exception as e:
+        logger.exception(f"Generation job {job.id} crashed")
+        _finish_job(job, GenerationJob.STATUS_FAILED, error=str(e))
+        return
+
+    if result.get("success"):
+        _finish_job(job, GenerationJob.STATUS_SUCCEEDED, result=result)
+    else:
+        _finish_job(job, GenerationJob.STATUS_FAILED, result=result, error=result.get("error", "unknown_error"))
+
+
+def cancel_job(job: GenerationJob) -> bool:
+    """Cancels a queued or running job. Returns False if it already finished."""
+    cancelled = GenerationJob.objects.filter(
+        id=job.id, status__in=[GenerationJob.STATUS_QUEUED, GenerationJob.STATUS_RUNNING]
+    ).update(status=GenerationJob.STATUS_CANCELLED, finished_at=timezone.now())
+    if cancelled and job.status == GenerationJob.STATUS_QUEUED and job.pdf:
+        # No worker will ever open this upload
+        job.pdf.delete(save=False)
+    return bool(cancelled)
+
+
+class WorkerPool:
+    """
+    A fixed number of threads polling the GenerationJob table, and the
+    AttemptAnalysis table when there is no quiz to generate.
+    The work is almost entirely I/O (PDF upload read + LLM HTTP call), so threads are enough.
+    """
+
+    def __init__(self, concurrency: int = None, poll_interval: float = None):
+        self.concurrency = concurrency or settings.AI_QUIZ_WORKER_CONCURRENCY
+        self.poll_interval = poll_interval or settings.AI_QUIZ_WORKER_POLL_INTERVAL
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        for i in range(self.concurrency):
+            thread = threading.Thread(target=self._work, name=f"generation-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = None):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+
+    def _work(self):
+        try:
+            while not self._stop.is_set():
+                close_old_connections()
+                job = claim_next_job()
+                if job is not None:
+                    run_job(job)
+                    continue
+                analysis = claim_next_analysis()
+                if analysis is not None:
+                    run_analysis(analysis)
+                    continue
+                self._stop.wait(self.poll_interval)
+        finally:
+            connection.close()
@@ -0,0 +1,357 @@
+import os
+import json
+import time
+import random
+import logging
+import threading
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Iterator, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .metrics import LatencyStats
+from .scheduler import LLMScheduler, RateLimitTimeout, estimate_call_tokens, estimate_prompt_tokens
+from .tokens import CHARS_PER_TOKEN
+
+
+logger = logging.getLogger(__name__)
+
+GROK_API_URL = os.getenv("GROK_API_URL", "https://api.groq.com/openai/v1/chat/completions")
+GROK_API_KEY = os.getenv("GROK_API_KEY")
+GROK_MODEL = os.getenv("GROK_MODEL", "llama-3.1-8b-instant")
+
+GROK_POOL_SIZE = int(os.getenv("GROK_POOL_SIZE", 10))
+GROK_TIMEOUT = float(os.getenv("GROK_TIMEOUT", 60))  # seconds, per call including retries
+GROK_MAX_RETRIES = int(os.getenv("GROK_MAX_RETRIES", 3))
+GROK_BACKOFF_BASE = float(os.getenv("GROK_BACKOFF_BASE", 0.5))
+GROK_BACKOFF_MAX = float(os.getenv("GROK_BACKOFF_MAX", 8))
+GROK_BREAKER_THRESHOLD = int(os.getenv("GROK_BREAKER_THRESHOLD", 5))  # consecutive failed calls
+GROK_BREAKER_RESET = float(os.getenv("GROK_BREAKER_RESET", 30))  # seconds before a trial call
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    """
+    Raised by LLMClient when a call fails. `code` is one of:
+    timeout, connection_error, http_error, invalid_json, circuit_open, network_error,
+    rate_limited (our own scheduler found no upstream budget before the deadline).
+    """
+
+    def __init__(self, code: str, message: str, status_code: Optional[int] = None, response_text: str = ""):
+        super().__init__(message)
+        self.code = code
+        self.status_code = status_code
+        self.response_text = response_text
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failed calls so we fail fast while the
+    upstream is down, then lets a single trial call through after `reset_timeout`.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, threshold: int = GROK_BREAKER_THRESHOLD, reset_timeout: float = GROK_BREAKER_RESET):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True
+            # OPEN, or HALF_OPEN with the trial call still in flight
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"LLM circuit breaker opened after {self.failures} failure(s)")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+def _retry_after_seconds(resp) -> Optional[float]:
+    value = resp.headers.get("Retry-After") if resp is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class LLMClient:
+    """
+    Shared client for the OpenAI-compatible chat-completions endpoint.
+
+    All calls go through one pooled requests.Session so TCP/TLS connections are
+    kept alive between calls. Transient failures (429/5xx, timeouts, dropped
+    connections) are retried with jittered exponential backoff, honoring
+    Retry-After, until the per-call deadline runs out. Every attempt first
+    waits for budget in the rate-limit scheduler (see ai_quiz.scheduler).
+    """
+
+    def __init__(
+        self,
+        api_url: str = GROK_API_URL,
+        api_key: Optional[str] = GROK_API_KEY,
+        pool_size: int = GROK_POOL_SIZE,
+        timeout: float = GROK_TIMEOUT,
+        max_retries: int = GROK_MAX_RETRIES,
+        backoff_base: float = GROK_BACKOFF_BASE,
+        backoff_max: float = GROK_BACKOFF_MAX,
+        breaker: Optional[CircuitBreaker] = None,
+        scheduler: Optional[LLMScheduler] = None,
+    ):
+        self.api_url = api_url
+        self.api_key = api_key
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self.scheduler = scheduler or LLMScheduler()
+        self.latency = LatencyStats()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+        })
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.api_key)
+
+    def _backoff(self, attempt: int, resp=None) -> float:
+        retry_after = _retry_after_seconds(resp)
+        if retry_after is not None:
+            return retry_after
+        # "Full jitter": spreads out retries from many workers hitting the same 429
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _send(self, payload: Dict[str, Any], label: str, deadline: Optional[float], stream: bool = False):
+        """
+        Runs the retry loop and returns (response, started, attempts_retried, ends_at,
+        tokens_charged) for the first successful response. Raises LLMError on failure.
+        """
+        # Queueing for rate-limit budget has its own timeout; the call deadline starts once admitted
+        charged = self._admit(label, estimate_call_tokens(payload))
+        started = time.monotonic()
+        ends_at = started + (deadline if deadline is not None else self.timeout)
+        attempt = 0
+
+        if not self.breaker.allow():
+            self.scheduler.release(charged)
+            self.latency.record(label, 0.0, ok=False, retries=0)
+            raise LLMError("circuit_open", "AI service is temporarily unavailable (circuit open)")
+
+        resp = None
+        try:
+            while True:
+                resp = None
+                error = None
+                remaining = ends_at - time.monotonic()
+                try:
+                    resp = self.session.post(self.api_url, json=payload, timeout=max(remaining, 0.1), stream=stream)
+                    if resp.status_code in RETRY_STATUS_CODES:
+                        error = LLMError(
+                            "http_error", f"AI service error: {resp.status_code}",
+                            status_code=resp.status_code, response_text=resp.text[:500],
+                        )
+                    else:
+                        resp.raise_for_status()
+                except requests.exceptions.Timeout as e:
+                    error = LLMError("timeout", f"Request timed out: {e}")
+                except requests.exceptions.ConnectionError as e:
+                    error = LLMError("connection_error", f"Connection error: {e}")
+                except requests.exceptions.HTTPError as e:
+                    # Non-retryable 4xx: our request is wrong, the upstream is fine
+                    self.breaker.record_success()
+                    self._record(label, started, ok=False, retries=attempt)
+                    raise LLMError(
+                        "http_error", f"AI service error: {resp.status_code}",
+                        status_code=resp.status_code, response_text=resp.text[:500],
+                    ) from e
+                except requests.exceptions.RequestException as e:
+                    error = LLMError("network_error", str(e))
+
+                if error is None:
+                    # The caller now owns the response and settles the reservation
+                    return resp, started, attempt, ends_at, charged
+                if resp is not None:
+                    # In stream mode an unread error response would keep its pooled connection
+                    resp.close()
+
+                wait = self._backoff(attempt, resp)
+                if error.status_code == 429:
+                    # Our buckets were optimistic (other clients share the key): hold everyone back too
+                    self.scheduler.pause(wait)
+                if attempt >= self.max_retries or time.monotonic() + wait >= ends_at:
+                    if error.status_code == 429:
+                        # Rate limited: the upstream is up, we are just over budget
+                        self.breaker.record_success()
+                    else:
+                        self.breaker.record_failure()
+                    self._record(label, started, ok=False, retries=attempt)
+                    logger.error(f"LLM call '{label}' failed after {attempt + 1} attempt(s): {error}")
+                    raise error
+
+                logger.warning(f"LLM call '{label}' attempt {attempt + 1} failed ({error}); retrying in {wait:.2f}s")
+                time.sleep(wait)
+                attempt += 1
+                try:
+                    # A retry is another request against the requests/min budget
+                    self.scheduler.acquire(label, 0, timeout=max(ends_at - time.monotonic(), 0.0))
+                except RateLimitTimeout:
+                    if error.status_code == 429:
+                        self.breaker.record_success()
+                    else:
+                        self.breaker.record_failure()
+                    self._record(label, started, ok=False, retries=attempt)
+                    raise error
+        except BaseException:
+            if resp is not None:
+                resp.close()
+            # Admitted but failed: the prompt went out, no completion came back
+            self.scheduler.settle(charged, estimate_prompt_tokens(payload))
+            raise
+
+    def _admit(self, label: str, tokens: float, timeout: Optional[float] = None) -> float:
+        try:
+            return self.scheduler.acquire(label, tokens, timeout=timeout)
+        except RateLimitTimeout as e:
+            self.latency.record(label, 0.0, ok=False, retries=0)
+            raise LLMError("rate_limited", str(e)) from e
+
+    def chat(self, payload: Dict[str, Any], label: str = "chat", deadline: Optional[float] = None) -> Dict[str, Any]:
+        """
+        POSTs a chat-completions payload and returns the decoded JSON body.
+        `deadline` is the total seconds allowed for the call including retries.
+        Raises LLMError on failure.
+        """
+        resp, started, attempt, _, charged = self._send(payload, label, deadline)
+        self.breaker.record_success()
+        self._record(label, started, ok=True, retries=attempt)
+
+        total_tokens = None
+        try:
+            data = resp.json()
+            usage = data.get("usage") if isinstance(data, dict) else None
+            total_tokens = (usage or {}).get("total_tokens")
+            return data
+        except ValueError:
+            raise LLMError("invalid_json", "Invalid response from AI service", response_text=resp.text[:500])
+        finally:
+            resp.close()
+            if total_tokens is None:
+                # No usage block (or no JSON at all): settle on the local estimate of what was sent and received
+                total_tokens = estimate_prompt_tokens(payload) + len(resp.text) // CHARS_PER_TOKEN + 1
+            self.scheduler.settle(charged, total_tokens)
+
+    def stream_chat(self, payload: Dict[str, Any], label: str = "chat_stream", deadline: Optional[float] = None) -> Iterator[str]:
+        """
+        Same as chat() but requests `stream: true` and yields the content deltas as
+        they arrive. Retries only happen before the first byte; once tokens are
+        flowing a dropped connection raises LLMError.
+        """
+        resp, started, attempt, ends_at, charged = self._send({**payload, "stream": True}, label, deadline, stream=True)
+        first_token = True
+        streamed_chars = 0
+
+        try:
+            for line in resp.iter_lines(decode_unicode=True):
+                if time.monotonic() > ends_at:
+                    raise LLMError("timeout", "Streaming response exceeded its deadline")
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                try:
+                    chunk = json.loads(data)
+                except ValueError:
+                    logger.warning(f"Skipping undecodable stream chunk: {data[:200]}")
+                    continue
+                choices = chunk.get("choices") or [{}]
+                delta = (choices[0].get("delta") or {}).get("content") or ""
+                if delta:
+                    if first_token:
+                        self._record(f"{label}.first_token", started, ok=True, retries=attempt)
+                        first_token = False
+                    streamed_chars += len(delta)
+                    yield delta
+        except requests.exceptions.RequestException as e:
+            self.breaker.record_failure()
+            self._record(label, started, ok=False, retries=attempt)
+            raise LLMError("connection_error", f"Stream interrupted: {e}")
+        except GeneratorExit:
+            # The consumer went away (client disconnect, close()); the upstream was answering fine.
+            # Recording it matters when this stream was the half-open trial call.
+            self.breaker.record_success()
+            self._record(label, started, ok=True, retries=attempt)
+            raise
+        except Exception:
+            # The deadline LLMError and anything unexpected while decoding
+            self.breaker.record_failure()
+            self._record(label, started, ok=False, retries=attempt)
+            raise
+        else:
+            self.breaker.record_success()
+            self._record(label, started, ok=True, retries=attempt)
+        finally:
+            resp.close()
+            # Streams carry no usage block; settle on the local estimate of what was sent and received
+            self.scheduler.settle(charged, estimate_prompt_tokens(payload) + streamed_chars // CHARS_PER_TOKEN + 1)
+
+    def _record(self, label: str, started: float, ok: bool, retries: int):
+        self.latency.record(label, time.monotonic() - started, ok=ok, retries=retries)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "circuit": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "scheduler": self.scheduler.stats(),
+            "calls": self.latency.snapshot(),
+        }
+
+
+def completion_text(data: Any) -> str:
+    """Pulls the generated text out of a chat-completions response body."""
+    if isinstance(data, dict) and "choices" in data and data["choices"]:
+        choice = data["choices"][0]
+        return (
+            (choice.get("message") or {}).get("content")
+            or choice.get("text")
+            or ""
+        )
+    return ""
+
+
+llm_client = LLMClient()
@@ -0,0 +1,277 @@
+import re
+import json
+import time
+import random
+import logging
+import threading
+from collections import Counter, defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+from .tokens import CHARS_PER_TOKEN, estimate_tokens
+
+
+logger = logging.getLogger(__name__)
+
+# Stand-in for the Groq chat-completions API, for load tests and local development:
+#   python manage.py run_llm_stub --port 8199
+#   GROK_API_URL=http://127.0.0.1:8199/v1/chat/completions GROK_API_KEY=stub python manage.py runserver
+
+_GENERATE_RE = re.compile(r"Generate (\d+)")
+_REPAIR_ITEM_RE = re.compile(r'^\{"id": \d+, "problems"', re.M)
+_SOURCE_RE = re.compile(r'"""(.*?)"""', re.S)
+_WORD_RE = re.compile(r"\b[a-zA-Z]{5,}\b")
+_FALLBACK_WORDS = ["energy", "matrix", "enzyme", "vector", "climate", "protein", "circuit", "market", "theorem", "neuron"]
+
+
+class LatencyModel:
+    """
+    Time to first token, from a spec: "fixed:800", "uniform:300:1500" or
+    "lognormal:800:0.5" (median ms, sigma). Generation then runs at `tokens_per_second`.
+    """
+
+    def __init__(self, spec: str = "lognormal:600:0.4", tokens_per_second: float = 400):
+        kind, *params = spec.split(":")
+        values = [float(p) for p in params]
+        if kind == "fixed" and len(values) == 1:
+            self.low = self.high = values[0] / 1000
+        elif kind == "uniform" and len(values) == 2:
+            self.low, self.high = values[0] / 1000, values[1] / 1000
+        elif kind == "lognormal" and len(values) in (1, 2):
+            self.median, self.sigma = values[0] / 1000, (values[1] if len(values) == 2 else 0.4)
+        else:
+            raise ValueError(f"Bad latency spec '{spec}': use fixed:MS, uniform:MIN_MS:MAX_MS or lognormal:MEDIAN_MS[:SIGMA]")
+        self.kind = kind
+        self.tokens_per_second = tokens_per_second
+
+    def first_token(self) -> float:
+        if self.kind == "lognormal":
+            return self.median * random.lognormvariate(0, self.sigma)
+        return random.uniform(self.low, self.high)
+
+    def generation(self, tokens: int) -> float:
+        return tokens / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+
+class StubLLM:
+    """
+    Produces chat-completion responses: replayed from recordings when there are
+    any for the kind of call, otherwise synthesized (valid quiz JSON for
+    generation and repair prompts, a weak-topic analysis object otherwise).
+    Failure injection: 429s, 500s and completions truncated mid-array.
+    """
+
+    def __init__(self, latency: LatencyModel = None, rate_limit_rate: float = 0.0, server_error_rate: float = 0.0,
+                 truncate_rate: float = 0.0, retry_after: float = 1.0, recordings: Dict[str, List[str]] = None):
+        self.latency = latency or LatencyModel()
+        self.rate_limit_rate = rate_limit_rate
+        self.server_error_rate = server_error_rate
+        self.truncate_rate = truncate_rate
+        self.retry_after = retry_after
+        self.recordings = recordings or {}
+        self._replay_position = Counter()
+        self._lock = threading.Lock()
+        self._serial = 0
+        self.counts = defaultdict(int)
+
+    @staticmethod
+    def load_recordings(path: str) -> Dict[str, List[str]]:
+        """JSONL lines of {"kind": "generate|repair|analysis", "content": "..."} or full response bodies."""
+        recordings = defaultdict(list)
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if "choices" in record:
+                    content = (record["choices"][0].get("message") or {}).get("content", "")
+                    recordings[record.get("kind", "generate")].append(content)
+                else:
+                    recordings[record.get("kind", "generate")].append(record["content"])
+        return dict(recordings)
+
+    def _count(self, key: str):
+        with self._lock:
+            self.counts[key] += 1
+
+    def _next_serial(self) -> int:
+        with self._lock:
+            self._serial += 1
+            return self._serial
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.counts)
+
+    @staticmethod
+    def kind_of(payload: Dict[str, Any]) -> str:
+        prompt = str((payload.get("messages") or [{}])[-1].get("content", ""))
+        if _REPAIR_ITEM_RE.search(prompt):
+            return "repair"
+        if _GENERATE_RE.search(prompt):
+            return "generate"
+        return "analysis"
+
+    def injected_error(self) -> Optional[int]:
+        roll = random.random()
+        if roll < self.rate_limit_rate:
+            self._count("rate_limited")
+            return 429
+        if roll < self.rate_limit_rate + self.server_error_rate:
+            self._count("server_errors")
+            return 500
+        return None
+
+    def content_for(self, payload: Dict[str, Any], kind: str) -> str:
+        recorded = self.recordings.get(kind)
+        if recorded:
+            with self._lock:
+                index = self._replay_position[kind] % len(recorded)
+                self._replay_position[kind] += 1
+            return recorded[index]
+
+        prompt = str((payload.get("messages") or [{}])[-1].get("content", ""))
+        if kind == "analysis":
+            return json.dumps(self._analysis())
+        count = len(_REPAIR_ITEM_RE.findall(prompt)) if kind == "repair" else int(_GENERATE_RE.search(prompt).group(1))
+        source = _SOURCE_RE.search(prompt)
+        words = list(dict.fromkeys(w.lower() for w in _WORD_RE.findall(source.group(1) if source else ""))) or _FALLBACK_WORDS
+        questions = [self._question(words) for _ in range(count)]
+        if kind == "repair":
+            questions = [{"id": i, **q} for i, q in enumerate(questions)]
+        body = json.dumps(questions, indent=2)
+        if "response_format" in payload:
+            body = json.dumps({"questions": questions}, indent=2)
+        return body
+
+    def _question(self, words: List[str]) -> Dict[str, Any]:
+        n = self._next_serial()
+        picked = random.sample(words, min(len(words), 4)) + [f"item{n}", f"case{n}"]
+        return {
+            "question": f"Which statement about {picked[0]} and {picked[-2]} holds for {picked[-1]} under {picked[1 % len(picked)]}?",
+            "options": [f"{w} {picked[-2]} variant {letter}" for w, letter in zip((picked * 4)[:4], "ABCD")],
+            "answer": random.randrange(4),
+            "explanation": f"Stub explanation for {picked[-2]}.",
+        }
+
+    @staticmethod
+    def _analysis() -> Dict[str, Any]:
+        return {
+            "weak_topics": [{
+                "topic": "Stub topic",
+                "severity": "moderate",
+                "questions_affected": [1],
+                "description": "Synthesized by the LLM stub.",
+                "common_misconception": "None, this is a stub.",
+                "error_pattern": "partial_understanding",
+                "key_concepts_to_learn": ["stub"],
+                "study_recommendations": ["Review the material."],
+                "conceptual_relationships": "",
+            }],
+            "overall_analysis": "Synthesized by the LLM stub.",
+            "learning_style_recommendation": "Practice.",
+            "conceptual_clusters": [],
+            "priority_actions": ["Review the material."],
+            "estimated_study_time": "1 hour",
+        }
+
+    def complete(self, payload: Dict[str, Any]):
+        """(kind, content, finish_reason, usage) for one call, honouring max_tokens and truncate_rate."""
+        kind = self.kind_of(payload)
+        content = self.content_for(payload, kind)
+        finish_reason = "stop"
+
+        max_chars = int(payload.get("max_tokens") or 0) * CHARS_PER_TOKEN
+        if max_chars and len(content) > max_chars:
+            content, finish_reason = content[:max_chars], "length"
+        elif kind != "analysis" and random.random() < self.truncate_rate:
+            content, finish_reason = content[:random.randint(len(content) // 3, len(content) - 1)], "length"
+        if finish_reason == "length":
+            self._count("truncated")
+
+        prompt_tokens = sum(estimate_tokens(str(m.get("content", ""))) for m in payload.get("messages", []))
+        completion_tokens = estimate_tokens(content)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+        self._count(f"calls.{kind}")
+        return kind, content, finish_reason, usage
+
+
+def _handler(stub: StubLLM):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send_json(self, status: int, body: Dict[str, Any], headers: Dict[str, str] = None):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path.rstrip("/").endswith("/stats"):
+                self._send_json(200, stub.stats())
+            else:
+                self._send_json(404, {"error": "not_found"})
+
+        def do_POST(self):
+            try:
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            except ValueError:
+                self._send_json(400, {"error": {"message": "invalid JSON body"}})
+                return
+            stub._count("calls")
+
+            status = stub.injected_error()
+            if status:
+                time.sleep(stub.latency.first_token() / 4)
+                headers = {"Retry-After": str(stub.retry_after)} if status == 429 else None
+                self._send_json(status, {"error": {"message": f"stub injected {status}"}}, headers)
+                return
+
+            kind, content, finish_reason, usage = stub.complete(payload)
+            time.sleep(stub.latency.first_token())
+            if payload.get("stream"):
+                stub._count("streamed")
+                self._stream(content, finish_reason)
+                return
+            time.sleep(stub.latency.generation(usage["completion_tokens"]))
+            self._send_json(200, {
+                "id": f"stub-{stub._next_serial()}",
+                "object": "chat.completion",
+                "model": payload.get("model", "stub"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": finish_reason}],
+                "usage": usage,
+            })
+
+        def _stream(self, content: str, finish_reason: str):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            step = 16  # characters per delta, about 4 tokens
+            delay = stub.latency.generation(step // CHARS_PER_TOKEN)
+            try:
+                for i in range(0, len(content), step):
+                    chunk = {"choices": [{"index": 0, "delta": {"content": content[i:i + step]}, "finish_reason": None}]}
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                    time.sleep(delay)
+                last = {"choices": [{"index": 0, "delta": {}, "finish_reason": finish_reason}]}
+                self.wfile.write(f"data: {json.dumps(last)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            self.close_connection = True
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+    return Handler
+
+
+def make_server(stub: StubLLM, host: str = "127.0.0.1", port: int = 8199) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), _handler(stub))
+    server.daemon_threads = True
+    return server
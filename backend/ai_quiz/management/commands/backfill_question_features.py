@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from quiz.models import Question
+
+
+class Command(BaseCommand):
+    help = "Computes the NLP features weak-topic analysis reads (key terms, question type, option terms) for saved questions."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--all", action="store_true", help="Recompute every question, not only those missing features.")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        questions = Question.objects.order_by("id")
+        if not options["all"]:
+            questions = questions.filter(question_type="")
+
+        updated = 0
+        batch = []
+        for question in questions.iterator(chunk_size=batch_size):
+            question.compute_features()
+            batch.append(question)
+            if len(batch) >= batch_size:
+                updated += self._flush(batch)
+        updated += self._flush(batch)
+
+        self.stdout.write(self.style.SUCCESS(f"Computed features for {updated} question(s)."))
+
+    def _flush(self, batch):
+        Question.objects.bulk_update(batch, ["key_terms", "question_type", "option_terms"])
+        count = len(batch)
+        batch.clear()
+        return count
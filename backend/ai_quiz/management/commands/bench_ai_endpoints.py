@@ -0,0 +1,157 @@
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+from ai_quiz.metrics import LatencyStats
+
+
+ENDPOINTS = ("generate", "stream", "analyze")
+FINISHED_JOB_STATUSES = ("succeeded", "failed", "cancelled")
+
+TOPICS = [
+    "Photosynthesis: light reactions in the thylakoid, the Calvin cycle in the stroma, chlorophyll and carbon fixation.",
+    "Newton's laws of motion: inertia, force and acceleration, action and reaction, friction and momentum.",
+    "The French Revolution: the Estates-General, the storming of the Bastille, the Reign of Terror and Napoleon.",
+    "Cell division: mitosis phases, meiosis and crossing over, chromosomes, the cell cycle checkpoints.",
+]
+
+
+def sample_quiz_results(tag: str):
+    """Three answers, two wrong, in the shape the analysis endpoint takes as bare quiz_results."""
+    return [
+        {"question_text": f"Where does the Calvin cycle take place? ({tag})", "selected_option_text": "Thylakoid membrane",
+         "correct_option_text": "Stroma", "is_correct": False},
+        {"question_text": f"Which pigment absorbs most light energy? ({tag})", "selected_option_text": "Carotene",
+         "correct_option_text": "Chlorophyll", "is_correct": False},
+        {"question_text": "What gas do plants release?", "selected_option_text": "Oxygen",
+         "correct_option_text": "Oxygen", "is_correct": True},
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-tests the AI endpoints of a running backend at a given concurrency and reports "
+        "p50/p95/p99 latency, throughput and, with --stub-url, upstream LLM calls per request. "
+        "Run the backend against `manage.py run_llm_stub` to keep Groq (and its bill) out of it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+        parser.add_argument("--email", required=True, help="Teacher account to log in with.")
+        parser.add_argument("--password", required=True)
+        parser.add_argument("--endpoint", action="append", choices=ENDPOINTS, help="Repeatable; default: all.")
+        parser.add_argument("--requests", type=int, default=20, help="Requests per endpoint.")
+        parser.add_argument("--concurrency", type=int, default=4)
+        parser.add_argument("--num-questions", type=int, default=5)
+        parser.add_argument("--same-input", action="store_true",
+                            help="Send identical requests (measures caching / coalescing) instead of unique ones.")
+        parser.add_argument("--stub-url", help="LLM stub base URL, e.g. http://127.0.0.1:8199, to count upstream calls.")
+        parser.add_argument("--timeout", type=float, default=300, help="Seconds before one request counts as failed.")
+        parser.add_argument("--poll-interval", type=float, default=0.5, help="Generation job polling interval.")
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.base_url = options["base_url"].rstrip("/")
+        resp = requests.post(f"{self.base_url}/api/accounts/token/",
+                             json={"email": options["email"], "password": options["password"]}, timeout=30)
+        if resp.status_code != 200:
+            raise CommandError(f"Login failed ({resp.status_code}): {resp.text[:200]}")
+        self.headers = {"Authorization": f"Bearer {resp.json()['access']}"}
+
+        self.stdout.write(
+            f"{options['requests']} request(s) per endpoint, concurrency {options['concurrency']}, "
+            f"{'identical' if options['same_input'] else 'unique'} inputs\n"
+        )
+        self.stdout.write(f"{'endpoint':10} {'ok':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} {'req/s':>7} {'upstream':>9}  extra")
+        for endpoint in options["endpoint"] or ENDPOINTS:
+            self._run(endpoint)
+
+    def _upstream_calls(self):
+        if not self.options["stub_url"]:
+            return None
+        return requests.get(f"{self.options['stub_url'].rstrip('/')}/stats", timeout=10).json()
+
+    def _run(self, endpoint: str):
+        stats = LatencyStats(window=max(self.options["requests"], 1))
+        runner = getattr(self, f"_{endpoint}")
+        before = self._upstream_calls()
+
+        def one(i):
+            tag = "bench" if self.options["same_input"] else uuid.uuid4().hex[:8]
+            session = requests.Session()
+            session.headers.update(self.headers)
+            started = time.monotonic()
+            try:
+                ok = runner(session, i, tag, stats)
+            except requests.RequestException:
+                ok = False
+            stats.record(endpoint, time.monotonic() - started, ok=ok, retries=0)
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.options["concurrency"]) as pool:
+            list(pool.map(one, range(self.options["requests"])))
+        wall = time.monotonic() - started
+
+        after = self._upstream_calls()
+        upstream = "-"
+        if before is not None:
+            upstream = f"{(after.get('calls', 0) - before.get('calls', 0)) / max(self.options['requests'], 1):.2f}/req"
+
+        snapshot = stats.snapshot()
+        row = snapshot.get(endpoint, {"calls": 0, "errors": 0, "p50_ms": 0, "p95_ms": 0, "p99_ms": 0, "max_ms": 0})
+        extra = ""
+        if "stream.first_question" in snapshot:
+            extra = f"first question p50 {snapshot['stream.first_question']['p50_ms']:.0f} ms"
+        if before is not None:
+            kinds = {k: after.get(k, 0) - before.get(k, 0) for k in after if k != "calls" and after.get(k, 0) != before.get(k, 0)}
+            extra = (extra + f" {kinds}").strip()
+        self.stdout.write(
+            f"{endpoint:10} {row['calls'] - row['errors']:>3}/{row['calls']:<3} {row['p50_ms']:9.0f} {row['p95_ms']:9.0f} "
+            f"{row['p99_ms']:9.0f} {row['max_ms']:9.0f} {row['calls'] / wall if wall else 0:7.2f} {upstream:>9}  {extra}"
+        )
+
+    def _source(self, i: int, tag: str) -> dict:
+        return {
+            "title": f"Benchmark {tag}",
+            "topic": f"{TOPICS[i % len(TOPICS)]} ({tag})",
+            "num_questions": self.options["num_questions"],
+            "fresh": not self.options["same_input"],
+        }
+
+    def _generate(self, session, i, tag, stats) -> bool:
+        resp = session.post(f"{self.base_url}/api/ai/generate-quiz/", json=self._source(i, tag), timeout=self.options["timeout"])
+        if resp.status_code != 202:
+            return False
+        job_url = f"{self.base_url}/api/ai/generate-quiz/jobs/{resp.json()['job_id']}/"
+        deadline = time.monotonic() + self.options["timeout"]
+        while time.monotonic() < deadline:
+            job = session.get(job_url, timeout=self.options["timeout"]).json()
+            if job.get("status") in FINISHED_JOB_STATUSES:
+                return job["status"] == "succeeded"
+            time.sleep(self.options["poll_interval"])
+        return False
+
+    def _stream(self, session, i, tag, stats) -> bool:
+        started = time.monotonic()
+        with session.post(f"{self.base_url}/api/ai/generate-quiz/stream/", json=self._source(i, tag),
+                          stream=True, timeout=self.options["timeout"]) as resp:
+            if resp.status_code != 200:
+                return False
+            first = True
+            for line in resp.iter_lines(decode_unicode=True):
+                if line == "event: question" and first:
+                    stats.record("stream.first_question", time.monotonic() - started, ok=True, retries=0)
+                    first = False
+                elif line == "event: done":
+                    return True
+                elif line == "event: error":
+                    return False
+        return False
+
+    def _analyze(self, session, i, tag, stats) -> bool:
+        resp = session.post(f"{self.base_url}/api/ai/analyze-weak-topics/",
+                            json={"quiz_results": sample_quiz_results(tag)}, timeout=self.options["timeout"])
+        return resp.status_code == 200 and resp.json().get("success", False)
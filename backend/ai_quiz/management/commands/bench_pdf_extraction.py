@@ -0,0 +1,63 @@
+import time
+import statistics
+from pathlib import Path
+
+import pdfplumber
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ai_quiz.pdf_extraction import iter_pdf_pages, BACKENDS, PDF_WORKERS
+
+
+DEFAULT_PDF = Path(settings.BASE_DIR).parent / "AE2007.pdf"
+
+
+def legacy_extract(path):
+    """The original GenerateQuizAPIView.extract_pdf_text: serial pdfplumber with string concatenation."""
+    text = ""
+    with pdfplumber.open(path) as pdf:
+        for page in pdf.pages:
+            text += page.extract_text() or ""
+    return text.strip()
+
+
+class Command(BaseCommand):
+    help = "Benchmarks PDF text extraction backends against the legacy pdfplumber loop."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--file", default=str(DEFAULT_PDF), help="PDF to extract (default: AE2007.pdf).")
+        parser.add_argument("--repeat", type=int, default=3)
+        parser.add_argument("--workers", type=int, default=PDF_WORKERS)
+        parser.add_argument("--char-budget", type=int, default=0, help="0 = no budget.")
+
+    def _time(self, fn, repeat):
+        timings = []
+        result = ""
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = fn()
+            timings.append(time.perf_counter() - started)
+        return result, timings
+
+    def handle(self, *args, **options):
+        path = options["file"]
+        repeat = options["repeat"]
+        budget = options["char_budget"] or None
+
+        cases = [("legacy pdfplumber (serial)", lambda: legacy_extract(path))]
+        for backend in BACKENDS:
+            cases.append((f"{backend} (serial)", lambda b=backend: "\n".join(
+                iter_pdf_pages(path, backend=b, char_budget=budget, workers=1))))
+            if options["workers"] > 1:
+                cases.append((f"{backend} ({options['workers']} procs)", lambda b=backend: "\n".join(
+                    iter_pdf_pages(path, backend=b, char_budget=budget, workers=options["workers"]))))
+
+        self.stdout.write(f"File: {path} ({Path(path).stat().st_size / 1024:.0f} KB), {repeat} run(s) each\n")
+        self.stdout.write(f"{'case':32} {'median s':>9} {'min s':>8} {'chars':>9}")
+        baseline = None
+        for name, fn in cases:
+            text, timings = self._time(fn, repeat)
+            median = statistics.median(timings)
+            baseline = baseline or median
+            speedup = f"x{baseline / median:.1f}" if median else "-"
+            self.stdout.write(f"{name:32} {median:9.3f} {min(timings):8.3f} {len(text):9d}   {speedup}")
@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ai_quiz.jobs import WorkerPool
+
+
+class Command(BaseCommand):
+    help = "Runs background workers that process queued AI quiz generation jobs."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency", type=int, default=settings.AI_QUIZ_WORKER_CONCURRENCY,
+            help="Number of jobs processed in parallel.",
+        )
+        parser.add_argument(
+            "--poll-interval", type=float, default=settings.AI_QUIZ_WORKER_POLL_INTERVAL,
+            help="Seconds an idle worker waits before checking the queue again.",
+        )
+
+    def handle(self, *args, **options):
+        pool = WorkerPool(concurrency=options["concurrency"], poll_interval=options["poll_interval"])
+        pool.start()
+        self.stdout.write(self.style.SUCCESS(f"Started {pool.concurrency} generation worker(s). Ctrl+C to stop."))
+
+        try:
+            pool.join()
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping workers after their current job...")
+            pool.stop()
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ai_quiz.llm_stub import LatencyModel, StubLLM, make_server
+
+
+class Command(BaseCommand):
+    help = (
+        "Serves a local stand-in for the Groq chat-completions API. Point the backend at it with "
+        "GROK_API_URL=http://HOST:PORT/v1/chat/completions; GET /stats reports upstream call counts."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8199)
+        parser.add_argument("--latency", default="lognormal:600:0.4",
+                            help="Time to first token: fixed:MS, uniform:MIN_MS:MAX_MS or lognormal:MEDIAN_MS[:SIGMA].")
+        parser.add_argument("--tokens-per-second", type=float, default=400, help="Generation speed after the first token; 0 = instant.")
+        parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of calls answered with 429.")
+        parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with a 429.")
+        parser.add_argument("--server-error-rate", type=float, default=0.0, help="Fraction of calls answered with 500.")
+        parser.add_argument("--truncate-rate", type=float, default=0.0,
+                            help="Fraction of quiz completions cut off mid-array (max_tokens is always honoured).")
+        parser.add_argument("--replay", help="JSONL of recorded responses to replay instead of synthesizing.")
+
+    def handle(self, *args, **options):
+        try:
+            latency = LatencyModel(options["latency"], options["tokens_per_second"])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        stub = StubLLM(
+            latency=latency,
+            rate_limit_rate=options["rate_limit_rate"],
+            server_error_rate=options["server_error_rate"],
+            truncate_rate=options["truncate_rate"],
+            retry_after=options["retry_after"],
+            recordings=StubLLM.load_recordings(options["replay"]) if options["replay"] else None,
+        )
+        server = make_server(stub, options["host"], options["port"])
+        self.stdout.write(self.style.SUCCESS(
+            f"LLM stub on http://{options['host']}:{options['port']}/v1/chat/completions (Ctrl+C to stop)"
+        ))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write(f"Upstream calls: {stub.stats()}")
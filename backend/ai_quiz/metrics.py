@@ -0,0 +1,43 @@
+import threading
+from collections import deque, defaultdict
+from typing import Any, Dict
+
+
+class LatencyStats:
+    """Keeps the last `window` call latencies per label and reports percentiles."""
+
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self._samples = defaultdict(lambda: deque(maxlen=self.window))
+        self._counts = defaultdict(lambda: {"calls": 0, "errors": 0, "retries": 0})
+        self._lock = threading.Lock()
+
+    def record(self, label: str, latency: float, ok: bool, retries: int):
+        with self._lock:
+            self._samples[label].append(latency)
+            counts = self._counts[label]
+            counts["calls"] += 1
+            counts["retries"] += retries
+            if not ok:
+                counts["errors"] += 1
+
+    @staticmethod
+    def _percentile(ordered, pct: float) -> float:
+        if not ordered:
+            return 0.0
+        index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            result = {}
+            for label, samples in self._samples.items():
+                ordered = sorted(samples)
+                result[label] = {
+                    **self._counts[label],
+                    "p50_ms": round(self._percentile(ordered, 50) * 1000, 1),
+                    "p95_ms": round(self._percentile(ordered, 95) * 1000, 1),
+                    "p99_ms": round(self._percentile(ordered, 99) * 1000, 1),
+                    "max_ms": round(ordered[-1] * 1000, 1) if ordered else 0.0,
+                }
+            return result
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_quiz', '0003_extractedtext'),
+        ('attempts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttemptAnalysis',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], db_index=True, default='queued', max_length=10)),
+                ('result', models.JSONField(blank=True, null=True)),
+                ('nlp_metadata', models.JSONField(blank=True, null=True)),
+                ('model', models.CharField(blank=True, default='', max_length=100)),
+                ('prompt_version', models.CharField(blank=True, default='', max_length=20)),
+                ('error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('attempt', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='weak_topic_analysis', to='attempts.attempt')),
+            ],
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_quiz', '0004_attemptanalysis'),
+        ('quiz', '0002_question_features'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuizAnalysis',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('result', models.JSONField()),
+                ('attempts_count', models.PositiveIntegerField()),
+                ('last_attempt_id', models.BigIntegerField(blank=True, null=True)),
+                ('model', models.CharField(blank=True, default='', max_length=100)),
+                ('prompt_version', models.CharField(blank=True, default='', max_length=20)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('quiz', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='class_analysis', to='quiz.quiz')),
+            ],
+        ),
+    ]
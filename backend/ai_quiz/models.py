@@ -1,3 +1,109 @@
 from django.db import models
+from accounts.models import User
 
-# Create your models here.
+
+class GeneratedQuizCache(models.Model):
+    """Persistent tier of the generate_quiz_with_ai result cache (see ai_quiz.cache)."""
+    key = models.CharField(max_length=64, unique=True)  # sha256 of source text + params
+    result = models.JSONField()
+    created_at = models.DateTimeField()
+
+
+class GenerationJob(models.Model):
+    """A queued generate-quiz request, processed by `manage.py run_generation_workers`."""
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_SUCCEEDED = "succeeded"
+    STATUS_FAILED = "failed"
+    STATUS_CANCELLED = "cancelled"
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, "Queued"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_SUCCEEDED, "Succeeded"),
+        (STATUS_FAILED, "Failed"),
+        (STATUS_CANCELLED, "Cancelled"),
+    ]
+    FINISHED_STATUSES = (STATUS_SUCCEEDED, STATUS_FAILED, STATUS_CANCELLED)
+
+    teacher = models.ForeignKey(User, on_delete=models.CASCADE, related_name="generation_jobs")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_QUEUED, db_index=True)
+    title = models.CharField(max_length=255, blank=True, default="")
+    topic = models.TextField(blank=True, default="")
+    pdf = models.FileField(upload_to="generation_jobs/", null=True, blank=True)
+    num_questions = models.PositiveIntegerField(default=5)
+    difficulty = models.CharField(max_length=20, default="medium")
+    use_cache = models.BooleanField(default=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["created_at"]
+
+    @property
+    def is_finished(self):
+        return self.status in self.FINISHED_STATUSES
+
+
+class ExtractedText(models.Model):
+    """Content-addressed extracted source text (see ai_quiz.text_store)."""
+    key = models.CharField(max_length=64, unique=True)  # sha256 of the upload, or of "<source>:<id>"
+    source_type = models.CharField(max_length=20)  # "pdf", "youtube", ...
+    text = models.TextField()
+    size = models.PositiveIntegerField()  # bytes of text, for the size-bounded eviction
+    created_at = models.DateTimeField()
+    last_used_at = models.DateTimeField(db_index=True)
+
+
+class AttemptAnalysis(models.Model):
+    """
+    Stored weak-topic analysis of an Attempt (see ai_quiz.analysis). An attempt's
+    answers never change, so the analysis is only redone when `model` or
+    `prompt_version` no longer match the current ones.
+    """
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_SUCCEEDED = "succeeded"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, "Queued"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_SUCCEEDED, "Succeeded"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    attempt = models.OneToOneField("attempts.Attempt", on_delete=models.CASCADE, related_name="weak_topic_analysis")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_QUEUED, db_index=True)
+    result = models.JSONField(null=True, blank=True)
+    nlp_metadata = models.JSONField(null=True, blank=True)
+    model = models.CharField(max_length=100, blank=True, default="")
+    prompt_version = models.CharField(max_length=20, blank=True, default="")
+    error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+
+class QuizAnalysis(models.Model):
+    """
+    Class-wide weak-topic analysis of a quiz (see ai_quiz.analysis.get_quiz_analysis).
+    Valid while no attempt has been added since, and model / prompt version match.
+    """
+    quiz = models.OneToOneField("quiz.Quiz", on_delete=models.CASCADE, related_name="class_analysis")
+    result = models.JSONField()
+    attempts_count = models.PositiveIntegerField()
+    last_attempt_id = models.BigIntegerField(null=True, blank=True)
+    model = models.CharField(max_length=100, blank=True, default="")
+    prompt_version = models.CharField(max_length=20, blank=True, default="")
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class InflightRequest(models.Model):
+    """Cross-process single-flight lock and result slot for one request key (see ai_quiz.singleflight)."""
+    key = models.CharField(max_length=64, unique=True)
+    done = models.BooleanField(default=False)
+    result = models.JSONField(null=True, blank=True)
+    expires_at = models.DateTimeField(db_index=True)  # lease while running, result TTL once done
+    created_at = models.DateTimeField(auto_now_add=True)
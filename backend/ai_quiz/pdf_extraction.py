@@ -0,0 +1,204 @@
+import os
+import hashlib
+import logging
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
+from .text_store import content_key, text_store
+
+
+logger = logging.getLogger(__name__)
+
+PDF_BACKEND = os.getenv("AI_QUIZ_PDF_BACKEND", "pypdfium2")  # or "pdfplumber"
+PDF_MAX_BYTES = int(os.getenv("AI_QUIZ_PDF_MAX_BYTES", 50 * 1024 * 1024))
+PDF_MAX_PAGES = int(os.getenv("AI_QUIZ_PDF_MAX_PAGES", 500))
+PDF_CHAR_BUDGET = int(os.getenv("AI_QUIZ_PDF_CHAR_BUDGET", 400_000))  # ~100k tokens
+PDF_WORKERS = int(os.getenv("AI_QUIZ_PDF_WORKERS", os.cpu_count() or 1))
+PDF_PARALLEL_MIN_PAGES = 16   # below this a process pool costs more than it saves
+PDF_PAGES_PER_TASK = 8
+
+BACKENDS = ("pypdfium2", "pdfplumber")
+
+
+class PDFExtractionError(Exception):
+    pass
+
+
+class PDFTooLarge(PDFExtractionError):
+    pass
+
+
+@contextmanager
+def spill_to_tempfile(upload, max_bytes: int = PDF_MAX_BYTES):
+    """
+    Copies an uploaded file (Django UploadedFile / FieldFile / any file object) to a
+    temp file in chunks, so it never has to sit in memory as one bytes object,
+    hashing the bytes on the way. Yields (temp path, sha256 hex digest).
+    Raises PDFTooLarge past `max_bytes`.
+    """
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    try:
+        written = 0
+        digest = hashlib.sha256()
+        with os.fdopen(fd, "wb") as out:
+            if hasattr(upload, "seek"):
+                upload.seek(0)
+            chunks = upload.chunks() if hasattr(upload, "chunks") else iter(lambda: upload.read(64 * 1024), b"")
+            for chunk in chunks:
+                written += len(chunk)
+                if written > max_bytes:
+                    raise PDFTooLarge(f"PDF is larger than {max_bytes // (1024 * 1024)} MB")
+                digest.update(chunk)
+                out.write(chunk)
+        yield path, digest.hexdigest()
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _page_count(path: str, backend: str) -> int:
+    if backend == "pypdfium2":
+        import pypdfium2 as pdfium
+        pdf = pdfium.PdfDocument(path)
+        try:
+            return len(pdf)
+        finally:
+            pdf.close()
+
+    import pdfplumber
+    with pdfplumber.open(path) as pdf:
+        return len(pdf.pages)
+
+
+def _extract_page_range(path: str, backend: str, start: int, stop: int) -> List[str]:
+    """Extracts pages [start, stop). Module-level so it can run in a worker process."""
+    texts = []
+    if backend == "pypdfium2":
+        import pypdfium2 as pdfium
+        pdf = pdfium.PdfDocument(path)
+        try:
+            for i in range(start, stop):
+                page = pdf[i]
+                textpage = page.get_textpage()
+                texts.append((textpage.get_text_range() or "").replace("\r\n", "\n"))
+                textpage.close()
+                page.close()
+        finally:
+            pdf.close()
+        return texts
+
+    import pdfplumber
+    with pdfplumber.open(path) as pdf:
+        for i in range(start, stop):
+            page = pdf.pages[i]
+            texts.append(page.extract_text() or "")
+            page.flush_cache()  # pdfplumber otherwise keeps every parsed page alive
+    return texts
+
+
+def _resolve_backend(path: str, backend: str):
+    """Returns (backend, page_count), falling back to pdfplumber if the fast backend can't open the file."""
+    candidates = [backend] + [b for b in BACKENDS if b != backend]
+    last_error = None
+    for candidate in candidates:
+        try:
+            return candidate, _page_count(path, candidate)
+        except ImportError as e:
+            last_error = e
+        except Exception as e:
+            logger.warning(f"PDF backend {candidate} failed to open file: {e}")
+            last_error = e
+    raise PDFExtractionError(f"Could not open PDF: {last_error}")
+
+
+def iter_pdf_pages(
+    path: str,
+    backend: str = PDF_BACKEND,
+    max_pages: int = PDF_MAX_PAGES,
+    char_budget: Optional[int] = PDF_CHAR_BUDGET,
+    workers: int = PDF_WORKERS,
+) -> Iterator[str]:
+    """
+    Yields the text of each page in order. Large documents are extracted in a
+    process pool in batches of PDF_PAGES_PER_TASK pages. Stops early once
+    `char_budget` characters have been produced (the last page is cut to fit)
+    or after `max_pages` pages. Any failure surfaces as PDFExtractionError.
+    """
+    try:
+        yield from _iter_pdf_pages(path, backend, max_pages, char_budget, workers)
+    except PDFExtractionError:
+        raise
+    except Exception as e:
+        # Backend errors on a damaged page, a dead worker process (BrokenProcessPool), ...
+        raise PDFExtractionError(f"Could not extract PDF text: {e}") from e
+
+
+def _iter_pdf_pages(path: str, backend: str, max_pages: int, char_budget: Optional[int], workers: int) -> Iterator[str]:
+    backend, page_count = _resolve_backend(path, backend)
+    if page_count > max_pages:
+        logger.info(f"PDF has {page_count} pages; extracting the first {max_pages}")
+        page_count = max_pages
+
+    ranges = [(start, min(start + PDF_PAGES_PER_TASK, page_count)) for start in range(0, page_count, PDF_PAGES_PER_TASK)]
+    remaining = char_budget if char_budget else None
+
+    def budgeted(texts):
+        nonlocal remaining
+        for text in texts:
+            if remaining is not None:
+                text = text[:remaining]
+                remaining -= len(text)
+            yield text
+            if exhausted():
+                return
+
+    def exhausted():
+        return remaining is not None and remaining <= 0
+
+    if workers <= 1 or page_count < PDF_PARALLEL_MIN_PAGES:
+        for start, stop in ranges:
+            yield from budgeted(_extract_page_range(path, backend, start, stop))
+            if exhausted():
+                return
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Keep at most `workers * 2` batches in flight so an early cutoff wastes little work
+        pending = []
+        next_range = 0
+        try:
+            while pending or next_range < len(ranges):
+                while next_range < len(ranges) and len(pending) < workers * 2:
+                    start, stop = ranges[next_range]
+                    pending.append(pool.submit(_extract_page_range, path, backend, start, stop))
+                    next_range += 1
+                yield from budgeted(pending.pop(0).result())
+                if exhausted():
+                    logger.info("PDF character budget reached; skipping remaining pages")
+                    return
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def extract_text(upload, backend: str = PDF_BACKEND, char_budget: Optional[int] = PDF_CHAR_BUDGET,
+                 max_pages: int = PDF_MAX_PAGES) -> str:
+    """
+    Spills an upload to disk and returns its normalized text. The text is looked
+    up by the SHA-256 of the upload (and the extraction limits) first, so
+    re-uploads of the same file skip parsing. Raises PDFExtractionError.
+    """
+    try:
+        with spill_to_tempfile(upload) as (path, sha256):
+            # Text cut to one budget or page limit must not be served for another
+            key = content_key("pdf", f"{sha256}:{backend}:{char_budget}:{max_pages}")
+            return text_store.get_or_extract(
+                key, "pdf",
+                lambda: "\n".join(iter_pdf_pages(path, backend=backend, max_pages=max_pages, char_budget=char_budget)),
+            )
+    except OSError as e:
+        raise PDFExtractionError(f"Could not read PDF upload: {e}") from e
@@ -0,0 +1,118 @@
+import os
+import json
+from collections import Counter
+from typing import Any, Dict, List
+
+from .tokens import estimate_tokens
+
+
+# Upper bound for the question table in a weak-topic analysis prompt
+ANALYSIS_PROMPT_TOKENS = int(os.getenv("AI_QUIZ_ANALYSIS_PROMPT_TOKENS", 1500))
+CLUSTER_OVERLAP = 0.5  # key-term Jaccard at which two wrong answers count as the same weakness
+
+_PATTERN_CODES = {"partial_understanding": "P", "confused_concepts": "C", "fundamental_gap": "F", "unknown": "F"}
+TABLE_LEGEND = (
+    "One row per incorrect answer, '|' separated: #|type|pattern|question|student answer|correct answer|key terms|similar.\n"
+    "pattern: P=partial_understanding, C=confused_concepts, F=fundamental_gap. "
+    "'similar' lists other question numbers with the same key terms that were also answered wrong."
+)
+
+# Text budgets tried in order until the table fits (question chars, answer chars)
+_CLIP_STEPS = [(240, 100), (140, 60), (80, 40)]
+
+
+def clip_text(text, limit: int) -> str:
+    """Single-line `text`, cut to `limit` characters."""
+    text = " ".join(str(text or "").split())
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+
+def _cell(text, limit: int) -> str:
+    return clip_text(text, limit).replace("|", "/")
+
+
+def _row(q: Dict[str, Any], similar: List[int], question_chars: int, answer_chars: int) -> str:
+    return "|".join([
+        str(q["number"]),
+        q.get("question_type", "general"),
+        _PATTERN_CODES.get(q.get("error_pattern"), "F"),
+        _cell(q.get("question"), question_chars),
+        _cell(q.get("your_answer"), answer_chars),
+        _cell(q.get("correct_answer"), answer_chars),
+        ",".join(q.get("key_terms", [])[:6]),
+        ",".join(str(n) for n in similar),
+    ])
+
+
+def cluster_by_key_terms(questions: List[Dict[str, Any]], overlap: float = CLUSTER_OVERLAP) -> List[List[Dict[str, Any]]]:
+    """
+    Greedy single pass: each question joins the first cluster whose first member
+    shares at least `overlap` (Jaccard) of its key terms. Terms found in more than
+    half of the questions ("explain", "following", ...) are ignored since they
+    don't tell topics apart. Largest clusters first.
+    """
+    document_frequency = Counter(term for q in questions for term in set(q.get("key_terms", [])))
+    common = {term for term, n in document_frequency.items() if len(questions) >= 4 and n > len(questions) / 2}
+
+    clusters = []
+    for q in questions:
+        terms = set(q.get("key_terms", [])) - common
+        for cluster in clusters:
+            head = cluster[0]["_terms"]
+            if terms and head and len(terms & head) / len(terms | head) >= overlap:
+                cluster.append({**q, "_terms": terms})
+                break
+        else:
+            clusters.append([{**q, "_terms": terms}])
+    clusters.sort(key=len, reverse=True)
+    return [[{k: v for k, v in q.items() if k != "_terms"} for q in cluster] for cluster in clusters]
+
+
+def encode_questions(questions: List[Dict[str, Any]], budget: int = ANALYSIS_PROMPT_TOKENS) -> Dict[str, Any]:
+    """
+    Encodes analyze_weak_topics_with_ai's questions summary as a compact table of
+    at most ~`budget` tokens. Everything is sent when it fits. Otherwise questions
+    with overlapping key terms collapse into one row that lists the others as
+    'similar', texts get shorter, and finally the smallest clusters are left out.
+
+    Returns {"table", "tokens", "rows", "clustered", "omitted"}.
+    """
+    def fits(rows):
+        return estimate_tokens("\n".join(rows)) <= budget
+
+    question_chars, answer_chars = _CLIP_STEPS[0]
+    rows = [_row(q, [], question_chars, answer_chars) for q in questions]
+    clustered, omitted = False, 0
+
+    if not fits(rows):
+        clustered = True
+        clusters = cluster_by_key_terms(questions)
+        for question_chars, answer_chars in _CLIP_STEPS:
+            rows = [_row(c[0], [q["number"] for q in c[1:]], question_chars, answer_chars) for c in clusters]
+            if fits(rows):
+                break
+        else:
+            # Still too big: keep the largest clusters that fit
+            kept, used = [], 0
+            for row in rows:
+                cost = estimate_tokens(row) + 1
+                if used + cost > budget and kept:
+                    break
+                kept.append(row)
+                used += cost
+            omitted = sum(len(c) for c in clusters[len(kept):])
+            rows = kept
+
+    table = "\n".join(rows)
+    return {
+        "table": table,
+        "tokens": estimate_tokens(table),
+        "rows": len(rows),
+        "clustered": clustered,
+        "omitted": omitted,
+    }
+
+
+def legacy_prompt_tokens(questions: List[Dict[str, Any]]) -> int:
+    """Tokens the old json.dumps(indent=2) encoding of the same questions would have cost."""
+    return estimate_tokens(json.dumps(questions, indent=2))
@@ -0,0 +1,240 @@
+import os
+import time
+import logging
+import threading
+import contextvars
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+from .metrics import LatencyStats
+from .tokens import estimate_tokens
+
+
+logger = logging.getLogger(__name__)
+
+# Upstream account limits; 0 disables that bucket. Defaults match Groq's free tier for llama-3.1-8b-instant.
+GROK_REQUESTS_PER_MINUTE = int(os.getenv("GROK_REQUESTS_PER_MINUTE", 30))
+GROK_TOKENS_PER_MINUTE = int(os.getenv("GROK_TOKENS_PER_MINUTE", 6000))
+DEFAULT_COMPLETION_TOKENS = 1024  # assumed output when a payload has no max_tokens
+
+PRIORITY_INTERACTIVE = 0  # someone is waiting on the page (weak-topic analysis)
+PRIORITY_STANDARD = 1  # streamed generation, a teacher watching questions arrive
+PRIORITY_BULK = 2  # background generation jobs
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_STANDARD: "standard", PRIORITY_BULK: "bulk"}
+
+LABEL_PRIORITIES = {
+    "analyze_weak_topics": PRIORITY_INTERACTIVE,
+    "analyze_class_weak_topics": PRIORITY_INTERACTIVE,
+    "generate_quiz_stream": PRIORITY_STANDARD,
+    "generate_quiz": PRIORITY_BULK,
+    "repair_quiz": PRIORITY_BULK,
+}
+
+# How long a call may wait for budget before giving up; background jobs can afford to queue
+QUEUE_TIMEOUTS = {
+    PRIORITY_INTERACTIVE: float(os.getenv("GROK_QUEUE_TIMEOUT_INTERACTIVE", 30)),
+    PRIORITY_STANDARD: float(os.getenv("GROK_QUEUE_TIMEOUT_STANDARD", 60)),
+    PRIORITY_BULK: float(os.getenv("GROK_QUEUE_TIMEOUT_BULK", 600)),
+}
+
+_current_user = contextvars.ContextVar("llm_user", default=None)
+
+
+@contextmanager
+def llm_user(user_id):
+    """Attributes LLM calls made inside the block to `user_id` for fair queueing."""
+    token = _current_user.set(user_id)
+    try:
+        yield
+    finally:
+        _current_user.reset(token)
+
+
+def estimate_prompt_tokens(payload: Dict[str, Any]) -> int:
+    return sum(estimate_tokens(str(m.get("content", ""))) for m in payload.get("messages", []))
+
+
+def estimate_call_tokens(payload: Dict[str, Any]) -> int:
+    """Prompt tokens (local estimate) plus the completion budget, i.e. the most a call can cost."""
+    return estimate_prompt_tokens(payload) + int(payload.get("max_tokens") or DEFAULT_COMPLETION_TOKENS)
+
+
+class RateLimitTimeout(Exception):
+    """No upstream budget freed up before the caller's deadline."""
+
+
+class TokenBucket:
+    """`per_minute` units, refilled continuously. Not thread-safe; LLMScheduler holds the lock."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        if not self.enabled:
+            return 0.0
+        self._refill(now)
+        return max(0.0, (amount - self.level) / self.rate)
+
+    def take(self, amount: float):
+        if self.enabled:
+            self.level -= amount
+
+    def adjust(self, amount: float):
+        """Gives back (positive) or charges extra (negative) once the real cost is known."""
+        if self.enabled:
+            self.level = min(self.capacity, self.level + amount)
+
+
+class _Waiter:
+    __slots__ = ("user", "priority", "tokens", "enqueued_at")
+
+    def __init__(self, user, priority: int, tokens: float):
+        self.user = user
+        self.priority = priority
+        self.tokens = tokens
+        self.enqueued_at = time.monotonic()
+
+
+class LLMScheduler:
+    """
+    Token-bucket admission control in front of every upstream call, tracking
+    both the requests/min and tokens/min budgets.
+
+    Waiting calls are queued per priority class, and within a class per user;
+    the next call admitted is always from the most urgent non-empty class, and
+    users in that class take turns, so one teacher's 50-question job cannot
+    starve everyone else. A call's token cost is estimated up front and
+    corrected with the real usage afterwards.
+    """
+
+    def __init__(self, requests_per_minute: int = GROK_REQUESTS_PER_MINUTE, tokens_per_minute: int = GROK_TOKENS_PER_MINUTE):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self._cond = threading.Condition()
+        self._queues = {priority: OrderedDict() for priority in PRIORITY_NAMES}
+        self._paused_until = 0.0
+        self.waits = LatencyStats()
+        self.timeouts = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.requests.enabled or self.tokens.enabled
+
+    def _head(self) -> Optional[_Waiter]:
+        for priority in sorted(self._queues):
+            users = self._queues[priority]
+            if users:
+                return next(iter(users.values()))[0]
+        return None
+
+    def _remove(self, waiter: _Waiter, served: bool):
+        users = self._queues[waiter.priority]
+        queue = users.get(waiter.user)
+        if queue is None or waiter not in queue:
+            return
+        queue.remove(waiter)
+        if not queue:
+            del users[waiter.user]
+        elif served:
+            users.move_to_end(waiter.user)  # round-robin: this user goes to the back of its class
+
+    def acquire(self, label: str, tokens: float, timeout: Optional[float] = None, user=None) -> float:
+        """
+        Blocks until the call may be sent. `tokens` is its estimated cost (0 for a
+        retry of an already admitted call). Returns the tokens charged; raises
+        RateLimitTimeout if that does not happen within `timeout` seconds
+        (default: the QUEUE_TIMEOUTS of the label's priority class).
+        """
+        if not self.enabled:
+            return 0.0
+
+        priority = LABEL_PRIORITIES.get(label, PRIORITY_BULK)
+        timeout = QUEUE_TIMEOUTS[priority] if timeout is None else timeout
+        user = user if user is not None else _current_user.get()
+        # A call bigger than the whole bucket would never fit; let it through on a full bucket
+        cost = min(float(tokens), self.tokens.capacity) if self.tokens.enabled else 0.0
+        waiter = _Waiter(user, priority, cost)
+        deadline = waiter.enqueued_at + timeout
+
+        with self._cond:
+            self._queues[priority].setdefault(user, deque()).append(waiter)
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = 0.25
+                    if self._head() is waiter:
+                        wait = max(
+                            self._paused_until - now,
+                            self.requests.wait_time(1, now),
+                            self.tokens.wait_time(cost, now),
+                        )
+                        if wait <= 0:
+                            self.requests.take(1)
+                            self.tokens.take(cost)
+                            self._remove(waiter, served=True)
+                            self.waits.record(PRIORITY_NAMES[priority], now - waiter.enqueued_at, ok=True, retries=0)
+                            return cost
+
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        self.waits.record(PRIORITY_NAMES[priority], now - waiter.enqueued_at, ok=False, retries=0)
+                        raise RateLimitTimeout(f"LLM rate limit: no budget for '{label}' within {timeout:.1f}s")
+                    self._cond.wait(min(wait, remaining))
+            finally:
+                self._remove(waiter, served=False)
+                self._cond.notify_all()
+
+    def settle(self, charged: float, actual_tokens: Optional[int]):
+        """Corrects the token bucket once the upstream reported what the call really cost."""
+        if actual_tokens is None or not self.tokens.enabled:
+            return
+        with self._cond:
+            self.tokens.adjust(charged - actual_tokens)
+            self._cond.notify_all()
+
+    def release(self, charged: float):
+        """Hands back the budget of a call that was admitted but never sent."""
+        if not self.enabled:
+            return
+        with self._cond:
+            self.requests.adjust(1)
+            self.tokens.adjust(charged)
+            self._cond.notify_all()
+
+    def pause(self, seconds: float):
+        """The upstream said 429 / Retry-After: hold every queued call for that long."""
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            now = time.monotonic()
+            self.requests._refill(now)
+            self.tokens._refill(now)
+            return {
+                "requests_per_minute": self.requests.capacity,
+                "tokens_per_minute": self.tokens.capacity,
+                "requests_available": round(self.requests.level, 1),
+                "tokens_available": round(self.tokens.level),
+                "paused_for_s": round(max(0.0, self._paused_until - now), 1),
+                "queue_depth": {
+                    PRIORITY_NAMES[priority]: sum(len(q) for q in users.values())
+                    for priority, users in self._queues.items()
+                },
+                "waiting_users": {PRIORITY_NAMES[priority]: len(users) for priority, users in self._queues.items()},
+                "wait_times": self.waits.snapshot(),
+                "timeouts": self.timeouts,
+            }
@@ -1,26 +1,63 @@
 import os
 import re
 import json
-import requests
+import contextvars
 from typing import List, Dict, Any
 import logging
-from youtube_transcript_api import YouTubeTranscriptApi
+from concurrent.futures import ThreadPoolExecutor
+from django.db import connection
+from .cache import quiz_cache
+from .streaming import IncrementalJSONArrayParser, salvage_json_array
+from .chunking import split_into_chunks, allocate_questions
+from .tokens import estimate_tokens
+from .singleflight import llm_flights, fingerprint
+from .prompt_encoding import encode_questions, legacy_prompt_tokens, clip_text, TABLE_LEGEND
+from .pdf_extraction import extract_text, PDFExtractionError
+from .transcripts import transcript_cache, TranscriptUnavailable
+from .dedup import QuestionIndex, teacher_indexes, filter_duplicates, MAX_TOPUP_ROUNDS
+from .validation import is_valid_question, repair_locally, triage, response_format
+from .fanout import split_count, subtopic_hints, fanout_workers, completion_tokens, FANOUT_BATCH_SIZE
+from .features import extract_key_terms, identify_question_type, answer_similarity, load_question_features
+from .llm_client import llm_client, completion_text, LLMError, GROK_API_URL, GROK_API_KEY, GROK_MODEL
+from .scheduler import estimate_call_tokens
 
 
 
 logger = logging.getLogger(__name__)
 
-GROK_API_URL = os.getenv("GROK_API_URL", "https://api.groq.com/openai/v1/chat/completions")
-GROK_API_KEY = os.getenv("GROK_API_KEY")
-GROK_MODEL = os.getenv("GROK_MODEL", "llama-3.1-8b-instant")
+AVOID_QUESTIONS_LIMIT = 30  # questions listed in a top-up prompt
 
-HEADERS = {
-    "Authorization": f"Bearer {GROK_API_KEY}",
-    "Content-Type": "application/json",
+# Sources bigger than this are split into chunks and generated map-reduce style
+SINGLE_CALL_TOKENS = int(os.getenv("AI_QUIZ_SINGLE_CALL_TOKENS", 6000))
+MAP_CONCURRENCY = int(os.getenv("AI_QUIZ_MAP_CONCURRENCY", 4))
+
+# Extra calls for questions lost to a truncated completion or failed validation
+SALVAGE_TOPUP_ROUNDS = int(os.getenv("AI_QUIZ_SALVAGE_TOPUP_ROUNDS", 1))
+
+# Broken questions sent back to the model in one repair call, and how much of the source goes with them
+REPAIR_MAX_QUESTIONS = int(os.getenv("AI_QUIZ_REPAIR_MAX_QUESTIONS", 10))
+REPAIR_SOURCE_CHARS = 1500
+
+
+ANALYSIS_ERROR_MESSAGES = {
+    "timeout": "Request timed out. Please try again.",
+    "connection_error": "Unable to connect to AI service. Please check your internet connection.",
+    "invalid_json": "Invalid response from AI service",
+    "circuit_open": "AI service is temporarily unavailable. Please try again in a minute.",
+    "rate_limited": "AI service is busy right now. Please try again in a minute.",
 }
 
+# Bump whenever the weak-topic analysis prompt changes; stored analyses made
+# with another version (or another model) are regenerated on the next read.
+ANALYSIS_PROMPT_VERSION = "2"
+CLASS_ANALYSIS_PROMPT_VERSION = "1"
 
-def analyze_weak_topics_with_ai(quiz_results: List[Dict[str, Any]]) -> Dict[str, Any]:
+# Keeps the class-wide prompt bounded however long the quiz is
+CLASS_ANALYSIS_MAX_QUESTIONS = 25
+CLASS_ANALYSIS_TEXT_CHARS = 200
+
+
+def analyze_weak_topics_with_ai(quiz_results: List[Dict[str, Any]], quiz_id: int = None) -> Dict[str, Any]:
     """
     Uses AI with NLP techniques to deeply analyze incorrect answers and identify 
     specific weak topics, concepts, and misconceptions.
@@ -36,6 +73,8 @@ def analyze_weak_topics_with_ai(quiz_results: List[Dict[str, Any]]) -> Dict[str,
                 "is_correct": bool,
                 "explanation": str (optional)
             }, ...]
+        quiz_id: quiz the results belong to, when the caller has checked access
+            to it; only then are its questions' saved features used
     
     Returns:
         Dict containing detailed topic analysis with recommendations
@@ -61,55 +100,13 @@ def analyze_weak_topics_with_ai(quiz_results: List[Dict[str, Any]]) -> Dict[str,
             "estimated_study_time": "0 hours - just keep reviewing!"
         }
     
-    # NLP Enhancement 1: Extract key terms and concepts from questions
-    def extract_key_terms(text: str) -> List[str]:
-        """Extract important terms using simple keyword extraction"""
-        # Remove common words and focus on domain-specific terms
-        stop_words = {'the', 'a', 'an', 'is', 'are', 'was', 'were', 'in', 'on', 'at', 
-                      'to', 'for', 'of', 'with', 'by', 'from', 'what', 'which', 'how'}
-        words = re.findall(r'\b[a-zA-Z]{3,}\b', text.lower())
-        return [w for w in words if w not in stop_words][:10]  # Top 10 terms
-    
-    # NLP Enhancement 2: Calculate semantic similarity between wrong and correct answers
-    def calculate_answer_similarity(wrong: str, correct: str) -> str:
-        """Determine if answers are conceptually similar or completely different"""
-        # Handle None or empty strings
-        if not wrong or not correct:
-            return "fundamental_gap"  # Changed from "unknown" to valid pattern
-        
-        wrong_terms = set(extract_key_terms(wrong))
-        correct_terms = set(extract_key_terms(correct))
-        
-        if not wrong_terms or not correct_terms:
-            return "fundamental_gap"  # Changed from "unknown" to valid pattern
-        
-        overlap = len(wrong_terms & correct_terms) / len(correct_terms)
-        
-        if overlap > 0.5:
-            return "partial_understanding"  # Student has some related knowledge
-        elif overlap > 0.2:
-            return "confused_concepts"  # Student confusing similar concepts
-        else:
-            return "fundamental_gap"  # Complete misunderstanding
-    
-    # NLP Enhancement 3: Identify question patterns and types
-    def identify_question_type(question: str) -> str:
-        """Classify question type based on linguistic patterns"""
-        q_lower = question.lower()
-        
-        if any(word in q_lower for word in ['why', 'explain', 'describe']):
-            return "conceptual"
-        elif any(word in q_lower for word in ['calculate', 'compute', 'solve']):
-            return "computational"
-        elif any(word in q_lower for word in ['compare', 'contrast', 'difference']):
-            return "comparative"
-        elif any(word in q_lower for word in ['when', 'where', 'who', 'what year']):
-            return "factual"
-        elif any(word in q_lower for word in ['apply', 'use', 'implement']):
-            return "application"
-        else:
-            return "general"
-    
+    # NLP features (key terms, question type, option terms) are precomputed per
+    # Question at insert time; only results without a saved question fall back
+    # to computing them here. Client-sent ids are never trusted without quiz_id.
+    features_by_id = {}
+    if quiz_id is not None:
+        features_by_id = load_question_features((q.get("question_id") for q in incorrect_questions), quiz_id)
+
     # Prepare enhanced analysis with NLP features
     questions_summary = []
     all_key_terms = []
@@ -126,11 +123,19 @@ def analyze_weak_topics_with_ai(quiz_results: List[Dict[str, Any]]) -> Dict[str,
         your_answer = q.get("selected_option_text", "")
         correct_answer = q.get("correct_option_text", "")
         
-        # Extract NLP features
-        key_terms = extract_key_terms(question_text)
+        features = features_by_id.get(q.get("question_id"))
+        if features is not None:
+            key_terms = features["key_terms"]
+            q_type = features["question_type"]
+            similarity_type = answer_similarity(
+                features["option_terms"].get(q.get("selected_option") or ""),
+                features["option_terms"].get(q.get("correct_option") or ""),
+            )
+        else:
+            key_terms = extract_key_terms(question_text)
+            q_type = identify_question_type(question_text)
+            similarity_type = answer_similarity(extract_key_terms(your_answer), extract_key_terms(correct_answer))
         all_key_terms.extend(key_terms)
-        similarity_type = calculate_answer_similarity(your_answer, correct_answer)
-        q_type = identify_question_type(question_text)
         
         # Track patterns
         error_patterns[similarity_type] = error_patterns.get(similarity_type, 0) + 1
@@ -162,6 +167,10 @@ def analyze_weak_topics_with_ai(quiz_results: List[Dict[str, Any]]) -> Dict[str,
     elif error_patterns["fundamental_gap"] / total_errors > 0.5:
         learning_insight = "Has fundamental gaps; needs foundational review"
     
+    # Compact table instead of indented JSON, clustered by key terms when it would exceed the token budget
+    encoded = encode_questions(questions_summary)
+    omitted_note = f"\n{encoded['omitted']} less frequent incorrect answers were left out for length." if encoded["omitted"] else ""
+
     messages = [
         {
             "role": "system",
@@ -180,7 +189,8 @@ def analyze_weak_topics_with_ai(quiz_results: List[Dict[str, Any]]) -> Dict[str,
 Analyze the following incorrect quiz answers with NLP-enhanced insights:
 
 QUESTIONS WITH NLP ANALYSIS:
-{json.dumps(questions_summary, indent=2)}
+{TABLE_LEGEND}{omitted_note}
+{encoded["table"]}
 
 NLP INSIGHTS:
 - Frequently appearing concepts: {', '.join(top_concepts)}
@@ -246,50 +256,69 @@ Rules:
         "max_tokens": 2500,  # Increased for richer analysis
     }
     
+    analysis = request_json_analysis(payload, label="analyze_weak_topics")
+    if not analysis.get("success"):
+        return analysis
+
+    analysis["total_incorrect"] = len(incorrect_questions)
+    legacy_tokens = legacy_prompt_tokens(questions_summary)
+    prompt_stats = {
+        "question_tokens": encoded["tokens"],
+        "legacy_question_tokens": legacy_tokens,
+        "saved_tokens": legacy_tokens - encoded["tokens"],
+        "rows": encoded["rows"],
+        "clustered": encoded["clustered"],
+        "omitted": encoded["omitted"],
+    }
+    logger.info(
+        f"Analysis prompt: {encoded['tokens']} question tokens vs {legacy_tokens} as JSON "
+        f"({encoded['rows']} rows, {encoded['omitted']} omitted)"
+    )
+
+    # Add NLP metadata to response
+    analysis["nlp_metadata"] = {
+        "top_concepts": top_concepts,
+        "error_patterns": {k: v for k, v in error_patterns.items() if v > 0},  # Only include non-zero patterns
+        "question_type_distribution": question_type_errors,
+        "dominant_error_pattern": max(
+            (k for k, v in error_patterns.items() if k != "unknown" and v > 0),
+            key=lambda k: error_patterns[k],
+            default="fundamental_gap"
+        ),
+        "prompt": prompt_stats,
+    }
+
+    logger.info(f"Successfully analyzed {len(incorrect_questions)} incorrect answers with NLP")
+    return analysis
+
+
+def request_json_analysis(payload: Dict[str, Any], label: str) -> Dict[str, Any]:
+    """
+    Sends an analysis prompt and parses the JSON object in the reply.
+    Returns the object with "success": True, or {"success": False, "error": <user-facing message>}.
+    Concurrent identical prompts share one call.
+    """
+    key = fingerprint("analysis", json.dumps(payload, sort_keys=True))
+    return llm_flights.do(key, lambda: _call_analysis_model(payload, label))
+
+
+def _call_analysis_model(payload: Dict[str, Any], label: str) -> Dict[str, Any]:
     try:
-        logger.info(f"Sending NLP-enhanced request to {GROK_API_URL} for topic analysis")
-        resp = requests.post(GROK_API_URL, headers=HEADERS, json=payload, timeout=60)
-        resp.raise_for_status()
-    except requests.exceptions.Timeout:
-        logger.error("Request timed out")
-        return {
-            "success": False,
-            "error": "Request timed out. Please try again."
-        }
-    except requests.exceptions.ConnectionError:
-        logger.error("Connection error")
-        return {
-            "success": False,
-            "error": "Unable to connect to AI service. Please check your internet connection."
-        }
-    except requests.exceptions.HTTPError as e:
-        logger.error(f"HTTP error: {e.response.status_code} - {e.response.text}")
-        return {
-            "success": False,
-            "error": f"AI service error: {e.response.status_code}. Please try again later."
-        }
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Request exception: {str(e)}")
-        return {
-            "success": False,
-            "error": f"Network error: {str(e)}"
-        }
-    
-    # Parse response
-    try:
-        data = resp.json()
-    except json.JSONDecodeError as e:
-        logger.error(f"Invalid JSON response: {resp.text[:500]}")
+        logger.info(f"Sending {label} request to {GROK_API_URL}")
+        data = llm_client.chat(payload, label=label)
+    except LLMError as e:
+        logger.error(f"Topic analysis error ({e.code}): {e}")
+        if e.code == "http_error":
+            message = f"AI service error: {e.status_code}. Please try again later."
+        else:
+            message = ANALYSIS_ERROR_MESSAGES.get(e.code, f"Network error: {e}")
         return {
             "success": False,
-            "error": "Invalid response from AI service"
+            "error": message
         }
     
     # Extract AI response text
-    text = None
-    if isinstance(data, dict) and "choices" in data and data["choices"]:
-        choice = data["choices"][0]
-        text = choice.get("message", {}).get("content", "") or choice.get("text", "")
+    text = completion_text(data)
     
     if not text:
         logger.error(f"No text in AI response: {data}")
@@ -308,40 +337,127 @@ Rules:
     
     try:
         analysis = json.loads(json_text)
-        analysis["success"] = True
-        analysis["total_incorrect"] = len(incorrect_questions)
-        
-        # Add NLP metadata to response
-        analysis["nlp_metadata"] = {
-            "top_concepts": top_concepts,
-            "error_patterns": {k: v for k, v in error_patterns.items() if v > 0},  # Only include non-zero patterns
-            "question_type_distribution": question_type_errors,
-            "dominant_error_pattern": max(
-                (k for k, v in error_patterns.items() if k != "unknown" and v > 0),
-                key=lambda k: error_patterns[k],
-                default="fundamental_gap"
-            )
-        }
-        
-        logger.info(f"Successfully analyzed {len(incorrect_questions)} incorrect answers with NLP")
-        return analysis
     except json.JSONDecodeError as e:
         logger.error(f"Failed to parse AI response as JSON: {e}\nText: {text[:500]}")
         return {
             "success": False,
             "error": "Failed to parse AI analysis. Please try again."
         }
+    if not isinstance(analysis, dict):
+        return {"success": False, "error": "Failed to parse AI analysis. Please try again."}
+    analysis["success"] = True
+    return analysis
     
     
-def generate_quiz_with_ai(topic_or_passage: str, num_questions: int = 5, difficulty: str = "medium", temperature: float = 0.1):
+def _clip(text, limit: int = CLASS_ANALYSIS_TEXT_CHARS) -> str:
+    return clip_text(text, limit)
+
+
+def build_class_analysis_prompt(quiz_title: str, total_attempts: int, question_stats: List[Dict[str, Any]]) -> str:
     """
-    Calls the model and returns parsed JSON list of questions.
+    One line per question plus one per distractor, e.g.
+
+        Q3 [computational] 25/60 wrong: "What is 2+2?"
+          correct B "4"; chose A "3" x12, D "5" x8, skipped x5
+    """
+    lines = [f'Quiz: "{_clip(quiz_title)}", {total_attempts} student attempts.', ""]
+    for stat in question_stats:
+        lines.append(
+            f'Q{stat["number"]} [{stat["question_type"] or "general"}] '
+            f'{stat["wrong"]}/{stat["answered"]} wrong: "{_clip(stat["question"])}"'
+        )
+        choices = [
+            f'{c["option"]} "{_clip(c["text"], 80)}" x{c["count"]}' if c["option"] else f'skipped x{c["count"]}'
+            for c in stat["wrong_choices"]
+        ]
+        lines.append(f'  correct {stat["correct_option"]} "{_clip(stat["correct_text"], 80)}"; chose ' + ", ".join(choices))
+    return "\n".join(lines)
+
+
+def analyze_class_weak_topics_with_ai(quiz_title: str, total_attempts: int, question_stats: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Class-wide counterpart of analyze_weak_topics_with_ai: one LLM call over
+    per-question / per-distractor wrong-answer counts of every attempt.
+
+    `question_stats` is ordered most-missed first:
+        [{"number", "question", "question_type", "answered", "wrong",
+          "correct_option", "correct_text", "wrong_choices": [{"option", "text", "count"}]}, ...]
     """
-    
     if not GROK_API_KEY:
-        logger.error("GROK_API_KEY is not set")
-        return {"error": "api_key_not_configured"}
-    
+        logger.error("GROK_API_KEY is not set in environment variables")
+        return {
+            "success": False,
+            "error": "API key not configured. Please contact administrator."
+        }
+
+    if not question_stats:
+        return {
+            "success": True,
+            "weak_topics": [],
+            "overall_analysis": "No incorrect answers so far.",
+            "teaching_recommendations": [],
+        }
+
+    summary = build_class_analysis_prompt(quiz_title, total_attempts, question_stats[:CLASS_ANALYSIS_MAX_QUESTIONS])
+    messages = [
+        {
+            "role": "system",
+            "content": (
+                "You are an expert educational analyst. From aggregated wrong-answer counts of a whole class, "
+                "identify the topics and misconceptions the class struggles with and how the teacher should address them. "
+                "Respond ONLY in valid JSON format."
+            )
+        },
+        {
+            "role": "user",
+            "content": f"""
+Wrong answers of the class, most-missed questions first ("chose X x12" = 12 students picked distractor X):
+
+{summary}
+
+Respond with this JSON:
+{{
+  "weak_topics": [
+    {{
+      "topic": "Specific topic/concept",
+      "severity": "critical|high|moderate",
+      "questions_affected": [3, 7],
+      "share_of_class": "Rough share of students affected, e.g. '40%'",
+      "common_misconception": "What the popular distractors reveal",
+      "teaching_recommendations": ["Concrete action for the teacher"]
+    }}
+  ],
+  "overall_analysis": "2-3 sentence summary of where the class stands",
+  "teaching_recommendations": ["Most important thing to re-teach first", "Second priority"]
+}}
+
+Rules:
+- 2-5 distinct weak topics, specific ("Photosynthesis light reactions", not "Biology")
+- Severity: critical (>60% of answers wrong), high (40-60%), moderate (<40%)
+- Output ONLY valid JSON, no markdown or extra text
+"""
+        }
+    ]
+
+    payload = {
+        "model": GROK_MODEL,
+        "messages": messages,
+        "temperature": 0.3,
+        "max_tokens": 1500,
+    }
+
+    analysis = request_json_analysis(payload, label="analyze_class_weak_topics")
+    if analysis.get("success"):
+        analysis["questions_with_errors"] = len(question_stats)
+    return analysis
+
+
+def build_quiz_messages(topic_or_passage: str, num_questions: int, difficulty: str, avoid_questions: List[str] = None, focus: str = None) -> List[Dict[str, str]]:
+    """
+    Chat messages asking the model for `num_questions` MCQs as a JSON array.
+    `avoid_questions` lists existing questions the model must not repeat (used for top-ups);
+    `focus` narrows the set to one subtopic (used for fan-out batches).
+    """
     messages = [
         {
             "role": "system",
@@ -387,72 +503,503 @@ DO NOT include markdown, comments, or text outside the JSON.
         },
     ]
 
+    if focus:
+        messages[1]["content"] += (
+            f"\nThis set is one of several generated in parallel. Focus only on {focus}; "
+            "the other sets cover the rest of the material.\n"
+        )
+    if avoid_questions:
+        messages[1]["content"] += (
+            "\nThese questions already exist. Do NOT generate any question that is the same as "
+            "or similar to one of them; cover other facts or subtopics instead:\n"
+            + "\n".join(f"- {q}" for q in avoid_questions)
+            + "\n"
+        )
+    return messages
+
+
+def build_quiz_payload(topic_or_passage: str, num_questions: int, difficulty: str, temperature: float, avoid_questions: List[str] = None, structured: bool = True, focus: str = None) -> Dict[str, Any]:
+    """
+    Chat-completions payload for a generation call. With `structured` and
+    GROK_RESPONSE_FORMAT set, the output is constrained by the API as well and
+    the array comes wrapped in {"questions": [...]}.
+    """
+    messages = build_quiz_messages(topic_or_passage, num_questions, difficulty, avoid_questions, focus)
     payload = {
         "model": GROK_MODEL,
         "messages": messages,
         "temperature": temperature,
-        "max_tokens": 4500,
+        "max_tokens": completion_tokens(num_questions),
     }
+    fmt = response_format() if structured else None
+    if fmt:
+        payload["response_format"] = fmt
+        messages[1]["content"] += '\nWrap the array in a JSON object: {"questions": [ ... ]}\n'
+    return payload
 
-    try:
-        logger.info(f"Generating {num_questions} quiz questions")
-        resp = requests.post(GROK_API_URL, headers=HEADERS, json=payload, timeout=60)
-        resp.raise_for_status()
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Quiz generation error: {str(e)}")
-        return {"error": "network_error", "details": str(e)}
+
+def generate_quiz_with_ai(topic_or_passage: str, num_questions: int = 5, difficulty: str = "medium", temperature: float = 0.1, use_cache: bool = True, avoid_questions: List[str] = None):
+    """
+    Calls the model and returns parsed JSON list of questions.
+
+    Successful results are cached by source text + parameters. Pass use_cache=False
+    to skip the lookup and force fresh questions (the new result still refreshes the cache).
+    More than FANOUT_BATCH_SIZE questions are generated as concurrent batches.
+    """
+    
+    if not GROK_API_KEY:
+        logger.error("GROK_API_KEY is not set")
+        return {"error": "api_key_not_configured"}
+
+    cache_key = quiz_cache.make_key(topic_or_passage, num_questions, difficulty, GROK_MODEL, temperature, avoid_questions)
+    if use_cache:
+        cached = quiz_cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"Quiz cache hit for {cache_key[:12]}")
+            return {**cached, "cached": True}
+
+    call = _fan_out_quiz if num_questions > FANOUT_BATCH_SIZE else _call_quiz_model
+    if not use_cache:
+        # A forced fresh set must not be a result another request just finished
+        return call(topic_or_passage, num_questions, difficulty, temperature, avoid_questions, cache_key)
+
+    # Identical requests in flight at the same time (double clicks, a class on one shared PDF) share one LLM call
+    return llm_flights.do(
+        fingerprint("generate_quiz", cache_key),
+        lambda: call(topic_or_passage, num_questions, difficulty, temperature, avoid_questions, cache_key),
+    )
+
+
+def _request_questions(topic_or_passage, num_questions, difficulty, temperature, avoid_questions, focus=None):
+    """
+    One generation call. Returns (valid questions, [(broken question, defects)],
+    parse info, raw text), or an error dict. Complete items are kept even when
+    the completion was cut off or one of its items is malformed; mechanical
+    defects are fixed here, the rest are left for repair_questions_with_ai.
+    """
+    payload = build_quiz_payload(topic_or_passage, num_questions, difficulty, temperature, avoid_questions, focus=focus)
 
     try:
-        data = resp.json()
-    except Exception:
-        logger.error(f"Invalid JSON response: {resp.text[:500]}")
-        return {"error": "invalid_json_response", "raw": resp.text[:500]}
-
-    text = None
-    if isinstance(data, dict) and "choices" in data and data["choices"]:
-        choice = data["choices"][0]
-        text = (
-            choice.get("message", {}).get("content")
-            or choice.get("text")
-            or ""
-        )
+        logger.info(f"Generating {num_questions} quiz questions")
+        try:
+            data = llm_client.chat(payload, label="generate_quiz")
+        except LLMError as e:
+            if "response_format" not in payload or e.status_code != 400:
+                raise
+            # Model or endpoint rejected the constrained output (or it failed its schema): ask with the prompt alone
+            logger.warning(f"Constrained quiz output failed, retrying unconstrained: {e.response_text[:200]}")
+            payload = build_quiz_payload(topic_or_passage, num_questions, difficulty, temperature, avoid_questions, structured=False, focus=focus)
+            data = llm_client.chat(payload, label="generate_quiz")
+    except LLMError as e:
+        logger.error(f"Quiz generation error ({e.code}): {e}")
+        return _generation_error(e)
+
+    text = completion_text(data)
 
     if not text:
         logger.error(f"No output text: {data}")
         return {"error": "no_output_text", "raw": str(data)[:500]}
 
-    text = re.sub(r"^```(?:json)?\n", "", text.strip())
-    text = re.sub(r"\n```$", "", text.strip())
+    items, info = salvage_json_array(text)
+    if not items:
+        logger.error(f"Parse failed, no complete question in output\nText: {text[:500]}")
+        return {"error": "parse_failed", "raw": text[:500]}
+
+    questions, repairable, unrepairable, fixes = triage(items)
+    finish_reason = (data.get("choices") or [{}])[0].get("finish_reason")
+    info.update({
+        "truncated": finish_reason == "length" or not info["complete"],
+        "local_fixes": fixes,
+        "needs_repair": len(repairable),
+        "unrepairable": unrepairable,
+    })
+    if info["truncated"] or info["malformed"] or repairable or unrepairable:
+        logger.warning(
+            f"Salvaged {len(questions)} of {num_questions} question(s): truncated={info['truncated']}, "
+            f"malformed={info['malformed']}, broken={[d for _, d in repairable]}, unrepairable={unrepairable}"
+        )
+    return questions, repairable, info, text
+
+
+def _generation_error(e: LLMError) -> Dict[str, Any]:
+    if e.code == "invalid_json":
+        return {"error": "invalid_json_response", "raw": e.response_text}
+    if e.code == "circuit_open":
+        return {"error": "ai_service_unavailable", "details": str(e)}
+    if e.code == "rate_limited":
+        return {"error": "rate_limited", "details": str(e)}
+    return {"error": "network_error", "details": str(e)}
+
+
+def build_repair_messages(topic_or_passage: str, broken: List[tuple]) -> List[Dict[str, str]]:
+    """One prompt listing every broken question with what is wrong with it."""
+    items = "\n".join(
+        json.dumps({"id": i, "problems": defects, "item": q}, ensure_ascii=False)
+        for i, (q, defects) in enumerate(broken)
+    )
+    return [
+        {
+            "role": "system",
+            "content": (
+                "You fix broken multiple-choice quiz questions. "
+                "You must respond ONLY in valid JSON array format, without markdown fences."
+            ),
+        },
+        {
+            "role": "user",
+            "content": f"""
+The questions below were generated from this source but are invalid:
+\"\"\"{clip_text(topic_or_passage, REPAIR_SOURCE_CHARS)}\"\"\"
 
-    json_match = re.search(r"(\[.*\])", text, re.S)
-    json_text = json_match.group(1) if json_match else text
+Each line has an id, the problems found and the broken item:
+{items}
+
+Problem codes: wrong_option_count = not exactly 4 options, duplicate_options = two options are the same,
+empty_option = an option is blank, bad_answer = answer is not a 0-based option index,
+answer_out_of_range = answer points past the options, missing_options = no options list.
 
+Return one corrected object per id, keeping each question's wording and topic wherever possible:
+[{{"id": 0, "question": "...", "options": ["...", "...", "...", "..."], "answer": 0, "explanation": "..."}}]
+Options must be 4 distinct strings; answer is the 0-based index of the correct one.
+""",
+        },
+    ]
+
+
+def repair_questions_with_ai(topic_or_passage: str, broken: List[tuple], temperature: float = 0.1) -> List[Dict[str, Any]]:
+    """
+    Sends only the broken questions back to the model in one small call and
+    returns those that come back valid. Failures just mean nothing was repaired.
+    """
+    broken = broken[:REPAIR_MAX_QUESTIONS]
+    payload = {
+        "model": GROK_MODEL,
+        "messages": build_repair_messages(topic_or_passage, broken),
+        "temperature": temperature,
+        "max_tokens": 250 * len(broken) + 100,
+    }
+    try:
+        logger.info(f"Repairing {len(broken)} generated question(s)")
+        data = llm_client.chat(payload, label="repair_quiz")
+    except LLMError as e:
+        logger.warning(f"Question repair failed ({e.code}): {e}")
+        return []
+
+    items, _ = salvage_json_array(completion_text(data))
+    repaired, _, _, _ = triage(items)
+    repaired = repaired[:len(broken)]
+    for q in repaired:
+        q.pop("id", None)
+    logger.info(f"Repaired {len(repaired)} of {len(broken)} question(s)")
+    return repaired
+
+
+def _call_quiz_model(topic_or_passage, num_questions, difficulty, temperature, avoid_questions, cache_key, focus=None):
+    outcome = _request_questions(topic_or_passage, num_questions, difficulty, temperature, avoid_questions, focus)
+    if isinstance(outcome, dict):
+        return outcome
+    questions, repairable, info, text = outcome
+
+    # Broken items first go back to the model as a batch, which is far cheaper than regenerating them
+    info["repaired_by_model"] = 0
+    if repairable and len(questions) < num_questions:
+        repaired = repair_questions_with_ai(topic_or_passage, repairable[:num_questions - len(questions)], temperature)
+        info["repaired_by_model"] = len(repaired)
+        questions.extend(repaired)
+
+    # Ask again only for what is still missing, steering away from what we already have
+    rounds = 0
+    while len(questions) < num_questions and rounds < SALVAGE_TOPUP_ROUNDS:
+        rounds += 1
+        shortfall = num_questions - len(questions)
+        avoid = ((avoid_questions or []) + [q["question"] for q in questions])[-AVOID_QUESTIONS_LIMIT:]
+        logger.info(f"Requesting {shortfall} missing question(s)")
+        more = _request_questions(topic_or_passage, shortfall, difficulty, temperature, avoid, focus)
+        if isinstance(more, dict):
+            break
+        questions.extend(more[0][:shortfall])
+
+    questions = questions[:num_questions]
+    logger.info(f"Successfully generated {len(questions)} valid questions")
+    result = {"success": True, "questions": questions, "raw_text": text, "salvage": {**info, "topup_rounds": rounds}}
+    if cache_key and len(questions) == num_questions:
+        # A short set came from a bad completion; don't pin it in the cache
+        quiz_cache.set(cache_key, result)
+    return result
+
+
+def _generate_batch(topic_or_passage, num_questions, difficulty, temperature, avoid_questions, focus):
     try:
-        questions = json.loads(json_text)
-        validated = [
-            q for q in questions
-            if isinstance(q, dict) and "question" in q and "options" in q and "answer" in q
+        return _call_quiz_model(topic_or_passage, num_questions, difficulty, temperature, avoid_questions, None, focus)
+    finally:
+        # Runs in a pool thread, which otherwise keeps its own DB connection open
+        connection.close()
+
+
+def _fan_out_quiz(topic_or_passage, num_questions, difficulty, temperature, avoid_questions, cache_key):
+    """
+    A large request as several small generations run concurrently, each focused
+    on its own subtopic, merged without near-duplicates. One long completion
+    would take time linear in the count and risk truncation; this takes about
+    as long as one batch when the rate limit allows. It often does not: the
+    default GROK_TOKENS_PER_MINUTE admits only one or two batches at a time
+    (see fanout_workers), so the speed-up needs a larger token budget.
+    """
+    counts = split_count(num_questions)
+    hints = subtopic_hints(topic_or_passage, len(counts))
+    call_tokens = estimate_call_tokens(build_quiz_payload(topic_or_passage, counts[0], difficulty, temperature, avoid_questions, focus=hints[0]))
+    workers = fanout_workers(len(counts), call_tokens, llm_client.scheduler.tokens.capacity)
+    logger.info(f"Fanning out {num_questions} questions as {len(counts)} batches over {workers} worker(s)")
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(
+                contextvars.copy_context().run,
+                _generate_batch, topic_or_passage, count, difficulty, temperature, avoid_questions, hint,
+            )
+            for count, hint in zip(counts, hints)
         ]
-        logger.info(f"Successfully generated {len(validated)} valid questions")
-        return {"success": True, "questions": validated, "raw_text": text}
-    except Exception as e:
-        logger.error(f"Parse failed: {str(e)}\nText: {text[:500]}")
-        return {"error": "parse_failed", "exception": str(e), "raw": text[:500]}
+        results = [f.result() for f in futures]
+
+    saved_index, batch_index = QuestionIndex(), QuestionIndex()
+    merged, failed, duplicates = [], [], 0
+    for hint, result in zip(hints, results):
+        if not result.get("success"):
+            failed.append({"focus": hint, "error": result.get("error")})
+            continue
+        accepted, rejected = filter_duplicates(result["questions"], saved_index, batch_index)
+        merged.extend(accepted)
+        duplicates += len(rejected)
+
+    if not merged:
+        # Every batch failed, or came back empty or entirely duplicated
+        failure = next((r for r in results if not r.get("success")), None)
+        return failure or {"error": "no_questions_generated"}
+
+    if len(merged) < num_questions:
+        shortfall = num_questions - len(merged)
+        avoid = ((avoid_questions or []) + [q["question"] for q in merged])[-AVOID_QUESTIONS_LIMIT:]
+        logger.info(f"Fan-out short by {shortfall} question(s) after {duplicates} duplicate(s), {len(failed)} failed batch(es)")
+        topup = _call_quiz_model(topic_or_passage, shortfall, difficulty, temperature, avoid, None)
+        if topup.get("success"):
+            accepted, rejected = filter_duplicates(topup["questions"], saved_index, batch_index)
+            merged.extend(accepted[:shortfall])
+            duplicates += len(rejected)
+
+    questions = merged[:num_questions]
+    result = {
+        "success": True,
+        "questions": questions,
+        "fanout": {"batches": len(counts), "workers": workers, "failed": failed, "duplicates_removed": duplicates},
+    }
+    if len(questions) == num_questions:
+        quiz_cache.set(cache_key, result)
+    return result
 
 
 
-def get_text_from_urlid(video_id):
+def stream_quiz_with_ai(topic_or_passage: str, num_questions: int = 5, difficulty: str = "medium", temperature: float = 0.1, use_cache: bool = True):
+    """
+    Streaming variant of generate_quiz_with_ai.
+
+    Yields (event, data) pairs: ("question", {...}) as soon as each question
+    object's closing brace arrives, then ("done", {...}) or ("error", {...}).
+    A complete run is stored in the same cache as generate_quiz_with_ai.
+    """
+    if not GROK_API_KEY:
+        logger.error("GROK_API_KEY is not set")
+        yield "error", {"error": "api_key_not_configured"}
+        return
+
+    cache_key = quiz_cache.make_key(topic_or_passage, num_questions, difficulty, GROK_MODEL, temperature)
+    if use_cache:
+        cached = quiz_cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"Quiz cache hit for {cache_key[:12]} (stream)")
+            for index, q in enumerate(cached["questions"]):
+                yield "question", {"index": index, **q}
+            yield "done", {"count": len(cached["questions"]), "cached": True}
+            return
+
+    # The incremental parser already copes with a cut-off array; no response_format here
+    payload = build_quiz_payload(topic_or_passage, num_questions, difficulty, temperature, structured=False)
+
+    parser = IncrementalJSONArrayParser()
+    questions = []
+    raw_parts = []
+    try:
+        logger.info(f"Streaming {num_questions} quiz questions")
+        for delta in llm_client.stream_chat(payload, label="generate_quiz_stream"):
+            raw_parts.append(delta)
+            for q in parser.feed(delta):
+                q, _ = repair_locally(q)
+                if not is_valid_question(q):
+                    continue
+                yield "question", {"index": len(questions), **q}
+                questions.append(q)
+    except LLMError as e:
+        logger.error(f"Quiz streaming error ({e.code}): {e}")
+        yield "error", {"error": "network_error", "details": str(e), "count": len(questions)}
+        return
+
+    if not questions:
+        yield "error", {"error": "parse_failed", "raw": "".join(raw_parts)[:500]}
+        return
+
+    if parser.finished:
+        # Only a fully closed array is worth caching; a cut-off stream is partial
+        quiz_cache.set(cache_key, {"success": True, "questions": questions, "raw_text": "".join(raw_parts)})
+
+    logger.info(f"Streamed {len(questions)} valid questions")
+    yield "done", {"count": len(questions), "complete": parser.finished}
+
+
+def extract_pdf_text(pdf_file):
+    """
+    Extracts text from a PDF upload (see ai_quiz.pdf_extraction for backends,
+    page/size limits and the character budget).
+    """
     try:
-        ytt_api = YouTubeTranscriptApi()
-        transcript = ytt_api.fetch(video_id)
+        return extract_text(pdf_file)
+    except PDFExtractionError as e:
+        logger.error(f"PDF extract error: {e}")
+    return ""
 
-        text = " ".join(snippet.text for snippet in transcript.snippets)
-        return text
 
-    except Exception as e:
-        return "Transcript not available: " + str(e)
+def build_source_text(title: str, topic: str, pdf_text: str) -> str:
+    """Merge topic + PDF text depending on which exists."""
+    combined_text = ""
+
+    if topic:
+        combined_text += ((title + ": " if title else "") + topic) + "\n\n"
 
+    if pdf_text:
+        combined_text += pdf_text
 
+    return combined_text
 
 
-        
\ No newline at end of file
+def _question_key(q) -> str:
+    return " ".join(re.findall(r"[a-z0-9]+", str(q.get("question", "")).lower()))
+
+
+def _generate_for_chunk(source_text, num_questions, difficulty, temperature, use_cache, avoid_questions=None):
+    try:
+        return generate_quiz_with_ai(source_text, num_questions, difficulty, temperature, use_cache=use_cache, avoid_questions=avoid_questions)
+    finally:
+        # Runs in a pool thread, which otherwise keeps its own DB connection open
+        connection.close()
+
+
+def generate_quiz_map_reduce(title: str, topic: str, document_text: str, num_questions: int = 5, difficulty: str = "medium", temperature: float = 0.1, use_cache: bool = True, avoid_questions: List[str] = None):
+    """
+    Generates questions from a document too large for one prompt.
+
+    The text is split into token-budgeted, section-aware chunks, questions are
+    allocated to chunks in proportion to their size, the per-chunk generations
+    run concurrently, and the results are merged and de-duplicated. Each
+    question carries a `source_chunk` describing where it came from.
+    """
+    chunks = split_into_chunks(document_text)
+    counts = allocate_questions(chunks, num_questions)
+    work = [(chunk, count) for chunk, count in zip(chunks, counts) if count]
+    header = build_source_text(title, topic, "")
+
+    logger.info(f"Map-reduce generation: {len(chunks)} chunks, {len(work)} with questions")
+
+    with ThreadPoolExecutor(max_workers=max(1, min(MAP_CONCURRENCY, len(work)))) as pool:
+        futures = [
+            pool.submit(
+                # copy_context: keeps the llm_user attribution inside the pool threads
+                contextvars.copy_context().run,
+                _generate_for_chunk,
+                header + (f"Section: {chunk.heading}\n" if chunk.heading else "") + chunk.text,
+                count, difficulty, temperature, use_cache, avoid_questions,
+            )
+            for chunk, count in work
+        ]
+        results = [f.result() for f in futures]
+
+    merged = []
+    seen = set()
+    duplicates = 0
+    failed = []
+    for (chunk, _), result in zip(work, results):
+        if not result.get("success"):
+            failed.append({"chunk": chunk.index, "error": result.get("error")})
+            continue
+        for q in result["questions"]:
+            key = _question_key(q)
+            if key in seen:
+                duplicates += 1
+                continue
+            seen.add(key)
+            merged.append({
+                **q,
+                "source_chunk": {"index": chunk.index, "heading": chunk.heading, "tokens": chunk.tokens},
+            })
+
+    if not merged:
+        return results[0] if failed else {"error": "no_questions_generated"}
+
+    logger.info(f"Map-reduce merged {len(merged)} questions ({duplicates} duplicates dropped, {len(failed)} chunks failed)")
+    return {
+        "success": True,
+        "questions": merged[:num_questions],
+        "chunks": {"total": len(chunks), "used": len(work), "failed": failed},
+        "duplicates_removed": duplicates,
+    }
+
+
+def generate_quiz_from_source(title: str, topic: str, document_text: str, num_questions: int = 5, difficulty: str = "medium", temperature: float = 0.1, use_cache: bool = True, avoid_questions: List[str] = None):
+    """One call for small sources; map-reduce over chunks when the document would blow the prompt budget."""
+    combined_text = build_source_text(title, topic, document_text)
+    if not document_text or estimate_tokens(combined_text) <= SINGLE_CALL_TOKENS:
+        return generate_quiz_with_ai(combined_text, num_questions, difficulty, temperature, use_cache=use_cache, avoid_questions=avoid_questions)
+    return generate_quiz_map_reduce(title, topic, document_text, num_questions, difficulty, temperature, use_cache=use_cache, avoid_questions=avoid_questions)
+
+
+def generate_unique_quiz(teacher_id, title: str, topic: str, document_text: str, num_questions: int = 5, difficulty: str = "medium", temperature: float = 0.1, use_cache: bool = True):
+    """
+    generate_quiz_from_source, minus near-duplicates of the teacher's saved
+    questions and of each other (MinHash index, see ai_quiz.dedup). Only the
+    shortfall is requested again, listing the questions to steer away from.
+    """
+    index = teacher_indexes.get(teacher_id) if teacher_id else QuestionIndex()
+    result = generate_quiz_from_source(title, topic, document_text, num_questions, difficulty, temperature, use_cache=use_cache)
+    if not result.get("success"):
+        return result
+
+    batch_index = QuestionIndex(index.threshold)
+    accepted, rejected = filter_duplicates(result["questions"], index, batch_index)
+
+    rounds = 0
+    while len(accepted) < num_questions and rounds < MAX_TOPUP_ROUNDS:
+        rounds += 1
+        shortfall = num_questions - len(accepted)
+        avoid = [q["question"] for q in accepted + rejected][-AVOID_QUESTIONS_LIMIT:]
+        logger.info(f"Topping up {shortfall} question(s) after dropping {len(rejected)} near-duplicate(s)")
+        topup = generate_quiz_from_source(
+            title, topic, document_text, shortfall, difficulty, temperature,
+            use_cache=use_cache, avoid_questions=avoid,
+        )
+        if not topup.get("success"):
+            break
+        more, dropped = filter_duplicates(topup["questions"], index, batch_index)
+        accepted.extend(more[:shortfall])
+        rejected.extend(dropped)
+
+    return {
+        **result,
+        "questions": accepted[:num_questions],
+        "near_duplicates_removed": len(rejected),
+        "topup_rounds": rounds,
+    }
+
+
+def get_text_from_urlid(video_id):
+    try:
+        return transcript_cache.get(video_id)
+
+    except TranscriptUnavailable as e:
+        return "Transcript not available: " + str(e)
@@ -0,0 +1,155 @@
+import os
+import copy
+import time
+import hashlib
+import logging
+import threading
+from datetime import timedelta
+from typing import Any, Callable, Dict
+
+from django.db import DatabaseError, IntegrityError, transaction
+from django.utils import timezone
+
+
+logger = logging.getLogger(__name__)
+
+# Also coalesce across processes (gunicorn workers, generation workers) through the InflightRequest table
+SINGLEFLIGHT_DB = os.getenv("AI_QUIZ_SINGLEFLIGHT_DB", "false").lower() == "true"
+SINGLEFLIGHT_LEASE = float(os.getenv("AI_QUIZ_SINGLEFLIGHT_LEASE", 180))  # seconds a leader may take before others give up on it
+SINGLEFLIGHT_RESULT_TTL = float(os.getenv("AI_QUIZ_SINGLEFLIGHT_RESULT_TTL", 30))  # seconds a finished result stays readable
+SINGLEFLIGHT_POLL_INTERVAL = float(os.getenv("AI_QUIZ_SINGLEFLIGHT_POLL_INTERVAL", 0.25))
+
+
+def fingerprint(*parts: Any) -> str:
+    """Stable key for a request, from anything with a stable repr (strings, numbers, sorted JSON)."""
+    return hashlib.sha256("\x1f".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+
+
+def is_error_result(result: Any) -> bool:
+    """The services report failures as {"error": ...} / {"success": False} dicts instead of raising."""
+    return isinstance(result, dict) and (bool(result.get("error")) or result.get("success") is False)
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time; concurrent callers with the same
+    key wait for the leader's result instead of making their own call.
+
+    Within a process, followers wait on the leader thread. With `use_db` the
+    leader thread also takes a row in the InflightRequest table, so leaders in
+    other processes wait for it and read its (JSON) result from that row. If a
+    leader dies, its lease expires and a follower takes over.
+    Followers get a copy of the result, so callers may mutate what they get back.
+    """
+
+    def __init__(self, use_db: bool = SINGLEFLIGHT_DB, lease: float = SINGLEFLIGHT_LEASE,
+                 result_ttl: float = SINGLEFLIGHT_RESULT_TTL, poll_interval: float = SINGLEFLIGHT_POLL_INTERVAL):
+        self.use_db = use_db
+        self.lease = lease
+        self.result_ttl = result_ttl
+        self.poll_interval = poll_interval
+        self._inflight: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+        self.db_coalesced = 0
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return copy.deepcopy(flight.result)
+
+        try:
+            flight.result = self._db_do(key, fn) if self.use_db else fn()
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            flight.done.set()
+
+    def _db_do(self, key: str, fn: Callable[[], Any]) -> Any:
+        from .models import InflightRequest
+
+        while True:
+            now = timezone.now()
+            try:
+                InflightRequest.objects.filter(key=key, expires_at__lte=now).delete()
+                with transaction.atomic():
+                    InflightRequest.objects.create(key=key, expires_at=now + timedelta(seconds=self.lease))
+            except IntegrityError:
+                # Another process leads; wait for its result
+                row = self._wait_for_other_process(key)
+                if row is not None:
+                    self.db_coalesced += 1
+                    return row.result
+                continue  # it failed or its lease ran out: try to lead ourselves
+            except DatabaseError as e:
+                logger.warning(f"Single-flight lock unavailable, calling directly: {e}")
+                return fn()
+            break
+
+        try:
+            result = fn()
+        except Exception:
+            InflightRequest.objects.filter(key=key).delete()
+            raise
+
+        if is_error_result(result):
+            # Not worth sharing for RESULT_TTL; waiters make their own call instead
+            InflightRequest.objects.filter(key=key).delete()
+            return result
+
+        try:
+            InflightRequest.objects.filter(key=key).update(
+                done=True, result=result, expires_at=timezone.now() + timedelta(seconds=self.result_ttl)
+            )
+        except (DatabaseError, TypeError, ValueError) as e:
+            # Unserializable result or DB trouble: release the key so waiters run the call themselves
+            logger.warning(f"Could not publish single-flight result for {key[:12]}: {e}")
+            InflightRequest.objects.filter(key=key).delete()
+        return result
+
+    def _wait_for_other_process(self, key: str):
+        from .models import InflightRequest
+
+        while True:
+            time.sleep(self.poll_interval)
+            row = InflightRequest.objects.filter(key=key).first()
+            if row is not None and row.done:
+                return row
+            if row is None or row.expires_at <= timezone.now():
+                return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "db": self.use_db,
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "db_coalesced": self.db_coalesced,
+            "inflight": len(self._inflight),
+        }
+
+
+# Shared by quiz generation and analysis calls; keys are prefixed per call type
+llm_flights = SingleFlight()
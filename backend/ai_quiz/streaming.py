@@ -0,0 +1,119 @@
+import re
+import json
+import logging
+from typing import Any, Dict, List, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+_TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+
+
+class IncrementalJSONArrayParser:
+    """
+    Pulls complete objects out of a JSON array while it is still being generated.
+
+    feed() takes the next chunk of model output and returns every top-level
+    object of the array whose closing brace has arrived since the last call.
+    Text before the opening '[' (markdown fences, chatter) is skipped, and
+    braces inside strings are ignored.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0            # next character of _buffer to scan
+        self._started = False    # seen the opening '['
+        self._finished = False   # seen the closing ']'
+        self._depth = 0          # nesting depth inside the array
+        self._in_string = False
+        self._escape = False
+        self._obj_start = None   # index in _buffer where the current item began
+        self.errors = 0          # items that closed but were not valid JSON
+
+    @property
+    def finished(self) -> bool:
+        return self._finished
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        if self._finished or not chunk:
+            return []
+
+        self._buffer += chunk
+        items = []
+        buf = self._buffer
+        i = self._pos
+
+        while i < len(buf):
+            ch = buf[i]
+
+            if not self._started:
+                if ch == "[":
+                    self._started = True
+                i += 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                if self._depth == 0 and ch == "{":
+                    self._obj_start = i
+                self._depth += 1
+            elif ch in "}]":
+                if self._depth == 0:
+                    if ch == "]":
+                        self._finished = True
+                        i += 1
+                        break
+                else:
+                    self._depth -= 1
+                    if self._depth == 0 and self._obj_start is not None:
+                        item = self._decode(buf[self._obj_start:i + 1])
+                        if item is not None:
+                            items.append(item)
+                        self._obj_start = None
+            i += 1
+
+        # Drop everything we no longer need so the buffer stays one item long
+        keep_from = self._obj_start if self._obj_start is not None else i
+        self._buffer = buf[keep_from:]
+        self._pos = i - keep_from
+        if self._obj_start is not None:
+            self._obj_start = 0
+        return items
+
+    def _decode(self, text: str):
+        try:
+            item = json.loads(text)
+        except json.JSONDecodeError as e:
+            try:
+                # The usual model slip: a trailing comma before } or ]
+                item = json.loads(_TRAILING_COMMA_RE.sub(r"\1", text))
+            except json.JSONDecodeError:
+                self.errors += 1
+                logger.warning(f"Skipping malformed streamed item: {e}")
+                return None
+        return item if isinstance(item, dict) else None
+
+
+def salvage_json_array(text: str) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Every complete object of the first JSON array in `text`, even when the array
+    was cut off (max_tokens) or has a broken item somewhere in the middle.
+
+    Returns (items, {"complete": saw the closing ']', "malformed": items skipped}).
+    """
+    parser = IncrementalJSONArrayParser()
+    items = parser.feed(text or "")
+    return items, {"complete": parser.finished, "malformed": parser.errors}
+
+
+def sse_event(event: str, data: Any) -> str:
+    """Formats one Server-Sent-Events message."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
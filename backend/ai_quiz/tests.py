@@ -1,3 +1,643 @@
-from django.test import TestCase
+import itertools
+import json
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from email.utils import formatdate
+from unittest import mock
 
-# Create your tests here.
+import requests
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from django.utils import timezone
+
+from accounts.models import User
+from quiz.models import Quiz, Question
+from .cache import QuizResultCache
+from .chunking import Chunk, allocate_questions, split_into_chunks
+from .dedup import TeacherQuestionIndexes
+from .fanout import fanout_workers, split_count
+from .jobs import JOB_STALE_AFTER, _finish_job, claim_next_job
+from .llm_stub import StubLLM
+from .llm_client import CircuitBreaker, LLMClient, LLMError, _retry_after_seconds
+from .models import GenerationJob
+from .pdf_extraction import PDFExtractionError, extract_text
+from .prompt_encoding import encode_questions, legacy_prompt_tokens
+from .scheduler import LLMScheduler, RateLimitTimeout
+from .services import (
+    _fan_out_quiz, analyze_weak_topics_with_ai, build_quiz_payload, build_repair_messages, extract_pdf_text,
+    generate_quiz_map_reduce, generate_quiz_with_ai, repair_questions_with_ai,
+)
+from .singleflight import SingleFlight
+from .streaming import salvage_json_array
+from .validation import is_valid_question
+
+
+def stub_chat(stub):
+    """Stands in for llm_client.chat, answering from StubLLM without its HTTP server."""
+    def chat(payload, label="chat", deadline=None):
+        _, content, finish_reason, usage = stub.complete(payload)
+        return {"choices": [{"message": {"content": content}, "finish_reason": finish_reason}], "usage": usage}
+    return chat
+
+
+class StubLLMTests(TestCase):
+    SOURCE = "Photosynthesis converts light energy into chemical energy inside chloroplasts."
+
+    def test_generate_returns_the_requested_valid_questions(self):
+        kind, content, finish_reason, usage = StubLLM().complete(
+            build_quiz_payload(self.SOURCE, 4, "medium", 0.1, structured=False)
+        )
+        questions = json.loads(content)
+        self.assertEqual((kind, finish_reason, len(questions)), ("generate", "stop", 4))
+        self.assertTrue(all(is_valid_question(q) for q in questions))
+        self.assertEqual(usage["total_tokens"], usage["prompt_tokens"] + usage["completion_tokens"])
+
+    def test_repair_answers_every_broken_item_by_id(self):
+        broken = [({"question": "Q?", "options": ["a", "a"], "answer": 0}, ["wrong_option_count"])] * 3
+        kind, content, _, _ = StubLLM().complete({"messages": build_repair_messages(self.SOURCE, broken)})
+        self.assertEqual(kind, "repair")
+        self.assertEqual([q["id"] for q in json.loads(content)], [0, 1, 2])
+
+        with mock.patch("ai_quiz.services.llm_client.chat", stub_chat(StubLLM())):
+            repaired = repair_questions_with_ai(self.SOURCE, broken)
+        self.assertEqual(len(repaired), 3)
+        self.assertTrue(all(is_valid_question(q) and "id" not in q for q in repaired))
+
+    def test_truncated_completion_is_salvaged(self):
+        stub = StubLLM(truncate_rate=1.0)
+        _, content, finish_reason, _ = stub.complete(build_quiz_payload(self.SOURCE, 6, "medium", 0.1, structured=False))
+        self.assertEqual((finish_reason, stub.stats()["truncated"]), ("length", 1))
+        items, info = salvage_json_array(content)
+        self.assertFalse(info["complete"])
+        self.assertLess(len(items), 6)
+
+        # max_tokens cuts the completion too, and generation tops up what was lost
+        with mock.patch("ai_quiz.services.GROK_API_KEY", "test"), \
+                mock.patch("ai_quiz.services.quiz_cache", QuizResultCache()), \
+                mock.patch("ai_quiz.services.completion_tokens", lambda n: 60 * n), \
+                mock.patch("ai_quiz.services.llm_client.chat", stub_chat(StubLLM())):
+            result = generate_quiz_with_ai(self.SOURCE, 4, use_cache=False)
+        self.assertTrue(result["salvage"]["truncated"])
+        self.assertEqual(result["salvage"]["topup_rounds"], 1)
+        self.assertTrue(0 < len(result["questions"]) < 4)
+        self.assertTrue(all(is_valid_question(q) for q in result["questions"]))
+
+    def test_other_prompts_get_an_analysis(self):
+        kind, content, _, _ = StubLLM().complete({"messages": [{"role": "user", "content": "Analyze these answers"}]})
+        self.assertEqual(kind, "analysis")
+        self.assertIn("weak_topics", json.loads(content))
+
+
+class QuizCacheTests(TestCase):
+    def setUp(self):
+        self.stub = StubLLM()
+        self.patches = [
+            mock.patch("ai_quiz.services.GROK_API_KEY", "test"),
+            mock.patch("ai_quiz.services.quiz_cache", QuizResultCache()),
+            mock.patch("ai_quiz.services.llm_client.chat", stub_chat(self.stub)),
+        ]
+        for patch in self.patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_key_covers_every_parameter_but_whitespace(self):
+        key = QuizResultCache.make_key("Photosynthesis in plants", 5, "medium", "model", 0.1)
+        self.assertEqual(key, QuizResultCache.make_key("  Photosynthesis\n in   plants ", 5, "Medium", "model", 0.1))
+        for other in (
+            QuizResultCache.make_key("Photosynthesis in plants", 6, "medium", "model", 0.1),
+            QuizResultCache.make_key("Photosynthesis in plants", 5, "hard", "model", 0.1),
+            QuizResultCache.make_key("Photosynthesis in plants", 5, "medium", "other-model", 0.1),
+            QuizResultCache.make_key("Photosynthesis in plants", 5, "medium", "model", 0.7),
+            QuizResultCache.make_key("Photosynthesis in plants", 5, "medium", "model", 0.1, ["What is ATP?"]),
+        ):
+            self.assertNotEqual(key, other)
+
+    def test_repeat_request_is_served_from_cache(self):
+        first = generate_quiz_with_ai("Photosynthesis in plants", 3)
+        second = generate_quiz_with_ai("Photosynthesis in plants", 3)
+        self.assertEqual(self.stub.stats()["calls.generate"], 1)
+        self.assertTrue(second["cached"])
+        self.assertEqual(second["questions"], first["questions"])
+
+    def test_avoid_questions_miss_the_cache(self):
+        first = generate_quiz_with_ai("Photosynthesis in plants", 3)
+        generate_quiz_with_ai("Photosynthesis in plants", 3, avoid_questions=[first["questions"][0]["question"]])
+        self.assertEqual(self.stub.stats()["calls.generate"], 2)
+
+    def test_fresh_skips_the_lookup_and_refreshes_the_entry(self):
+        first = generate_quiz_with_ai("Photosynthesis in plants", 3)
+        fresh = generate_quiz_with_ai("Photosynthesis in plants", 3, use_cache=False)
+        self.assertEqual(self.stub.stats()["calls.generate"], 2)
+        self.assertNotIn("cached", fresh)
+        self.assertNotEqual(fresh["questions"], first["questions"])
+        self.assertEqual(generate_quiz_with_ai("Photosynthesis in plants", 3)["questions"], fresh["questions"])
+
+
+class ChunkingTests(TestCase):
+    def _chunks(self, *tokens):
+        return [Chunk(index=i, text="x", tokens=t) for i, t in enumerate(tokens)]
+
+    def test_largest_remainder_allocation(self):
+        self.assertEqual(allocate_questions(self._chunks(50, 30, 20), 7), [4, 2, 1])
+        self.assertEqual(allocate_questions(self._chunks(10, 10, 10, 70), 2), [0, 0, 0, 2])
+        self.assertEqual(allocate_questions(self._chunks(1, 1, 1), 10), [4, 3, 3])
+        self.assertEqual(allocate_questions(self._chunks(0, 0), 5), [0, 0])
+
+    def test_chunks_fit_the_budget_and_keep_headings(self):
+        sentence = "Chlorophyll absorbs red and blue light in the leaf. "
+        text = "\n\n".join(f"CHAPTER {n}\n" + sentence * 60 for n in range(1, 4))
+        chunks = split_into_chunks(text, max_tokens=400)
+        self.assertGreater(len(chunks), 3)
+        self.assertTrue(all(c.tokens <= 400 for c in chunks))
+        self.assertEqual([c.heading for c in chunks][0], "CHAPTER 1")
+        self.assertEqual({c.heading for c in chunks}, {"CHAPTER 1", "CHAPTER 2", "CHAPTER 3"})
+        self.assertEqual(sum(c.text.count("Chlorophyll") for c in chunks), 180)
+
+    def test_map_reduce_generates_each_chunks_share(self):
+        requested, serial = [], itertools.count()
+
+        def generate_for_chunk(source_text, num_questions, *args):
+            requested.append(num_questions)
+            return {"success": True, "questions": [
+                {"question": f"Question {next(serial)}?", "options": ["a", "b", "c", "d"], "answer": 0}
+                for _ in range(num_questions)
+            ]}
+
+        text = "\n\n".join(f"CHAPTER {n}\n" + f"Topic {n} sentence about cells. " * 40 * n for n in range(1, 4))
+        with mock.patch("ai_quiz.services.split_into_chunks", lambda text: split_into_chunks(text, max_tokens=400)), \
+                mock.patch("ai_quiz.services._generate_for_chunk", generate_for_chunk):
+            result = generate_quiz_map_reduce("Cells", "", text, num_questions=6)
+        chunks = split_into_chunks(text, max_tokens=400)
+        self.assertEqual(sorted(requested), sorted(c for c in allocate_questions(chunks, 6) if c))
+        self.assertEqual(len(result["questions"]), 6)
+        self.assertTrue(all("source_chunk" in q for q in result["questions"]))
+
+
+class ClaimJobTests(TestCase):
+    def setUp(self):
+        self.teacher = User.objects.create_user(email="teacher@example.com", password="pw", username="teacher", role="teacher")
+
+    def _running_job(self, started_ago):
+        return GenerationJob.objects.create(
+            teacher=self.teacher, topic="Photosynthesis", status=GenerationJob.STATUS_RUNNING,
+            started_at=timezone.now() - started_ago,
+        )
+
+    def test_claims_queued_job(self):
+        job = GenerationJob.objects.create(teacher=self.teacher, topic="Photosynthesis")
+        claimed = claim_next_job()
+        self.assertEqual(claimed.id, job.id)
+        self.assertEqual(GenerationJob.objects.get(id=job.id).status, GenerationJob.STATUS_RUNNING)
+        self.assertIsNone(claim_next_job())
+
+    def test_reclaims_job_whose_worker_died(self):
+        job = self._running_job(timedelta(seconds=JOB_STALE_AFTER + 60))
+        claimed = claim_next_job()
+        self.assertEqual(claimed.id, job.id)
+        self.assertGreater(GenerationJob.objects.get(id=job.id).started_at, timezone.now() - timedelta(minutes=1))
+
+    def test_leaves_recently_started_job_alone(self):
+        self._running_job(timedelta(seconds=30))
+        self.assertIsNone(claim_next_job())
+
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+    def test_only_the_current_claim_finishes_a_reclaimed_job(self):
+        job = self._running_job(timedelta(seconds=JOB_STALE_AFTER + 60))
+        job.pdf.save("source.pdf", ContentFile(b"%PDF-1.4"))
+        original = GenerationJob.objects.get(id=job.id)
+        reclaimed = claim_next_job()
+
+        self.assertFalse(_finish_job(original, GenerationJob.STATUS_FAILED, error="late"))
+        self.assertTrue(reclaimed.pdf.storage.exists(reclaimed.pdf.name))
+        self.assertTrue(_finish_job(reclaimed, GenerationJob.STATUS_SUCCEEDED, result={"success": True}))
+        self.assertFalse(reclaimed.pdf.storage.exists(job.pdf.name))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error), (GenerationJob.STATUS_SUCCEEDED, ""))
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, body=None, text=None, headers=None):
+        self.status_code = status_code
+        self.text = text if text is not None else json.dumps(body or {})
+        self.headers = headers or {}
+        self.closed = False
+
+    def json(self):
+        return json.loads(self.text)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"{self.status_code} error")
+
+    def close(self):
+        self.closed = True
+
+
+class FakeStreamResponse(FakeResponse):
+    def __init__(self, lines):
+        super().__init__(200, text="")
+        self.lines = lines
+
+    def iter_lines(self, decode_unicode=False):
+        yield from self.lines
+
+
+class FakeSession:
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = 0
+
+    def post(self, url, json=None, timeout=None, stream=False):
+        self.calls += 1
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+class StreamChatBreakerTests(TestCase):
+    """A stream that was the half-open trial call must always settle the breaker."""
+
+    LINES = [
+        'data: {"choices": [{"delta": {"content": "[{\\"question\\""}}]}',
+        'data: {"choices": [{"delta": {"content": ": \\"Q?\\"}]"}}]}',
+        "data: [DONE]",
+    ]
+
+    def _client(self, deadline_in):
+        client = LLMClient(api_key="test", breaker=CircuitBreaker(threshold=1, reset_timeout=0))
+        client.breaker.record_failure()
+        self.assertTrue(client.breaker.allow())  # this call is the trial
+        self.assertEqual(client.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.response = FakeStreamResponse(self.LINES)
+        client._send = lambda payload, label, deadline, stream=False: (
+            self.response, time.monotonic(), 0, time.monotonic() + deadline_in, 0
+        )
+        return client
+
+    def test_timed_out_stream_reopens_breaker(self):
+        client = self._client(deadline_in=-1)
+        with self.assertRaises(LLMError) as ctx:
+            list(client.stream_chat({"messages": []}))
+        self.assertEqual(ctx.exception.code, "timeout")
+        self.assertEqual(client.breaker.state, CircuitBreaker.OPEN)
+        self.assertTrue(self.response.closed)
+
+    def test_abandoned_stream_closes_breaker(self):
+        client = self._client(deadline_in=60)
+        stream = client.stream_chat({"messages": []})
+        next(stream)
+        stream.close()
+        self.assertEqual(client.breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(self.response.closed)
+        self.assertTrue(client.breaker.allow())
+
+    def test_completed_stream_closes_breaker(self):
+        client = self._client(deadline_in=60)
+        self.assertEqual("".join(client.stream_chat({"messages": []})), '[{"question": "Q?"}]')
+        self.assertEqual(client.breaker.state, CircuitBreaker.CLOSED)
+
+
+@mock.patch("ai_quiz.pdf_extraction._resolve_backend", lambda path, backend: (backend, 2))
+class ExtractTextTests(TestCase):
+    PAGES = ["first page " * 5, "second page " * 5]
+
+    def test_text_store_key_includes_limits(self):
+        upload = ContentFile(b"%PDF-1.4 same bytes")
+        with mock.patch("ai_quiz.pdf_extraction._extract_page_range", lambda path, backend, start, stop: self.PAGES[start:stop]):
+            short = extract_text(upload, char_budget=20)
+            full = extract_text(upload, char_budget=1000)
+            first_page = extract_text(upload, char_budget=1000, max_pages=1)
+        self.assertLessEqual(len(short), 20)
+        self.assertIn("second page", full)
+        self.assertNotIn("second page", first_page)
+
+    def test_backend_errors_become_extraction_errors(self):
+        def broken_page(path, backend, start, stop):
+            raise RuntimeError("damaged xref table")
+
+        with mock.patch("ai_quiz.pdf_extraction._extract_page_range", broken_page):
+            with self.assertRaises(PDFExtractionError):
+                extract_text(ContentFile(b"%PDF-1.4 broken"))
+            self.assertEqual(extract_pdf_text(ContentFile(b"%PDF-1.4 broken")), "")
+
+
+class QuestionFeatureScopeTests(TestCase):
+    def setUp(self):
+        teacher = User.objects.create_user(email="teacher@example.com", password="pw", username="teacher", role="teacher")
+        self.quiz = Quiz.objects.create(teacher=teacher, title="Plants")
+        self.question = Question.objects.create(quiz=self.quiz, text="Which gas is released?", option_a="Oxygen",
+                                                option_b="Helium", option_c="Neon", option_d="Argon", correct_option="A")
+        Question.objects.filter(id=self.question.id).update(key_terms=["privatetermxyz"])
+        self.results = [{
+            "question_id": self.question.id, "question_text": "Which gas is released?",
+            "selected_option": "B", "selected_option_text": "Helium",
+            "correct_option": "A", "correct_option_text": "Oxygen", "is_correct": False,
+        }]
+
+    def _prompt(self, **kwargs):
+        payloads = []
+
+        def fake_analysis(payload, label):
+            payloads.append(payload)
+            return {"success": True, "weak_topics": []}
+
+        with mock.patch("ai_quiz.services.GROK_API_KEY", "test"), \
+                mock.patch("ai_quiz.services.request_json_analysis", fake_analysis):
+            analyze_weak_topics_with_ai(self.results, **kwargs)
+        return payloads[0]["messages"][1]["content"]
+
+    def test_client_sent_ids_do_not_load_saved_features(self):
+        self.assertNotIn("privatetermxyz", self._prompt())
+        other = Quiz.objects.create(teacher=self.quiz.teacher, title="Other")
+        self.assertNotIn("privatetermxyz", self._prompt(quiz_id=other.id))
+
+    def test_attempt_quiz_uses_saved_features(self):
+        self.assertIn("privatetermxyz", self._prompt(quiz_id=self.quiz.id))
+
+
+class TeacherQuestionIndexTests(TestCase):
+    def setUp(self):
+        self.teacher = User.objects.create_user(email="teacher@example.com", password="pw", username="teacher", role="teacher")
+        self.quiz = Quiz.objects.create(teacher=self.teacher, title="Plants")
+        self.indexes = TeacherQuestionIndexes()
+
+    def _question(self, text, options):
+        return Question.objects.create(quiz=self.quiz, text=text, option_a=options[0], option_b=options[1],
+                                       option_c=options[2], option_d=options[3], correct_option="A")
+
+    def test_delete_then_add_refreshes_index(self):
+        gas = self._question("Which gas do plants release during photosynthesis?", ["Oxygen", "Helium", "Neon", "Argon"])
+        self._question("Which pigment makes leaves green?", ["Chlorophyll", "Carotene", "Melanin", "Keratin"])
+        self.assertIsNotNone(self.indexes.get(self.teacher.id).query(gas.text, ["Oxygen", "Helium", "Neon", "Argon"]))
+
+        gas.delete()
+        root = self._question("Which organ anchors a plant in the soil?", ["Root", "Stem", "Leaf", "Flower"])
+        index = self.indexes.get(self.teacher.id)
+        self.assertEqual(len(index), 2)
+        self.assertIsNone(index.query(gas.text, ["Oxygen", "Helium", "Neon", "Argon"]))
+        self.assertEqual(index.query(root.text, ["Root", "Stem", "Leaf", "Flower"])[0], root.id)
+
+
+class PromptEncodingTests(TestCase):
+    TOPICS = ["photosynthesis", "respiration", "osmosis", "mitosis", "enzymes", "genetics"]
+
+    def _summary(self, count):
+        return [{
+            "number": n,
+            "question": f"Which statement about {self.TOPICS[n % 6]} in plant cells is correct? (variant {n})",
+            "your_answer": f"It happens only at night in {self.TOPICS[(n + 1) % 6]}",
+            "correct_answer": f"It depends on {self.TOPICS[n % 6]} conditions",
+            "explanation": "",
+            "key_terms": [self.TOPICS[n % 6], "plant", "cell", f"variant{n}"],
+            "error_pattern": "confused_concepts",
+            "question_type": "conceptual",
+        } for n in range(1, count + 1)]
+
+    def test_table_is_smaller_than_indented_json(self):
+        questions = self._summary(10)
+        encoded = encode_questions(questions)
+        self.assertEqual((encoded["rows"], encoded["clustered"], encoded["omitted"]), (10, False, 0))
+        self.assertLess(encoded["tokens"] * 2, legacy_prompt_tokens(questions))
+        self.assertIn("|conceptual|C|", encoded["table"])
+
+    def test_large_summaries_cluster_within_budget(self):
+        questions = [{**q, "key_terms": q["key_terms"][:3]} for q in self._summary(300)]
+        encoded = encode_questions(questions, budget=1500)
+        self.assertTrue(encoded["clustered"])
+        self.assertLessEqual(encoded["tokens"], 1500)
+        self.assertEqual((encoded["rows"], encoded["omitted"]), (len(self.TOPICS), 0))
+
+    def test_smallest_clusters_are_omitted_last(self):
+        questions = [{**q, "key_terms": [f"unique{q['number']}"]} for q in self._summary(80)]
+        encoded = encode_questions(questions, budget=200)
+        self.assertGreater(encoded["omitted"], 0)
+        self.assertEqual(encoded["rows"] + encoded["omitted"], 80)
+        self.assertLessEqual(encoded["tokens"], 200)
+
+
+class AnalyzeWeakTopicsViewTests(TestCase):
+    def test_non_numeric_attempt_id_is_rejected(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(email="s@example.com", password="pw", username="s", role="student"))
+        resp = client.post("/api/ai/analyze-weak-topics/", {"attempt_id": "abc"}, format="json")
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(resp.json()["error"], "attempt_id_must_be_integer")
+
+        resp = client.post("/api/ai/analyze-weak-topics/", {"attempt_id": 12345}, format="json")
+        self.assertEqual(resp.status_code, 404)
+
+
+class DatabaseSingleFlightTests(TestCase):
+    def setUp(self):
+        self.flights = SingleFlight(use_db=True, result_ttl=30)
+        self.calls = 0
+
+    def _call(self, result):
+        def fn():
+            self.calls += 1
+            return result
+        return fn
+
+    def test_finished_result_is_shared_for_its_ttl(self):
+        self.flights.do("key", self._call({"success": True}))
+        self.assertEqual(self.flights.do("key", self._call({"success": True})), {"success": True})
+        self.assertEqual(self.calls, 1)
+
+    def test_error_results_are_not_published(self):
+        self.flights.do("key", self._call({"error": "rate_limited"}))
+        self.flights.do("key", self._call({"error": "rate_limited"}))
+        self.assertEqual(self.calls, 2)
+
+    def test_fresh_generation_bypasses_the_flight(self):
+        quiz = {"success": True, "questions": []}
+        with mock.patch("ai_quiz.services.GROK_API_KEY", "test"), \
+                mock.patch("ai_quiz.services.llm_flights", self.flights), \
+                mock.patch("ai_quiz.services._call_quiz_model", lambda *args, **kwargs: self._call(quiz)()):
+            generate_quiz_with_ai("Photosynthesis", 3, use_cache=False)
+            generate_quiz_with_ai("Photosynthesis", 3, use_cache=False)
+        self.assertEqual(self.calls, 2)
+
+
+class FanOutTests(TestCase):
+    def _fan_out(self, batch_result, num_questions=20):
+        with mock.patch("ai_quiz.services._call_quiz_model", lambda *args, **kwargs: batch_result), \
+                mock.patch("ai_quiz.services.llm_client.scheduler", LLMScheduler()):
+            return _fan_out_quiz("Photosynthesis", num_questions, "medium", 0.1, None, "key")
+
+    def test_empty_batches_fail_cleanly(self):
+        self.assertEqual(self._fan_out({"success": True, "questions": []}), {"error": "no_questions_generated"})
+
+    def test_all_duplicate_batches_fail_cleanly(self):
+        question = {"question": "Which gas is released?", "options": ["Oxygen", "Helium", "Neon", "Argon"], "answer": 0}
+        with mock.patch("ai_quiz.services.filter_duplicates", lambda questions, *indexes: ([], questions)):
+            result = self._fan_out({"success": True, "questions": [question]})
+        self.assertEqual(result, {"error": "no_questions_generated"})
+
+    def test_failed_batch_error_is_returned(self):
+        self.assertEqual(self._fan_out({"error": "rate_limited"}), {"error": "rate_limited"})
+
+    def test_default_token_budget_limits_workers(self):
+        question = {"question": "Which gas is released?", "options": ["Oxygen", "Helium", "Neon", "Argon"], "answer": 0}
+        result = self._fan_out({"success": True, "questions": [question]}, num_questions=40)
+        self.assertEqual(result["fanout"]["batches"], len(split_count(40)))
+        self.assertEqual(result["fanout"]["workers"], 1)
+
+        self.assertEqual(fanout_workers(3, 2500, 6000), 2)
+        self.assertEqual(fanout_workers(3, 2500, 60000), 3)
+        self.assertEqual(fanout_workers(8, 2500, 0), 4)
+
+
+class SchedulerTests(TestCase):
+    def _drained(self, requests_per_minute=300, tokens_per_minute=0):
+        scheduler = LLMScheduler(requests_per_minute, tokens_per_minute)
+        scheduler.requests.level = 0
+        scheduler.requests.updated = time.monotonic()
+        return scheduler
+
+    def test_priority_first_then_users_take_turns(self):
+        scheduler = self._drained()  # one request every 0.2s
+        admitted, threads = [], []
+        calls = [
+            ("a1", "generate_quiz", "alice"), ("a2", "generate_quiz", "alice"), ("a3", "generate_quiz", "alice"),
+            ("b1", "generate_quiz", "bob"), ("c1", "analyze_weak_topics", "carol"),
+        ]
+        for name, label, user in calls:
+            thread = threading.Thread(target=lambda name=name, label=label, user=user: (
+                scheduler.acquire(label, 0, timeout=5, user=user), admitted.append(name)
+            ))
+            thread.start()
+            threads.append(thread)
+            while sum(scheduler.stats()["queue_depth"].values()) < len(threads):
+                time.sleep(0.001)
+        for thread in threads:
+            thread.join()
+        self.assertEqual(admitted, ["c1", "a1", "b1", "a2", "a3"])
+
+    def test_no_budget_before_the_timeout(self):
+        scheduler = self._drained(requests_per_minute=1)
+        with self.assertRaises(RateLimitTimeout):
+            scheduler.acquire("generate_quiz", 0, timeout=0.05)
+        self.assertEqual(scheduler.stats()["timeouts"], 1)
+
+    def test_token_charge_is_corrected_by_real_usage(self):
+        scheduler = LLMScheduler(0, 6000)
+        charged = scheduler.acquire("generate_quiz", 2500)
+        self.assertEqual(charged, 2500)
+        scheduler.settle(charged, 400)
+        self.assertAlmostEqual(scheduler.stats()["tokens_available"], 5600, delta=5)
+        scheduler.release(scheduler.acquire("generate_quiz", 1000))  # admitted but never sent
+        self.assertAlmostEqual(scheduler.stats()["tokens_available"], 5600, delta=5)
+
+
+class LLMClientRetryTests(TestCase):
+    PAYLOAD = {"messages": [{"role": "user", "content": "Generate questions"}], "max_tokens": 100}
+    OK = {"choices": [{"message": {"content": "[]"}}], "usage": {"total_tokens": 50}}
+
+    def _client(self, *responses, **kwargs):
+        client = LLMClient(api_key="test", backoff_base=0, scheduler=LLMScheduler(0, 0), **kwargs)
+        client.session = FakeSession(*responses)
+        return client
+
+    def test_retry_after_header(self):
+        self.assertEqual(_retry_after_seconds(FakeResponse(429, headers={"Retry-After": "3"})), 3.0)
+        self.assertAlmostEqual(
+            _retry_after_seconds(FakeResponse(429, headers={"Retry-After": formatdate(time.time() + 30, usegmt=True)})), 30, delta=2
+        )
+        self.assertIsNone(_retry_after_seconds(FakeResponse(429, headers={"Retry-After": "soon"})))
+        self.assertIsNone(_retry_after_seconds(FakeResponse(429)))
+
+    def test_backoff_honours_retry_after_and_caps_jitter(self):
+        client = LLMClient(api_key="test", backoff_base=0.5, backoff_max=2)
+        self.assertEqual(client._backoff(0, FakeResponse(429, headers={"Retry-After": "4"})), 4.0)
+        self.assertTrue(all(0 <= client._backoff(attempt) <= 2 for attempt in range(10)))
+
+    def test_rate_limited_call_is_retried_and_pauses_the_scheduler(self):
+        client = self._client(
+            FakeResponse(429, headers={"Retry-After": "0"}),
+            requests.exceptions.ConnectionError("connection reset"),
+            FakeResponse(200, self.OK),
+        )
+        with mock.patch.object(client.scheduler, "pause") as pause:
+            self.assertEqual(client.chat(self.PAYLOAD), self.OK)
+        pause.assert_called_once_with(0.0)
+        self.assertEqual(client.session.calls, 3)
+        self.assertEqual(client.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_client_errors_are_not_retried_or_counted_against_the_upstream(self):
+        client = self._client(FakeResponse(400, {"error": "bad request"}), breaker=CircuitBreaker(threshold=1))
+        with self.assertRaises(LLMError):
+            client.chat(self.PAYLOAD)
+        self.assertEqual(client.session.calls, 1)
+        self.assertEqual(client.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_breaker_opens_fails_fast_then_closes_after_a_good_trial(self):
+        breaker = CircuitBreaker(threshold=2, reset_timeout=60)
+        client = self._client(*[FakeResponse(503, text="down")] * 4, FakeResponse(200, self.OK), max_retries=1, breaker=breaker)
+        for _ in range(2):
+            with self.assertRaises(LLMError):
+                client.chat(self.PAYLOAD)
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+        with self.assertRaises(LLMError) as ctx:
+            client.chat(self.PAYLOAD)
+        self.assertEqual(ctx.exception.code, "circuit_open")
+        self.assertEqual(client.session.calls, 4)
+
+        breaker.opened_at -= 60
+        self.assertEqual(client.chat(self.PAYLOAD), self.OK)
+        self.assertEqual((breaker.state, breaker.failures), (CircuitBreaker.CLOSED, 0))
+
+    def test_failed_trial_call_reopens_the_breaker(self):
+        breaker = CircuitBreaker(threshold=5, reset_timeout=0)
+        breaker.state, breaker.opened_at = CircuitBreaker.OPEN, time.monotonic()
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())  # only one trial call at a time
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+
+class LLMClientReservationTests(TestCase):
+    PAYLOAD = {"messages": [{"role": "user", "content": "Generate questions"}], "max_tokens": 2000}
+
+    def _client(self, *responses):
+        client = LLMClient(api_key="test", max_retries=1, backoff_base=0, scheduler=LLMScheduler(0, 6000))
+        client.session = FakeSession(*responses)
+        return client
+
+    def _spent(self, client):
+        return 6000 - client.scheduler.stats()["tokens_available"]
+
+    def test_client_error_settles_reservation(self):
+        response = FakeResponse(400, {"error": "bad request"})
+        client = self._client(response)
+        with self.assertRaises(LLMError) as ctx:
+            client.chat(self.PAYLOAD)
+        self.assertEqual(ctx.exception.status_code, 400)
+        self.assertLess(self._spent(client), 100)
+        self.assertTrue(response.closed)
+
+    def test_invalid_json_settles_reservation(self):
+        client = self._client(FakeResponse(200, text="<html>oops</html>"))
+        with self.assertRaises(LLMError) as ctx:
+            client.chat(self.PAYLOAD)
+        self.assertEqual(ctx.exception.code, "invalid_json")
+        self.assertLess(self._spent(client), 100)
+
+    def test_retried_stream_response_is_closed(self):
+        failed = FakeResponse(503, text="unavailable")
+        client = self._client(failed, FakeStreamResponse(StreamChatBreakerTests.LINES))
+        self.assertEqual("".join(client.stream_chat(self.PAYLOAD)), '[{"question": "Q?"}]')
+        self.assertTrue(failed.closed)
+        self.assertLess(self._spent(client), 100)
+
+    def test_exhausted_retries_settle_reservation(self):
+        responses = [FakeResponse(503, text="unavailable"), FakeResponse(503, text="unavailable")]
+        client = self._client(*responses)
+        with self.assertRaises(LLMError):
+            client.chat(self.PAYLOAD)
+        self.assertTrue(all(r.closed for r in responses))
+        self.assertLess(self._spent(client), 100)
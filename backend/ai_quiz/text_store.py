@@ -0,0 +1,108 @@
+import os
+import re
+import hashlib
+import logging
+from datetime import timedelta
+from typing import Callable, Optional
+
+from django.db import DatabaseError
+from django.db.models import Sum
+from django.utils import timezone
+
+
+logger = logging.getLogger(__name__)
+
+TEXT_STORE_MAX_BYTES = int(os.getenv("AI_QUIZ_TEXT_STORE_MAX_BYTES", 512 * 1024 * 1024))
+
+_SPACES_RE = re.compile(r"[ \t\f\v\u00a0]+")
+_BLANK_LINES_RE = re.compile(r"\n\s*\n\s*\n+")
+
+
+def normalize_extracted_text(text: str) -> str:
+    """Collapses runs of spaces and blank lines but keeps paragraph breaks (chunking relies on them)."""
+    text = (text or "").replace("\r\n", "\n").replace("\r", "\n")
+    text = _SPACES_RE.sub(" ", text)
+    text = "\n".join(line.strip() for line in text.split("\n"))
+    return _BLANK_LINES_RE.sub("\n\n", text).strip()
+
+
+def content_key(source_type: str, identifier: str) -> str:
+    """Key for sources that are not addressed by their bytes (e.g. a YouTube video id)."""
+    return hashlib.sha256(f"{source_type}:{identifier}".encode("utf-8")).hexdigest()
+
+
+class TextStore:
+    """
+    Content-addressed store of extracted source text (PDF text, transcripts, ...),
+    backed by the ExtractedText table. Entries are keyed by a SHA-256 (of the
+    upload bytes for files, or content_key() for remote sources). The table is
+    kept under `max_bytes` of text by evicting the least recently used entries.
+    """
+
+    def __init__(self, max_bytes: int = TEXT_STORE_MAX_BYTES):
+        self.max_bytes = max_bytes
+
+    def get(self, key: str, max_age: Optional[float] = None) -> Optional[str]:
+        from .models import ExtractedText
+
+        try:
+            entry = ExtractedText.objects.filter(key=key).only("id", "text", "created_at").first()
+            if entry is None:
+                return None
+            if max_age is not None and entry.created_at < timezone.now() - timedelta(seconds=max_age):
+                return None
+            ExtractedText.objects.filter(id=entry.id).update(last_used_at=timezone.now())
+            return entry.text
+        except DatabaseError as e:
+            logger.warning(f"Text store read failed: {e}")
+            return None
+
+    def put(self, key: str, text: str, source_type: str):
+        from .models import ExtractedText
+
+        now = timezone.now()
+        try:
+            ExtractedText.objects.update_or_create(
+                key=key,
+                defaults={
+                    "source_type": source_type,
+                    "text": text,
+                    "size": len(text.encode("utf-8")),
+                    "created_at": now,
+                    "last_used_at": now,
+                },
+            )
+            self._evict()
+        except DatabaseError as e:
+            logger.warning(f"Text store write failed: {e}")
+
+    def get_or_extract(self, key: str, source_type: str, extract: Callable[[], str], max_age: Optional[float] = None) -> str:
+        """Returns the stored text for `key`, or runs `extract`, normalizes and stores its result."""
+        text = self.get(key, max_age=max_age)
+        if text is not None:
+            logger.info(f"Text store hit for {source_type} {key[:12]}")
+            return text
+
+        text = normalize_extracted_text(extract())
+        if text:
+            self.put(key, text, source_type)
+        return text
+
+    def _evict(self):
+        from .models import ExtractedText
+
+        total = ExtractedText.objects.aggregate(total=Sum("size"))["total"] or 0
+        if total <= self.max_bytes:
+            return
+
+        doomed = []
+        for entry_id, size in ExtractedText.objects.order_by("last_used_at").values_list("id", "size").iterator():
+            if total <= self.max_bytes:
+                break
+            doomed.append(entry_id)
+            total -= size
+        ExtractedText.objects.filter(id__in=doomed).delete()
+        logger.info(f"Text store evicted {len(doomed)} entries")
+
+
+text_store = TextStore()
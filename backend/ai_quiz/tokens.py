@@ -0,0 +1,20 @@
+import re
+
+
+# Llama/GPT-style BPE tokenizers average roughly 4 characters of English per token.
+CHARS_PER_TOKEN = 4
+
+_WORD_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap local estimate of how many tokens `text` costs, without a tokenizer.
+    Takes the larger of the character- and word-based estimates so that
+    punctuation-heavy text (code, formulas, JSON) is not undercounted.
+    """
+    if not text:
+        return 0
+    by_chars = len(text) / CHARS_PER_TOKEN
+    by_words = len(_WORD_RE.findall(text)) * 0.75
+    return max(1, int(max(by_chars, by_words) + 0.5))
@@ -0,0 +1,151 @@
+import os
+import time
+import logging
+from pathlib import Path
+from typing import Dict, Optional
+
+from django.utils.module_loading import import_string
+
+from .cache import LRUCache
+from .singleflight import SingleFlight
+from .text_store import text_store, content_key, normalize_extracted_text
+
+
+logger = logging.getLogger(__name__)
+
+TRANSCRIPT_TTL = int(os.getenv("AI_QUIZ_TRANSCRIPT_TTL", 7 * 24 * 3600))  # seconds
+TRANSCRIPT_NEGATIVE_TTL = int(os.getenv("AI_QUIZ_TRANSCRIPT_NEGATIVE_TTL", 10 * 60))
+TRANSCRIPT_MAX_ENTRIES = int(os.getenv("AI_QUIZ_TRANSCRIPT_MAX_ENTRIES", 128))
+# Dotted path of the TranscriptFetcher class to use, e.g. "ai_quiz.transcripts.LocalTranscriptFetcher"
+TRANSCRIPT_FETCHER = os.getenv("AI_QUIZ_TRANSCRIPT_FETCHER", "ai_quiz.transcripts.YouTubeTranscriptFetcher")
+
+
+class TranscriptUnavailable(Exception):
+    """
+    The transcript could not be fetched. `permanent` is True when retrying is
+    pointless (transcripts disabled, video removed, ...); only those are negative-cached.
+    """
+
+    def __init__(self, message: str, permanent: bool = False):
+        super().__init__(message)
+        self.permanent = permanent
+
+
+class TranscriptFetcher:
+    """Interface for transcript sources. fetch() returns plain text or raises TranscriptUnavailable."""
+
+    def fetch(self, video_id: str) -> str:
+        raise NotImplementedError
+
+
+class YouTubeTranscriptFetcher(TranscriptFetcher):
+    def __init__(self):
+        from youtube_transcript_api import YouTubeTranscriptApi
+        self.api = YouTubeTranscriptApi()
+
+    def fetch(self, video_id: str) -> str:
+        import youtube_transcript_api as yta
+
+        permanent_errors = (
+            yta.TranscriptsDisabled, yta.NoTranscriptFound, yta.VideoUnavailable,
+            yta.VideoUnplayable, yta.InvalidVideoId, yta.AgeRestricted,
+        )
+        try:
+            transcript = self.api.fetch(video_id)
+        except permanent_errors as e:
+            raise TranscriptUnavailable(str(e), permanent=True) from e
+        except Exception as e:
+            raise TranscriptUnavailable(str(e)) from e
+        return " ".join(snippet.text for snippet in transcript.snippets)
+
+
+class LocalTranscriptFetcher(TranscriptFetcher):
+    """
+    Stand-in for tests and benchmarks: serves `<directory>/<video_id>.txt` (or an
+    in-memory dict) with an optional artificial delay instead of calling YouTube.
+    """
+
+    def __init__(self, directory: Optional[str] = None, transcripts: Optional[Dict[str, str]] = None, delay: float = None):
+        self.directory = Path(directory or os.getenv("AI_QUIZ_TRANSCRIPT_DIR", "transcripts"))
+        self.transcripts = transcripts
+        self.delay = float(os.getenv("AI_QUIZ_TRANSCRIPT_DELAY", 0)) if delay is None else delay
+        self.calls = 0
+
+    def fetch(self, video_id: str) -> str:
+        self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        if self.transcripts is not None:
+            if video_id not in self.transcripts:
+                raise TranscriptUnavailable(f"No transcript for {video_id}", permanent=True)
+            return self.transcripts[video_id]
+        path = self.directory / f"{video_id}.txt"
+        if not path.is_file():
+            raise TranscriptUnavailable(f"No transcript for {video_id}", permanent=True)
+        return path.read_text(encoding="utf-8")
+
+
+class TranscriptCache:
+    """
+    Video-id keyed transcript cache.
+
+    Lookups go memory LRU -> persistent text store (both honoring `ttl`) ->
+    negative cache -> fetcher. Permanent failures are remembered for the shorter
+    `negative_ttl`. Concurrent lookups for the same id share one fetch.
+    """
+
+    def __init__(self, fetcher: TranscriptFetcher = None, ttl: int = TRANSCRIPT_TTL,
+                 negative_ttl: int = TRANSCRIPT_NEGATIVE_TTL, max_entries: int = TRANSCRIPT_MAX_ENTRIES):
+        self._fetcher = fetcher
+        self.ttl = ttl
+        self.memory = LRUCache(max_entries=max_entries, ttl=ttl)
+        self.negative = LRUCache(max_entries=max_entries * 4, ttl=negative_ttl)
+        self._flights = SingleFlight(use_db=False)
+        self.fetches = 0
+
+    @property
+    def fetcher(self) -> TranscriptFetcher:
+        if self._fetcher is None:
+            self._fetcher = import_string(TRANSCRIPT_FETCHER)()
+        return self._fetcher
+
+    def set_fetcher(self, fetcher: TranscriptFetcher):
+        self._fetcher = fetcher
+
+    def get(self, video_id: str) -> str:
+        text = self.memory.get(video_id)
+        if text is not None:
+            return text
+
+        failure = self.negative.get(video_id)
+        if failure is not None:
+            raise TranscriptUnavailable(failure, permanent=True)
+
+        return self._flights.do(video_id, lambda: self._load(video_id))
+
+    def _load(self, video_id: str) -> str:
+        key = content_key("youtube", video_id)
+        text = text_store.get(key, max_age=self.ttl)
+        if text is None:
+            self.fetches += 1
+            try:
+                text = normalize_extracted_text(self.fetcher.fetch(video_id))
+            except TranscriptUnavailable as e:
+                if e.permanent:
+                    self.negative.set(video_id, str(e))
+                raise
+            if text:
+                text_store.put(key, text, "youtube")
+        self.memory.set(video_id, text)
+        return text
+
+    def stats(self):
+        return {
+            "memory": self.memory.stats(),
+            "negative": self.negative.stats(),
+            "fetches": self.fetches,
+            "coalesced": self._flights.coalesced,
+        }
+
+
+transcript_cache = TranscriptCache()
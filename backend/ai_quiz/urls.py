@@ -1,8 +1,13 @@
 from django.urls import path
-from .views import GenerateQuizAPIView, AnalyzeWeakTopicsAPIView,GetTextOutOfUrl
+from .views import GenerateQuizAPIView, AnalyzeWeakTopicsAPIView,GetTextOutOfUrl, GenerationJobDetailView, CancelGenerationJobView, AIServiceStatsView, GenerateQuizStreamAPIView, QuizClassAnalysisView
 
 urlpatterns = [
     path("get-text-outofurl/",GetTextOutOfUrl.as_view(), name="get-text-outofurl"),
     path("generate-quiz/", GenerateQuizAPIView.as_view(), name="ai-generate-quiz"),
+    path("generate-quiz/stream/", GenerateQuizStreamAPIView.as_view(), name="ai-generate-quiz-stream"),
+    path("generate-quiz/jobs/<int:job_id>/", GenerationJobDetailView.as_view(), name="ai-generation-job"),
+    path("generate-quiz/jobs/<int:job_id>/cancel/", CancelGenerationJobView.as_view(), name="ai-generation-job-cancel"),
     path("analyze-weak-topics/", AnalyzeWeakTopicsAPIView.as_view(), name="analyze-weak-topics"),
+    path("quizzes/<int:quiz_id>/class-analysis/", QuizClassAnalysisView.as_view(), name="ai-quiz-class-analysis"),
+    path("stats/", AIServiceStatsView.as_view(), name="ai-stats"),
 ]
\ No newline at end of file
@@ -0,0 +1,190 @@
+import os
+import re
+from typing import Any, List, Tuple
+
+
+OPTIONS_PER_QUESTION = 4  # Question stores option_a..option_d
+OPTION_LETTERS = "ABCD"
+
+# Defects nothing can fix: there is no question to repair
+UNREPAIRABLE_DEFECTS = {"not_object", "missing_question"}
+
+_OPTION_LABEL_RE = re.compile(r"^\(?([A-Da-d])\s*[).:\-]\s+")
+
+# Constrain the model's output at the API level: "" (prompt only), "json_object" or "json_schema".
+# Both wrap the array as {"questions": [...]} since JSON mode requires a top-level object.
+GROK_RESPONSE_FORMAT = os.getenv("GROK_RESPONSE_FORMAT", "").strip().lower()
+
+QUESTION_JSON_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "questions": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "question": {"type": "string"},
+                    "options": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "minItems": OPTIONS_PER_QUESTION,
+                        "maxItems": OPTIONS_PER_QUESTION,
+                    },
+                    "answer": {"type": "integer", "minimum": 0, "maximum": OPTIONS_PER_QUESTION - 1},
+                    "explanation": {"type": "string"},
+                },
+                "required": ["question", "options", "answer", "explanation"],
+                "additionalProperties": False,
+            },
+        },
+    },
+    "required": ["questions"],
+    "additionalProperties": False,
+}
+
+
+def response_format(mode: str = GROK_RESPONSE_FORMAT):
+    """The chat-completions `response_format` for `mode`, or None to rely on the prompt alone."""
+    if mode == "json_object":
+        return {"type": "json_object"}
+    if mode == "json_schema":
+        return {"type": "json_schema", "json_schema": {"name": "quiz_questions", "schema": QUESTION_JSON_SCHEMA}}
+    return None
+
+
+def question_defects(q: Any) -> List[str]:
+    """
+    What is wrong with one generated question; empty when it can be saved as is.
+    Codes: not_object, missing_question, missing_options, wrong_option_count,
+    empty_option, duplicate_options, bad_answer, answer_out_of_range.
+    """
+    if not isinstance(q, dict):
+        return ["not_object"]
+
+    defects = []
+    if not isinstance(q.get("question"), str) or not q["question"].strip():
+        defects.append("missing_question")
+
+    options = q.get("options")
+    if not isinstance(options, list):
+        defects.append("missing_options")
+        options = []
+    else:
+        if len(options) != OPTIONS_PER_QUESTION:
+            defects.append("wrong_option_count")
+        texts = [" ".join(str(o).split()).lower() if isinstance(o, (str, int, float)) else "" for o in options]
+        if any(not t for t in texts):
+            defects.append("empty_option")
+        if len(set(t for t in texts if t)) < len([t for t in texts if t]):
+            defects.append("duplicate_options")
+
+    answer = q.get("answer")
+    if not isinstance(answer, int) or isinstance(answer, bool):
+        defects.append("bad_answer")
+    elif not 0 <= answer < min(len(options), OPTIONS_PER_QUESTION) and "missing_options" not in defects:
+        defects.append("answer_out_of_range")
+
+    return defects
+
+
+def is_valid_question(q: Any) -> bool:
+    return not question_defects(q)
+
+
+def _text(value) -> str:
+    return " ".join(str(value).split())
+
+
+def _answer_index(answer, options: List[str]):
+    """Reads the usual ways a model writes the answer (2, "2", "C", "c) Text", the option text) as an index."""
+    if isinstance(answer, bool):
+        return answer
+    if isinstance(answer, float) and answer.is_integer():
+        return int(answer)
+    if not isinstance(answer, str):
+        return answer
+    value = _text(answer)
+    lowered = [o.lower() for o in options]
+    if value.isdigit():
+        return int(value)
+    if len(value) == 1 and value.upper() in OPTION_LETTERS:
+        return OPTION_LETTERS.index(value.upper())
+    if value.lower() in lowered:
+        return lowered.index(value.lower())
+    label = _OPTION_LABEL_RE.match(value + " ")
+    if label:
+        return OPTION_LETTERS.index(label.group(1).upper())
+    return answer
+
+
+def repair_locally(q: Any) -> Tuple[Any, List[str]]:
+    """
+    Fixes the mechanical defects of a generated question, the ones that need no
+    model: whitespace, options given as {"A": ...} or with "A) " labels, answers
+    given as a string, letter or option text, and duplicate options that leave
+    exactly four once merged. Returns (question, fixes applied).
+    """
+    if not isinstance(q, dict):
+        return q, []
+    q = dict(q)
+    fixes = []
+
+    if isinstance(q.get("question"), str) and q["question"] != q["question"].strip():
+        q["question"] = q["question"].strip()
+        fixes.append("whitespace")
+
+    options = q.get("options")
+    if isinstance(options, dict):
+        options = [options[key] for key in sorted(options)]
+        fixes.append("options_object")
+    if not isinstance(options, list):
+        return q, fixes
+
+    texts = [_text(o) if isinstance(o, (str, int, float)) and not isinstance(o, bool) else "" for o in options]
+    if texts != options:
+        fixes.append("option_text")
+    labels = [_OPTION_LABEL_RE.match(t) for t in texts]
+    if len(texts) > 1 and all(labels) and [m.group(1).upper() for m in labels] == list(OPTION_LETTERS[:len(texts)]):
+        texts = [t[m.end():] for t, m in zip(texts, labels)]
+        fixes.append("option_labels")
+
+    answer = _answer_index(q.get("answer"), texts)
+    if answer != q.get("answer"):
+        fixes.append("answer_format")
+
+    # Drop repeated and blank options (the answer follows its surviving copy) when exactly four remain
+    lowered = [t.lower() for t in texts]
+    first = {}
+    for i, t in enumerate(lowered):
+        if t:
+            first.setdefault(t, i)
+    if len(first) == OPTIONS_PER_QUESTION and len(texts) != OPTIONS_PER_QUESTION:
+        keep = sorted(first.values())
+        if isinstance(answer, int) and not isinstance(answer, bool) and 0 <= answer < len(texts):
+            answer = keep.index(first[lowered[answer]]) if lowered[answer] else None
+        texts = [texts[i] for i in keep]
+        fixes.append("extra_options")
+
+    q["options"] = texts
+    q["answer"] = answer
+    return q, fixes
+
+
+def triage(items: List[Any]):
+    """
+    Splits generated items into (valid questions, [(item, defects)] a model could
+    repair, count of unrepairable items, {fix: count} of local repairs).
+    """
+    valid, repairable, unrepairable, fixes = [], [], 0, {}
+    for item in items:
+        q, applied = repair_locally(item)
+        defects = question_defects(q)
+        if not defects:
+            valid.append(q)
+            for fix in applied:
+                fixes[fix] = fixes.get(fix, 0) + 1
+        elif UNREPAIRABLE_DEFECTS & set(defects):
+            unrepairable += 1
+        else:
+            repairable.append((q, defects))
+    return valid, repairable, unrepairable, fixes
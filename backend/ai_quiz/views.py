@@ -1,76 +1,147 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
-from .services import generate_quiz_with_ai, analyze_weak_topics_with_ai, get_text_from_urlid
-import pdfplumber,re
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from django.shortcuts import get_object_or_404
+from django.http import StreamingHttpResponse
+from django.db.models import Q
+from .services import analyze_weak_topics_with_ai, stream_quiz_with_ai, extract_pdf_text, build_source_text
+from .streaming import sse_event
+from .pdf_extraction import PDF_MAX_BYTES
+from .models import GenerationJob, AttemptAnalysis
+from .jobs import enqueue_generation_job, cancel_job
+from .analysis import get_attempt_analysis, get_quiz_analysis
+from .cache import quiz_cache
+from .llm_client import llm_client
+from .singleflight import llm_flights
+from .scheduler import llm_user
+from .transcripts import transcript_cache, TranscriptUnavailable
+from attempts.models import Attempt
+from quiz.models import Quiz
+import re
 
 class GenerateQuizAPIView(APIView):
+    """
+    POST /api/ai/generate-quiz/
+    Queues a generation job and returns 202 with its id; poll GenerationJobDetailView for the result.
+    """
     permission_classes = [IsAuthenticated]
 
-    # def extract_pdf_text(self, pdf_file):
-    #     """Extracts all text from a PDF file."""
-    #     try:
-    #         reader = PdfReader(pdf_file)
-    #         text = ""
-    #         for page in reader.pages:
-    #             text += page.extract_text() or ""
-    #         return text.strip()
-    #     except Exception as e:
-    #         print("PDF extract error:", e)
-    #         return ""
-        
-
-    def extract_pdf_text(self, pdf_file):
-        try:
-            text = ""
-            with pdfplumber.open(pdf_file) as pdf:
-                for page in pdf.pages:
-                    text += page.extract_text() or ""
-            return text.strip()
-        except Exception as e:
-            print("pdfplumber error:", e)
-        return ""
-
-
     def post(self, request):
         topic = request.data.get("topic")  # optional
         title = request.data.get("title")  # NEW
         pdf_file = request.FILES.get("pdf")  # NEW
         num_questions = int(request.data.get("num_questions", 5))
         difficulty = request.data.get("difficulty", "medium")
+        # Teachers who want a new set of questions for the same material can skip the cache
+        fresh = str(request.data.get("fresh", "")).lower() in ("1", "true", "yes")
 
-        pdf_text = ""
+        # If nothing was provided, return error
+        if not (topic or "").strip() and not pdf_file:
+            return Response({"error": "topic_or_pdf_required"}, status=400)
 
-        # If PDF was uploaded, extract text
-        if pdf_file:
-            pdf_text = self.extract_pdf_text(pdf_file)
+        if pdf_file and pdf_file.size > PDF_MAX_BYTES:
+            return Response({"error": "pdf_too_large", "max_bytes": PDF_MAX_BYTES}, status=400)
 
-        # Merge topic + PDF text depending on which exists
-        combined_text = ""
+        # PDF extraction and the LLM call happen in a background worker
+        job = enqueue_generation_job(
+            request.user, title, topic, pdf_file, num_questions, difficulty, use_cache=not fresh
+        )
 
-        if topic:
-            combined_text += (title + ": " + topic) + "\n\n"
+        return Response(serialize_job(job), status=202)
 
-        if pdf_text:
-            combined_text += pdf_text
 
-        # If nothing was provided, return error
+class GenerateQuizStreamAPIView(APIView):
+    """
+    POST /api/ai/generate-quiz/stream/
+    Same inputs as GenerateQuizAPIView, but answers with a Server-Sent-Events stream:
+    one `question` event per question as soon as the model finishes it, then `done` or `error`.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        topic = request.data.get("topic")
+        title = request.data.get("title")
+        pdf_file = request.FILES.get("pdf")
+        num_questions = int(request.data.get("num_questions", 5))
+        difficulty = request.data.get("difficulty", "medium")
+        fresh = str(request.data.get("fresh", "")).lower() in ("1", "true", "yes")
+
+        if pdf_file and pdf_file.size > PDF_MAX_BYTES:
+            return Response({"error": "pdf_too_large", "max_bytes": PDF_MAX_BYTES}, status=400)
+
+        pdf_text = extract_pdf_text(pdf_file) if pdf_file else ""
+        combined_text = build_source_text(title, topic, pdf_text)
         if not combined_text.strip():
             return Response({"error": "topic_or_pdf_required"}, status=400)
 
-        # Pass combined text to AI generator
-        result = generate_quiz_with_ai(combined_text, num_questions, difficulty)
+        def events():
+            # Runs after post() returns, so the user is attributed here rather than around the call
+            with llm_user(request.user.id):
+                for event, data in stream_quiz_with_ai(combined_text, num_questions, difficulty, use_cache=not fresh):
+                    yield sse_event(event, data)
+
+        response = StreamingHttpResponse(events(), content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"  # don't let nginx buffer the stream
+        return response
+
+
+def serialize_job(job):
+    data = {
+        "job_id": job.id,
+        "status": job.status,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+    if job.is_finished:
+        data["result"] = job.result
+        data["error"] = job.error
+    return data
+
+
+class GenerationJobDetailView(APIView):
+    """
+    GET /api/ai/generate-quiz/jobs/<job_id>/
+    Returns the status of a generation job, and its result once finished.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, job_id):
+        job = get_object_or_404(GenerationJob, id=job_id, teacher=request.user)
+        return Response(serialize_job(job))
+
+
+class CancelGenerationJobView(APIView):
+    """
+    POST /api/ai/generate-quiz/jobs/<job_id>/cancel/
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, job_id):
+        job = get_object_or_404(GenerationJob, id=job_id, teacher=request.user)
+        if not cancel_job(job):
+            return Response({"error": "job_already_finished", "status": job.status}, status=409)
 
-        return Response({"result": result})
+        job.refresh_from_db()
+        return Response(serialize_job(job))
 
 class AnalyzeWeakTopicsAPIView(APIView):
 
     """
-    Endpoint to analyze quiz results and identify weak topics using AI/NLP
+    Endpoint to analyze quiz results and identify weak topics using AI/NLP.
+
+    With `attempt_id` the stored analysis of that attempt is returned (computed
+    on first use if the workers have not done it yet); 202 means another worker
+    is still on it. Bare `quiz_results` are analyzed on the spot, as before.
     """
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
+        attempt_id = request.data.get("attempt_id")
+        if attempt_id:
+            return self._attempt_analysis(request, attempt_id)
+
         quiz_results = request.data.get("quiz_results")
         
         if not quiz_results:
@@ -86,7 +157,8 @@ class AnalyzeWeakTopicsAPIView(APIView):
             }, status=400)
         
         # Call the AI analysis service
-        analysis_result = analyze_weak_topics_with_ai(quiz_results)
+        with llm_user(request.user.id):
+            analysis_result = analyze_weak_topics_with_ai(quiz_results)
         
         # Return the analysis
         if analysis_result.get("success"):
@@ -94,6 +166,43 @@ class AnalyzeWeakTopicsAPIView(APIView):
         else:
             return Response(analysis_result, status=500)
 
+    def _attempt_analysis(self, request, attempt_id):
+        try:
+            attempt_id = int(attempt_id)
+        except (TypeError, ValueError):
+            return Response({"success": False, "error": "attempt_id_must_be_integer"}, status=400)
+
+        attempt = (
+            Attempt.objects.filter(id=attempt_id)
+            .filter(Q(student=request.user) | Q(quiz__teacher=request.user))
+            .first()
+        )
+        if attempt is None:
+            return Response({"success": False, "error": "attempt_not_found"}, status=404)
+
+        with llm_user(request.user.id):
+            analysis = get_attempt_analysis(attempt)
+        if analysis.status == AttemptAnalysis.STATUS_SUCCEEDED:
+            return Response({**analysis.result, "stored": True}, status=200)
+        if analysis.status == AttemptAnalysis.STATUS_FAILED:
+            return Response(analysis.result or {"success": False, "error": analysis.error}, status=500)
+        return Response({"success": False, "status": analysis.status}, status=202)
+
+
+class QuizClassAnalysisView(APIView):
+    """
+    GET /api/ai/quizzes/<quiz_id>/class-analysis/
+    Weak topics of the whole class for one quiz (quiz teacher only), from one
+    LLM call over aggregated wrong answers; reused until new attempts arrive.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, quiz_id):
+        quiz = get_object_or_404(Quiz, id=quiz_id, teacher=request.user)
+        with llm_user(request.user.id):
+            result = get_quiz_analysis(quiz)
+        return Response(result, status=200 if result.get("success") else 500)
+
 
 class GetTextOutOfUrl(APIView):
     permission_classes = [IsAuthenticated]
@@ -115,7 +224,25 @@ class GetTextOutOfUrl(APIView):
         if not video_id:
             return Response({"error": "invalid_youtube_url"}, status=400)
 
-        text = get_text_from_urlid(video_id)
+        try:
+            text = transcript_cache.get(video_id)
+        except TranscriptUnavailable as e:
+            return Response({"error": "transcript_unavailable", "details": str(e)}, status=422)
 
         return Response({"text": text})
 
+
+class AIServiceStatsView(APIView):
+    """
+    GET /api/ai/stats/
+    Cache counters and per-call LLM latency stats for this process (staff only).
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response({
+            "quiz_cache": quiz_cache.stats(),
+            "llm": llm_client.stats(),
+            "transcripts": transcript_cache.stats(),
+            "single_flight": llm_flights.stats(),
+        })
@@ -0,0 +1,182 @@
+import os
+from array import array
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from django.db import transaction
+
+from ai_quiz.cache import LRUCache
+from ai_quiz.singleflight import SingleFlight
+from ai_quiz.validation import OPTION_LETTERS
+from quiz.models import Question
+from .models import Attempt, SavedAnswer
+
+
+ANSWER_KEY_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_KEY_CACHE_MAX_ENTRIES", 256))
+
+
+@dataclass
+class AnswerKeyEntry:
+    question_id: int
+    text: str
+    options: Dict[str, str]  # letter -> option text
+    correct_option: str
+
+
+@dataclass
+class GradedAttempt:
+    correct_count: int = 0
+    total_questions: int = 0
+    results: List[Dict[str, Any]] = field(default_factory=list)
+    answers: List[tuple] = field(default_factory=list)  # (question_id, selected_option) to save
+
+    @property
+    def score(self) -> float:
+        return (self.correct_count / self.total_questions) * 100 if self.total_questions > 0 else 0
+
+
+class AnswerKey:
+    """
+    A quiz's compiled answer key: question ids in a sorted array with parallel
+    arrays of correct-option indexes (-1 if unset), question texts and option
+    texts. Lookups bisect the id array; nothing touches the database.
+    """
+
+    __slots__ = ("quiz_id", "version", "_ids", "_correct", "_texts", "_options")
+
+    def __init__(self, quiz_id: int, version: int, rows):
+        """`rows` are (id, text, option_a, option_b, option_c, option_d, correct_option), sorted by id."""
+        self.quiz_id = quiz_id
+        self.version = version
+        self._ids = array("q")
+        self._correct = array("b")
+        texts, options = [], []
+        for qid, text, a, b, c, d, correct in rows:
+            self._ids.append(qid)
+            self._correct.append(OPTION_LETTERS.index(correct) if correct and correct in OPTION_LETTERS else -1)
+            texts.append(text)
+            options.append((a, b, c, d))
+        self._texts = tuple(texts)
+        self._options = tuple(options)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _position(self, question_id: int) -> Optional[int]:
+        i = bisect_left(self._ids, question_id)
+        return i if i < len(self._ids) and self._ids[i] == question_id else None
+
+    def __contains__(self, question_id: int) -> bool:
+        return self._position(question_id) is not None
+
+    def get(self, question_id: int) -> Optional[AnswerKeyEntry]:
+        i = self._position(question_id)
+        if i is None:
+            return None
+        correct = self._correct[i]
+        return AnswerKeyEntry(
+            question_id,
+            self._texts[i],
+            dict(zip(OPTION_LETTERS, self._options[i])),
+            OPTION_LETTERS[correct] if correct >= 0 else "",
+        )
+
+
+def load_answer_key(quiz_id: int, version: int = 0) -> AnswerKey:
+    """Every question of the quiz with its options and correct letter, in one query."""
+    rows = Question.objects.filter(quiz_id=quiz_id).order_by("id").values_list(
+        "id", "text", "option_a", "option_b", "option_c", "option_d", "correct_option"
+    )
+    return AnswerKey(quiz_id, version, rows)
+
+
+class AnswerKeyCache:
+    """
+    Compiled answer keys, per process, keyed by (quiz id, Quiz.questions_version).
+    Any change to a quiz's questions bumps the version, so a stale key is never
+    looked up again and simply ages out of the LRU. Concurrent misses on one quiz
+    (a class submitting together) load it once.
+    """
+
+    def __init__(self, max_entries: int = ANSWER_KEY_CACHE_MAX_ENTRIES):
+        self.memory = LRUCache(max_entries=max_entries)
+        self._flights = SingleFlight(use_db=False)
+
+    def get(self, quiz) -> AnswerKey:
+        key = (quiz.id, quiz.questions_version)
+        answer_key = self.memory.get(key)
+        if answer_key is None:
+            answer_key = self._flights.do(f"{quiz.id}:{quiz.questions_version}", lambda: self._load(key))
+        return answer_key
+
+    def _load(self, key) -> AnswerKey:
+        answer_key = load_answer_key(*key)
+        self.memory.set(key, answer_key)
+        return answer_key
+
+    def stats(self):
+        return {"memory": self.memory.stats(), "coalesced": self._flights.coalesced}
+
+
+answer_keys = AnswerKeyCache()
+
+
+def grade_answers(answers: List[Dict[str, Any]], answer_key: AnswerKey) -> GradedAttempt:
+    """
+    Grades submitted answers in memory. Answers to questions outside the quiz and
+    repeated answers to the same question are ignored; a missing or null
+    selected_option counts as not attempted.
+    """
+    graded = GradedAttempt()
+    seen = set()
+    for ans in answers:
+        entry = _key_entry(ans, answer_key)
+        if entry is None or entry.question_id in seen:
+            continue
+        seen.add(entry.question_id)
+
+        selected_opt: Optional[str] = ans.get("selected_option") or None
+        is_correct = selected_opt is not None and selected_opt == entry.correct_option
+        graded.results.append({
+            "question_id": entry.question_id,
+            "question_text": entry.text,
+            "selected_option": selected_opt,
+            "selected_option_text": entry.options.get(selected_opt, "") if selected_opt else "Not Attempted",
+            "correct_option": entry.correct_option,
+            "correct_option_text": entry.options.get(entry.correct_option, ""),
+            "is_correct": is_correct,
+            "attempted": selected_opt is not None,
+        })
+        graded.answers.append((entry.question_id, selected_opt))
+        graded.total_questions += 1
+        if is_correct:
+            graded.correct_count += 1
+    return graded
+
+
+def _key_entry(ans, answer_key) -> Optional[AnswerKeyEntry]:
+    try:
+        return answer_key.get(int(ans["question_id"]))
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def grade_saved_attempt(attempt: Attempt) -> GradedAttempt:
+    """Re-grades a stored attempt against the cached answer key; one query for its answers."""
+    answers = SavedAnswer.objects.filter(attempt=attempt).order_by("id").values("question_id", "selected_option")
+    return grade_answers(answers, answer_keys.get(attempt.quiz))
+
+
+def save_graded_attempt(student, quiz, graded: GradedAttempt) -> Attempt:
+    """The attempt and all its answers in two INSERTs, committed together."""
+    with transaction.atomic():
+        attempt = Attempt.objects.create(
+            student=student, quiz=quiz, score=graded.score,
+            correct_answers=graded.correct_count, total_questions=graded.total_questions,
+        )
+        SavedAnswer.objects.bulk_create([
+            SavedAnswer(attempt=attempt, question_id=question_id, selected_option=selected_opt)
+            for question_id, selected_opt in graded.answers
+        ])
+    return attempt
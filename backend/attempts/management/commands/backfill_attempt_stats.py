@@ -0,0 +1,38 @@
+from django.db.models import Count, F, Q
+from django.core.management.base import BaseCommand
+
+from attempts.models import Attempt
+
+
+class Command(BaseCommand):
+    help = "Stores correct_answers / total_questions on attempts graded before those columns existed."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--all", action="store_true", help="Recount every attempt, not only those missing stats.")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        attempts = Attempt.objects.order_by("id")
+        if not options["all"]:
+            attempts = attempts.filter(Q(correct_answers__isnull=True) | Q(total_questions__isnull=True))
+        # Counted in SQL, one query per batch; same rule as grading (unanswered never matches)
+        attempts = attempts.annotate(
+            answered=Count("savedanswer"),
+            correct=Count("savedanswer", filter=Q(savedanswer__selected_option=F("savedanswer__question__correct_option"))),
+        ).only("id")
+
+        updated = 0
+        last_id = 0
+        while True:
+            batch = list(attempts.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            for attempt in batch:
+                attempt.correct_answers = attempt.correct
+                attempt.total_questions = attempt.answered
+            Attempt.objects.bulk_update(batch, ["correct_answers", "total_questions"])
+            updated += len(batch)
+            last_id = batch[-1].id
+
+        self.stdout.write(self.style.SUCCESS(f"Stored stats for {updated} attempt(s)."))
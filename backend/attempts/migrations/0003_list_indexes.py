@@ -0,0 +1,24 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attempts', '0002_attempt_stats'),
+        ('quiz', '0003_list_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attempt',
+            index=models.Index(fields=['student', 'attempted_at', 'id'], name='attempt_student_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='attempt',
+            index=models.Index(fields=['student', 'score', 'id'], name='attempt_student_score_idx'),
+        ),
+    ]
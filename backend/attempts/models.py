@@ -7,6 +7,18 @@ class Attempt(models.Model):
     quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name="attempts")
     score = models.FloatField()
     attempted_at = models.DateTimeField(auto_now_add=True)
+    # Stored at grading time so attempt lists need no SavedAnswer queries; NULL until
+    # backfilled for attempts saved before (manage.py backfill_attempt_stats)
+    correct_answers = models.PositiveIntegerField(null=True, blank=True)
+    total_questions = models.PositiveIntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["quiz", "attempted_at", "id"], name="attempt_quiz_time_idx"),
+            models.Index(fields=["quiz", "score", "id"], name="attempt_quiz_score_idx"),
+            models.Index(fields=["student", "attempted_at", "id"], name="attempt_student_time_idx"),
+            models.Index(fields=["student", "score", "id"], name="attempt_student_score_idx"),
+        ]
 
     # def __str__(self):
     #     return f"{self.student.username} - {self.quiz.title} ({self.score})"
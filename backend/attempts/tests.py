@@ -1,3 +1,115 @@
+from unittest import mock
+
+from django.db import DatabaseError
 from django.test import TestCase
 
-# Create your tests here.
+from accounts.models import User
+from quiz.models import Quiz, Question
+from .grading import answer_keys, grade_answers, load_answer_key, save_graded_attempt
+from .models import Attempt, SavedAnswer
+
+
+class GradingTests(TestCase):
+    def setUp(self):
+        self.teacher = User.objects.create_user(email="teacher@example.com", password="pw", username="teacher", role="teacher")
+        self.student = User.objects.create_user(email="student@example.com", password="pw", username="student", role="student")
+        self.quiz = Quiz.objects.create(teacher=self.teacher, title="Plants")
+        self.q1 = Question.objects.create(quiz=self.quiz, text="Gas released?", option_a="Oxygen", option_b="Helium",
+                                          option_c="Neon", option_d="Argon", correct_option="A")
+        self.q2 = Question.objects.create(quiz=self.quiz, text="Pigment?", option_a="Carotene", option_b="Chlorophyll",
+                                          option_c="Melanin", option_d="Keratin", correct_option="B")
+        other = Quiz.objects.create(teacher=self.teacher, title="Other")
+        self.foreign = Question.objects.create(quiz=other, text="Foreign?", option_a="a", option_b="b",
+                                               option_c="c", option_d="d", correct_option="A")
+        self.key = load_answer_key(self.quiz.id)
+
+    def test_scores_correct_answers(self):
+        graded = grade_answers([
+            {"question_id": self.q1.id, "selected_option": "A"},
+            {"question_id": self.q2.id, "selected_option": "C"},
+        ], self.key)
+        self.assertEqual((graded.correct_count, graded.total_questions, graded.score), (1, 2, 50))
+        self.assertEqual(graded.results[1]["correct_option_text"], "Chlorophyll")
+        self.assertEqual(graded.results[1]["selected_option_text"], "Melanin")
+
+    def test_repeated_answers_count_once(self):
+        graded = grade_answers([
+            {"question_id": self.q1.id, "selected_option": "A"},
+            {"question_id": self.q1.id, "selected_option": "B"},
+            {"question_id": str(self.q1.id), "selected_option": "A"},
+        ], self.key)
+        self.assertEqual((graded.correct_count, graded.total_questions), (1, 1))
+        self.assertEqual(graded.answers, [(self.q1.id, "A")])
+
+    def test_foreign_and_malformed_question_ids_are_ignored(self):
+        graded = grade_answers([
+            {"question_id": self.foreign.id, "selected_option": "A"},
+            {"question_id": "abc", "selected_option": "A"},
+            {"selected_option": "A"},
+            {"question_id": self.q2.id, "selected_option": "B"},
+        ], self.key)
+        self.assertEqual((graded.correct_count, graded.total_questions), (1, 1))
+
+    def test_null_answers_are_not_attempted(self):
+        graded = grade_answers([
+            {"question_id": self.q1.id, "selected_option": None},
+            {"question_id": self.q2.id},
+        ], self.key)
+        self.assertEqual((graded.correct_count, graded.total_questions), (0, 2))
+        self.assertFalse(any(r["attempted"] or r["is_correct"] for r in graded.results))
+        self.assertEqual(graded.results[0]["selected_option_text"], "Not Attempted")
+
+    def test_save_stores_attempt_answers_and_stats(self):
+        graded = grade_answers([
+            {"question_id": self.q1.id, "selected_option": "A"},
+            {"question_id": self.q2.id, "selected_option": None},
+        ], self.key)
+        attempt = save_graded_attempt(self.student, self.quiz, graded)
+        attempt.refresh_from_db()
+        self.assertEqual((attempt.score, attempt.correct_answers, attempt.total_questions), (50, 1, 2))
+        self.assertEqual(
+            sorted(SavedAnswer.objects.filter(attempt=attempt).values_list("question_id", "selected_option")),
+            [(self.q1.id, "A"), (self.q2.id, None)],
+        )
+
+    def test_save_is_atomic(self):
+        graded = grade_answers([{"question_id": self.q1.id, "selected_option": "A"}], self.key)
+        with mock.patch.object(SavedAnswer.objects, "bulk_create", side_effect=DatabaseError("disk full")):
+            with self.assertRaises(DatabaseError):
+                save_graded_attempt(self.student, self.quiz, graded)
+        self.assertFalse(Attempt.objects.filter(student=self.student).exists())
+
+
+class AnswerKeyVersionTests(TestCase):
+    def setUp(self):
+        teacher = User.objects.create_user(email="teacher@example.com", password="pw", username="teacher", role="teacher")
+        self.quiz = Quiz.objects.create(teacher=teacher, title="Plants")
+        self.question = Question.objects.create(quiz=self.quiz, text="Pigment?", option_a="Carotene", option_b="Chlorophyll",
+                                                option_c="Melanin", option_d="Keratin", correct_option="A")
+        answer_keys.memory.clear()
+
+    def _grade(self, quiz, selected):
+        return grade_answers([{"question_id": self.question.id, "selected_option": selected}], answer_keys.get(quiz)).correct_count
+
+    def test_question_edit_retires_cached_key(self):
+        quiz = Quiz.objects.get(id=self.quiz.id)
+        self.assertEqual(self._grade(quiz, "A"), 1)
+
+        self.question.correct_option = "B"
+        self.question.save()
+        quiz = Quiz.objects.get(id=self.quiz.id)
+        self.assertEqual((self._grade(quiz, "A"), self._grade(quiz, "B")), (0, 1))
+
+    def test_saving_a_stale_quiz_keeps_the_bumped_version(self):
+        stale = Quiz.objects.get(id=self.quiz.id)
+        self.assertEqual(self._grade(stale, "A"), 1)  # caches the key under the old version
+
+        self.question.correct_option = "B"
+        self.question.save()
+        stale.title = "Plants and light"
+        stale.save()
+
+        quiz = Quiz.objects.get(id=self.quiz.id)
+        self.assertEqual(quiz.title, "Plants and light")
+        self.assertGreater(quiz.questions_version, stale.questions_version)
+        self.assertEqual((self._grade(quiz, "A"), self._grade(quiz, "B")), (0, 1))
@@ -1,10 +1,15 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
-from quiz.models import Quiz, Question
-from quiz.serializers import QuestionSerializer
+from django.http import HttpResponse, HttpResponseNotModified
+from quiz.models import Quiz
+from quiz.payloads import student_quiz_cache, etag_matches
 from rest_framework.permissions import IsAuthenticated
-from attempts.models import Attempt, SavedAnswer
+from django.db.models import Avg, Count, Max
+from attempts.models import Attempt
+from attempts.grading import answer_keys, grade_answers, grade_saved_attempt, save_graded_attempt
+from ai_quiz.analysis import enqueue_attempt_analysis
+from backend.pagination import KeysetPaginator, InvalidPageRequest
 
 class VerifyQuizCodeView(APIView):
     permission_classes = [IsAuthenticated]
@@ -16,46 +21,46 @@ class VerifyQuizCodeView(APIView):
         if not code:
             return Response({"detail": "Quiz code is required."}, status=status.HTTP_400_BAD_REQUEST)
 
-        try:
-            quiz = Quiz.objects.get(code=code)
-        except Quiz.DoesNotExist:
+        # Resolved through the student quiz cache; only the per-student check hits the database
+        quiz = student_quiz_cache.quiz_for_code(code)
+        if quiz is None:
             return Response({"detail": "Invalid quiz code."}, status=status.HTTP_404_NOT_FOUND)
 
         
-        if Attempt.objects.filter(student=user, quiz=quiz).exists():
+        if Attempt.objects.filter(student=user, quiz_id=quiz["quiz_id"]).exists():
             return Response({"detail": "You have already attempted this quiz."}, status=status.HTTP_400_BAD_REQUEST)
 
         data = {
-            "quiz_id": quiz.id,
-            "title": quiz.title,
-            "timer": quiz.timer,
-            "total_questions": quiz.total_questions,
+            "quiz_id": quiz["quiz_id"],
+            "title": quiz["title"],
+            "timer": quiz["timer"],
+            "total_questions": quiz["total_questions"],
         }
 
         return Response({"message": "Quiz code verified successfully!", "quiz": data})
 
 class GetQuizQuestionsView(APIView):
     """
-    GET /api/attempt/<quiz_id>/questions/
-    Returns all questions of a quiz for students.
+    GET /api/attempts/<quiz_id>/questions/
+    Returns all questions of a quiz for students, without the correct options.
+    The payload is rendered once per quiz and served from the student quiz
+    cache; it carries an ETag, and a matching If-None-Match gets a 304.
     """
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request, quiz_id):
-        try:
-            quiz = Quiz.objects.get(id=quiz_id)
-        except Quiz.DoesNotExist:
+        payload = student_quiz_cache.payload(quiz_id)
+        if payload is None:
             return Response({"detail": "Quiz not found."}, status=status.HTTP_404_NOT_FOUND)
 
-        questions = Question.objects.filter(quiz=quiz)
-        serializer = QuestionSerializer(questions, many=True)
-
-        return Response({
-            "quiz_id": quiz.id,
-            "title": quiz.title,
-            "timer": quiz.timer,
-            "questions": serializer.data
-        }, status=status.HTTP_200_OK)
+        if etag_matches(request.headers.get("If-None-Match"), payload.etag):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(payload.body, content_type="application/json")
+        response["ETag"] = payload.etag
+        # Authenticated content: browsers may keep it but must revalidate, never shared caches
+        response["Cache-Control"] = "private, no-cache"
+        return response
 
 class SaveAttemptView(APIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -80,77 +85,47 @@ class SaveAttemptView(APIView):
         if Attempt.objects.filter(student=user, quiz=quiz).exists():
             return Response({"detail": "You have already attempted this quiz."}, status=status.HTTP_400_BAD_REQUEST)
 
-        total_questions = len(answers)
-        correct_count = 0
-        detailed_results = []  
-
-        for ans in answers:
-            try:
-                question = Question.objects.get(id=ans["question_id"], quiz=quiz)
-                selected_opt = ans["selected_option"]
-                is_correct = selected_opt and selected_opt == question.correct_option
-
-                # map letters to actual text dynamically
-                option_text_map = {
-                    "A": question.option_a,
-                    "B": question.option_b,
-                    "C": question.option_c,
-                    "D": question.option_d,
-                }
-
-                detailed_results.append({
-                    "question_id": question.id,
-                    "question_text": question.text,
-                    "selected_option": selected_opt,
-                    "selected_option_text": option_text_map.get(selected_opt, "") if selected_opt else "Not Attempted",
-                    "correct_option": question.correct_option,
-                    "correct_option_text": option_text_map.get(question.correct_option, ""),
-                    "is_correct": is_correct,
-                    "attempted": selected_opt is not None,  # NEW: flag for unattempted
-                })
-
-                if is_correct:
-                    correct_count += 1
-
-            except Question.DoesNotExist:
-                continue
-
-        score = (correct_count / total_questions) * 100 if total_questions > 0 else 0
-
-        attempt = Attempt.objects.create(student=user, quiz=quiz, score=score)
-
-        for ans in answers:
-            SavedAnswer.objects.create(
-                attempt=attempt,
-                question_id=ans["question_id"],
-                selected_option=ans["selected_option"]  # will be None for unattempted
-            )
+        # Grading in memory against the cached answer key, then two INSERTs in one transaction
+        graded = grade_answers(answers, answer_keys.get(quiz))
+        attempt = save_graded_attempt(user, quiz, graded)
+
+        # Answers are final now; get the weak-topic analysis going before anyone asks for it
+        enqueue_attempt_analysis(attempt)
 
         return Response(
             {
                 "message": "Attempt saved successfully!",
                 "attempt_id": attempt.id,
-                "score": score,
-                "correct_answers": correct_count,
-                "total_questions": total_questions,
-                "results": detailed_results,
+                "score": graded.score,
+                "correct_answers": graded.correct_count,
+                "total_questions": graded.total_questions,
+                "results": graded.results,
             },
             status=status.HTTP_201_CREATED
         )
 
 class GetRecentQuizzesView(APIView):
     """
-    GET /api/recent-quizzes/
-    Returns all quiz attempts by the logged-in student.
+    GET /api/attempts/recent-quizzes/?sort=-attempted_at&limit=50&cursor=...
+    Returns a page of the logged-in student's quiz attempts, plus totals over
+    all of them. `sort` is attempted_at or score (prefix '-' for descending);
+    pass back `next_cursor` as `cursor` for the next page.
     """
     permission_classes = [permissions.IsAuthenticated]
 
+    paginator = KeysetPaginator({"attempted_at": "attempted_at", "score": "score"}, default_sort="-attempted_at")
+
     def get(self, request):
         user = request.user
-        attempts = Attempt.objects.filter(student=user).select_related("quiz", "quiz__teacher").order_by("-attempted_at")
+        attempts = Attempt.objects.filter(student=user).select_related("quiz")
+
+        try:
+            page, page_info = self.paginator.paginate(attempts, request.query_params)
+        except InvalidPageRequest as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
         data = []
-        for attempt in attempts:
+        for attempt in page:
             data.append({
                 "id": attempt.id,
                 "score": round(attempt.score),
@@ -160,7 +135,15 @@ class GetRecentQuizzesView(APIView):
                     # "created_by": attempt.quiz.teacher.username if attempt.quiz.teacher else "N/A",
                 },
             })
-        return Response(data, status=status.HTTP_200_OK)
+
+        summary = Attempt.objects.filter(student=user).aggregate(total=Count("id"), average=Avg("score"), best=Max("score"))
+        return Response({
+            "attempts": data,
+            "total_attempts": summary["total"],
+            "average_score": round(summary["average"] or 0, 2),
+            "best_score": round(summary["best"] or 0, 2),
+            **page_info,
+        }, status=status.HTTP_200_OK)
     
 class GetAttemptResultView(APIView):
     """
@@ -171,41 +154,17 @@ class GetAttemptResultView(APIView):
 
     def get(self, request, attempt_id):
         try:
-            attempt = Attempt.objects.get(id=attempt_id, student=request.user)
+            attempt = Attempt.objects.select_related("quiz").get(id=attempt_id, student=request.user)
         except Attempt.DoesNotExist:
             return Response({"detail": "Attempt not found."}, status=status.HTTP_404_NOT_FOUND)
 
-        saved_answers = SavedAnswer.objects.filter(attempt=attempt).select_related("question")
-        results = []
-
-        for sa in saved_answers:
-            q = sa.question
-            option_text_map = {
-                "A": q.option_a,
-                "B": q.option_b,
-                "C": q.option_c,
-                "D": q.option_d,
-            }
-            results.append({
-                "question_id": q.id,
-                "question_text": q.text,
-                "selected_option": sa.selected_option,
-                "selected_option_text": option_text_map.get(sa.selected_option, ""),
-                "correct_option": q.correct_option,
-                "correct_option_text": option_text_map.get(q.correct_option, ""),
-                "is_correct": sa.selected_option == q.correct_option,
-            })
-
-        correct_count = sum(r["is_correct"] for r in results)
-        total_questions = len(results)
-        score = attempt.score
+        graded = grade_saved_attempt(attempt)
 
         return Response({
             "attempt_id": attempt.id,
             "quiz_title": attempt.quiz.title,
-            "score": round(score, 2),
-            "correct_answers": correct_count,
-            "total_questions": total_questions,
-            "results": results,
+            "score": round(attempt.score, 2),
+            "correct_answers": graded.correct_count,
+            "total_questions": graded.total_questions,
+            "results": graded.results,
         }, status=status.HTTP_200_OK)
-
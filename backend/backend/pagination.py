@@ -0,0 +1,94 @@
+import json
+import base64
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.db.models import Q
+
+
+class InvalidPageRequest(ValueError):
+    """A bad `sort`, `cursor` or `limit` query parameter."""
+
+
+class KeysetPaginator:
+    """
+    Keyset ("cursor") pagination: pages are `WHERE (key, id) < (last key, last id)
+    ORDER BY key, id`, so every page costs the same however deep it is and rows
+    inserted meanwhile don't shift it. `id` breaks ties, which makes the order total.
+
+    `orderings` maps the public `sort` names to model fields (or annotations);
+    `?sort=-name` sorts descending. The cursor is opaque to clients and only
+    valid for the sort it was issued with.
+    """
+
+    def __init__(self, orderings: Dict[str, str], default_sort: str, page_size: int = 50, max_page_size: int = 200):
+        self.orderings = orderings
+        self.default_sort = default_sort
+        self.page_size = page_size
+        self.max_page_size = max_page_size
+
+    def _parse_sort(self, sort: Optional[str]) -> Tuple[str, str, bool]:
+        sort = sort or self.default_sort
+        name = sort.lstrip("-")
+        if name not in self.orderings:
+            raise InvalidPageRequest(f"sort must be one of: {', '.join(sorted(self.orderings))} (prefix '-' for descending)")
+        return sort, self.orderings[name], sort.startswith("-")
+
+    def _parse_limit(self, limit) -> int:
+        if limit in (None, ""):
+            return self.page_size
+        try:
+            limit = int(limit)
+        except (TypeError, ValueError):
+            raise InvalidPageRequest("limit must be an integer")
+        if limit < 1:
+            raise InvalidPageRequest("limit must be positive")
+        return min(limit, self.max_page_size)
+
+    @staticmethod
+    def encode_cursor(sort: str, value: Any, pk: int) -> str:
+        if hasattr(value, "isoformat"):
+            value = value.isoformat()
+        raw = json.dumps([sort, value, pk], separators=(",", ":")).encode("utf-8")
+        return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[str, Any, int]:
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            sort, value, pk = json.loads(raw)
+            return sort, value, int(pk)
+        except (ValueError, TypeError):
+            raise InvalidPageRequest("invalid cursor")
+
+    def paginate(self, queryset, params) -> Tuple[List[Any], Dict[str, Any]]:
+        """
+        One page of `queryset` for the request's `sort`, `cursor` and `limit`
+        query params. Returns (rows, {"sort", "limit", "next_cursor"}); the last
+        page has next_cursor None. Raises InvalidPageRequest on bad params.
+        """
+        sort, field, descending = self._parse_sort(params.get("sort"))
+        limit = self._parse_limit(params.get("limit"))
+
+        cursor = params.get("cursor")
+        if cursor:
+            cursor_sort, value, pk = self.decode_cursor(cursor)
+            if cursor_sort != sort:
+                raise InvalidPageRequest("cursor was issued for another sort order")
+            after = "lt" if descending else "gt"
+            queryset = queryset.filter(Q(**{f"{field}__{after}": value}) | Q(**{field: value, f"pk__{after}": pk}))
+
+        prefix = "-" if descending else ""
+        rows = list(queryset.order_by(f"{prefix}{field}", f"{prefix}pk")[:limit + 1])
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = self.encode_cursor(sort, self._value(last, field), last.pk)
+        return rows, {"sort": sort, "limit": limit, "next_cursor": next_cursor}
+
+    @staticmethod
+    def _value(row, field: str):
+        for part in field.split("__"):
+            row = getattr(row, part)
+        return row
@@ -116,6 +116,19 @@ DATABASES = {
 }
 
 
+# Shared cache (student quiz payloads, see quiz.payloads). Set REDIS_URL to share it
+# between workers; without it every process has its own in-memory cache.
+REDIS_URL = os.getenv("REDIS_URL")
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    } if REDIS_URL else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -167,3 +180,8 @@ CORS_ALLOW_CREDENTIALS = True
 AUTH_USER_MODEL = 'accounts.User'
 
 
+# AI quiz generation jobs (see ai_quiz.jobs / `manage.py run_generation_workers`)
+# AI_QUIZ_JOBS_INLINE runs jobs inside the request instead of waiting for a worker (tests, local dev)
+AI_QUIZ_JOBS_INLINE = os.getenv("AI_QUIZ_JOBS_INLINE", "false").lower() == "true"
+AI_QUIZ_WORKER_CONCURRENCY = int(os.getenv("AI_QUIZ_WORKER_CONCURRENCY", 4))
+AI_QUIZ_WORKER_POLL_INTERVAL = float(os.getenv("AI_QUIZ_WORKER_POLL_INTERVAL", 1.0))
@@ -0,0 +1,198 @@
+import io
+import csv
+import json
+import codecs
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from django.db import transaction
+from django.db.models import F
+
+from ai_quiz.streaming import IncrementalJSONArrayParser
+from ai_quiz.validation import question_defects, OPTION_LETTERS
+from .models import Quiz, Question
+from .payloads import student_quiz_cache
+
+
+IMPORT_BATCH_SIZE = 500
+MAX_REPORTED_ERRORS = 100  # per-row errors returned; the count covers all of them
+OPTION_MAX_LENGTH = Question._meta.get_field("option_a").max_length
+
+
+class ImportRollback(Exception):
+    """Raised inside the import transaction to undo it when rows were rejected."""
+
+
+class MalformedImportFile(ValueError):
+    """The upload as a whole can't be read (bad encoding, broken CSV, unterminated JSON array)."""
+
+
+def rows_from_json_upload(upload) -> Iterator[Tuple[int, Any]]:
+    """(row number, item) for each object of a JSON array file, parsed chunk by chunk."""
+    parser = IncrementalJSONArrayParser()
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    row = 0
+    try:
+        for chunk in upload.chunks():
+            for item in parser.feed(decoder.decode(chunk)):
+                row += 1
+                yield row, item
+        for item in parser.feed(decoder.decode(b"", final=True)):
+            row += 1
+            yield row, item
+    except UnicodeDecodeError:
+        yield None, MalformedImportFile(f"file is not valid UTF-8 (after row {row})")
+        return
+    if not parser.finished:
+        yield None, MalformedImportFile("file is not a complete JSON array")
+        return
+    if parser.errors:
+        # The parser skips items that are not valid JSON; report them without a row number
+        yield None, ValueError(f"{parser.errors} item(s) were not valid JSON")
+
+
+def rows_from_jsonl_upload(upload) -> Iterator[Tuple[int, Any]]:
+    """(line number, item) for each non-empty line of a JSON Lines file."""
+    number = 0
+    try:
+        for number, line in enumerate(io.TextIOWrapper(upload.file, encoding="utf-8-sig"), 1):
+            if not line.strip():
+                continue
+            try:
+                yield number, json.loads(line)
+            except ValueError as e:
+                yield number, ValueError(f"invalid JSON: {e}")
+    except UnicodeDecodeError:
+        yield number + 1, MalformedImportFile("file is not valid UTF-8")
+
+
+def rows_from_csv_upload(upload) -> Iterator[Tuple[int, Any]]:
+    """
+    (line number, row) for a CSV with a header. Columns: text (or question),
+    option_a..option_d (or a..d) and correct_option (a letter) or correct (0-based index).
+    """
+    reader = csv.DictReader(io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline=""))
+    try:
+        for row in reader:
+            yield reader.line_num, {(key or "").strip().lower(): value for key, value in row.items()}
+    except UnicodeDecodeError:
+        yield reader.line_num + 1, MalformedImportFile("file is not valid UTF-8")
+    except csv.Error as e:
+        yield reader.line_num, MalformedImportFile(f"invalid CSV: {e}")
+
+
+def rows_from_list(items: Iterable[Any]) -> Iterator[Tuple[int, Any]]:
+    for number, item in enumerate(items, 1):
+        yield number, item
+
+
+def _correct_index(item: Dict[str, Any]):
+    for key in ("correct", "answer"):
+        value = item.get(key)
+        if value is None or value == "":
+            continue
+        if isinstance(value, str):
+            value = value.strip()
+            if value.upper() in OPTION_LETTERS:
+                return OPTION_LETTERS.index(value.upper())
+            if value.isdigit():
+                return int(value)
+        return value
+    letter = str(item.get("correct_option") or "").strip().upper()
+    return OPTION_LETTERS.index(letter) if letter and letter in OPTION_LETTERS else None
+
+
+def parse_question_row(item: Any) -> Tuple[Optional[Dict[str, str]], List[str]]:
+    """
+    Question fields for one imported row, or the reasons it was rejected.
+    Accepts the add-questions shape ({text, options, correct}), the generator's
+    ({question, options, answer}) and flat CSV columns.
+    """
+    if not isinstance(item, dict):
+        return None, ["not_object"]
+
+    options = item.get("options")
+    if options is None:
+        options = [item.get(f"option_{letter}", item.get(letter)) for letter in "abcd"]
+        if all(o is None for o in options):
+            options = None
+    if isinstance(options, list):
+        options = [o.strip() if isinstance(o, str) else o for o in options]
+
+    text = item.get("text", item.get("question"))
+    candidate = {"question": text.strip() if isinstance(text, str) else text, "options": options, "answer": _correct_index(item)}
+    errors = question_defects(candidate)
+    if not errors and any(len(str(o)) > OPTION_MAX_LENGTH for o in options):
+        errors.append("option_too_long")
+    if errors:
+        return None, errors
+
+    return {
+        "text": candidate["question"],
+        "option_a": str(options[0]),
+        "option_b": str(options[1]),
+        "option_c": str(options[2]),
+        "option_d": str(options[3]),
+        "correct_option": OPTION_LETTERS[candidate["answer"]],
+    }, []
+
+
+def import_questions(quiz: Quiz, rows: Iterable[Tuple[int, Any]], partial: bool = False,
+                     batch_size: int = IMPORT_BATCH_SIZE) -> Dict[str, Any]:
+    """
+    Validates and inserts `rows` ((row number, item) pairs, consumed lazily) in
+    bulk_create batches inside one transaction, then syncs Quiz.total_questions.
+
+    Any rejected row rolls the whole import back unless `partial`, in which case
+    the valid rows are kept. A MalformedImportFile from the reader stops and rolls
+    back the import either way. Returns {"created", "rejected", "errors",
+    "malformed", "total_questions"}.
+    """
+    report = {"created": 0, "rejected": 0, "errors": [], "malformed": False}
+
+    def reject(row, errors):
+        report["rejected"] += 1
+        if len(report["errors"]) < MAX_REPORTED_ERRORS:
+            report["errors"].append({"row": row, "errors": errors})
+
+    def flush(batch):
+        # bulk_create bypasses Question.save(), which is where the NLP features are computed
+        for question in batch:
+            question.compute_features()
+        Question.objects.bulk_create(batch)
+        report["created"] += len(batch)
+        batch.clear()
+
+    try:
+        with transaction.atomic():
+            batch = []
+            for row, item in rows:
+                if isinstance(item, MalformedImportFile):
+                    reject(row, [str(item)])
+                    report["malformed"] = True
+                    raise ImportRollback()
+                if isinstance(item, Exception):
+                    reject(row, [str(item)])
+                    continue
+                fields, errors = parse_question_row(item)
+                if errors:
+                    reject(row, errors)
+                    continue
+                batch.append(Question(quiz=quiz, **fields))
+                if len(batch) >= batch_size:
+                    flush(batch)
+            flush(batch)
+
+            if report["rejected"] and not partial:
+                raise ImportRollback()
+
+            quiz.total_questions = Question.objects.filter(quiz=quiz).count()
+            # The version bump retires the cached answer key (attempts.grading)
+            Quiz.objects.filter(id=quiz.id).update(
+                total_questions=quiz.total_questions, questions_version=F("questions_version") + 1
+            )
+            student_quiz_cache.invalidate_on_commit(quiz)
+    except ImportRollback:
+        report["created"] = 0
+
+    report["total_questions"] = quiz.total_questions
+    return report
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0002_question_features'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='quiz',
+            index=models.Index(fields=['teacher', 'created_at', 'id'], name='quiz_teacher_created_idx'),
+        ),
+    ]
@@ -3,6 +3,7 @@ import string
 import random
 from django.db import models
 from accounts.models import User  # assuming teacher = user with role='teacher'
+from ai_quiz.features import question_features
 
 def generate_unique_code():
     while True:
@@ -18,6 +19,27 @@ class Quiz(models.Model):
     timer = models.PositiveIntegerField(default=30)  # total time for quiz in minutes
     total_questions = models.PositiveIntegerField(default=10)  # just a number
     created_at = models.DateTimeField(auto_now_add=True)
+    # Bumped whenever the quiz's questions change; keys the cached answer keys (attempts.grading)
+    questions_version = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["teacher", "created_at", "id"], name="quiz_teacher_created_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            # questions_version is only ever bumped in the database (_questions_changed); writing
+            # back a stale in-memory copy would revive a cached answer key for old questions
+            kwargs["update_fields"] = [
+                f.name for f in self._meta.concrete_fields if not f.primary_key and f.name != "questions_version"
+            ]
+        super().save(*args, **kwargs)
+        _invalidate_student_quiz(self)
+
+    def delete(self, *args, **kwargs):
+        _invalidate_student_quiz(self)
+        return super().delete(*args, **kwargs)
 
 class Question(models.Model):
     quiz = models.ForeignKey(Quiz, related_name='questions', on_delete=models.CASCADE)
@@ -27,3 +49,41 @@ class Question(models.Model):
     option_c = models.CharField(max_length=255)
     option_d = models.CharField(max_length=255)
     correct_option = models.CharField(max_length=1, choices=[('A', 'A'), ('B', 'B'), ('C', 'C'), ('D', 'D')])
+
+    # Precomputed NLP features used by weak-topic analysis (ai_quiz.features)
+    key_terms = models.JSONField(default=list, blank=True)
+    question_type = models.CharField(max_length=20, blank=True, default='')
+    option_terms = models.JSONField(default=dict, blank=True)
+
+    def options_by_letter(self):
+        return {'A': self.option_a, 'B': self.option_b, 'C': self.option_c, 'D': self.option_d}
+
+    def compute_features(self):
+        features = question_features(self.text, self.options_by_letter())
+        self.key_terms = features['key_terms']
+        self.question_type = features['question_type']
+        self.option_terms = features['option_terms']
+
+    def save(self, *args, **kwargs):
+        # Text and options don't change after creation, so this effectively runs once per question.
+        # Anything that bypasses save() (bulk_create, update) must call compute_features() itself.
+        self.compute_features()
+        super().save(*args, **kwargs)
+        _questions_changed(self.quiz)
+
+    def delete(self, *args, **kwargs):
+        _questions_changed(self.quiz)
+        return super().delete(*args, **kwargs)
+
+
+def _questions_changed(quiz):
+    Quiz.objects.filter(id=quiz.id).update(questions_version=models.F("questions_version") + 1)
+    _invalidate_student_quiz(quiz)
+
+
+def _invalidate_student_quiz(quiz):
+    # Cached student payloads (quiz.payloads) go stale with any change to the quiz or its
+    # questions; bulk_create / update / queryset deletes must invalidate themselves.
+    from .payloads import student_quiz_cache
+
+    student_quiz_cache.invalidate_on_commit(quiz)
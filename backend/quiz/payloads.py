@@ -0,0 +1,145 @@
+import os
+import hashlib
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F
+from django.utils.http import parse_etags
+from rest_framework.renderers import JSONRenderer
+
+from ai_quiz.cache import LRUCache
+from ai_quiz.singleflight import SingleFlight
+from .models import Quiz, Question
+from .serializers import StudentQuestionSerializer
+
+
+logger = logging.getLogger(__name__)
+
+STUDENT_QUIZ_CACHE = os.getenv("STUDENT_QUIZ_CACHE", "default")  # alias in settings.CACHES
+STUDENT_QUIZ_CACHE_TTL = int(os.getenv("STUDENT_QUIZ_CACHE_TTL", 3600))  # seconds in the shared tier
+# Other processes only see an invalidation once their copy expires, so keep this short
+STUDENT_QUIZ_LOCAL_TTL = float(os.getenv("STUDENT_QUIZ_LOCAL_TTL", 5))
+STUDENT_QUIZ_LOCAL_MAX_ENTRIES = int(os.getenv("STUDENT_QUIZ_LOCAL_MAX_ENTRIES", 512))
+
+
+@dataclass(frozen=True)
+class QuizPayload:
+    body: bytes  # rendered JSON, ready to send
+    etag: str
+
+
+def render_student_quiz(quiz: Quiz) -> QuizPayload:
+    """The quiz as a student sees it (no correct options), rendered to JSON bytes once."""
+    questions = Question.objects.filter(quiz=quiz).order_by("id")
+    body = JSONRenderer().render({
+        "quiz_id": quiz.id,
+        "title": quiz.title,
+        "timer": quiz.timer,
+        "questions": StudentQuestionSerializer(questions, many=True).data,
+    })
+    return QuizPayload(body=body, etag=f'"{hashlib.sha256(body).hexdigest()[:32]}"')
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against `etag`, as for GET requests."""
+    if not if_none_match:
+        return False
+    tags = parse_etags(if_none_match)
+    return "*" in tags or etag in (tag.removeprefix("W/") for tag in tags)
+
+
+class StudentQuizCache:
+    """
+    What every student fetches when a quiz starts: the code -> quiz lookup and
+    the rendered question payload.
+
+    The first tier is an in-process LRU with a short TTL; the second is a Django
+    cache (settings.CACHES, Redis when REDIS_URL is set) shared by the workers.
+    Misses on the same quiz in one process are coalesced into a single build.
+    Anything that changes a quiz or its questions must call invalidate().
+    """
+
+    def __init__(self, alias: str = STUDENT_QUIZ_CACHE, ttl: int = STUDENT_QUIZ_CACHE_TTL,
+                 local_ttl: float = STUDENT_QUIZ_LOCAL_TTL, local_max_entries: int = STUDENT_QUIZ_LOCAL_MAX_ENTRIES):
+        self.alias = alias
+        self.ttl = ttl
+        self.local = LRUCache(max_entries=local_max_entries, ttl=local_ttl)
+        self._flights = SingleFlight(use_db=False)
+        self.builds = 0
+
+    @staticmethod
+    def _payload_key(quiz_id: int) -> str:
+        return f"student-quiz:{quiz_id}"
+
+    @staticmethod
+    def _code_key(code: str) -> str:
+        return f"quiz-code:{code}"
+
+    def payload(self, quiz_id: int) -> Optional[QuizPayload]:
+        """The quiz's student payload, or None if there is no such quiz."""
+        return self._get(self._payload_key(quiz_id), lambda: self._build_payload(quiz_id))
+
+    def quiz_for_code(self, code: str) -> Optional[Dict[str, Any]]:
+        """{quiz_id, title, timer, total_questions} for a join code, or None if it is unknown."""
+        return self._get(self._code_key(code), lambda: self._build_code_entry(code))
+
+    def invalidate(self, quiz: Quiz):
+        self._delete([self._payload_key(quiz.id), self._code_key(quiz.code)])
+
+    def invalidate_on_commit(self, quiz: Quiz):
+        # Keys are taken now: after a delete the instance no longer has an id
+        keys = [self._payload_key(quiz.id), self._code_key(quiz.code)]
+        transaction.on_commit(lambda: self._delete(keys))
+
+    def _delete(self, keys):
+        for key in keys:
+            self.local.delete(key)
+        try:
+            caches[self.alias].delete_many(keys)
+        except Exception as e:
+            logger.warning(f"Student quiz cache invalidation failed for {keys}: {e}")
+
+    def _get(self, key: str, build):
+        value = self.local.get(key)
+        if value is not None:
+            return value
+        return self._flights.do(key, lambda: self._load(key, build))
+
+    def _load(self, key: str, build):
+        try:
+            value = caches[self.alias].get(key)
+        except Exception as e:
+            logger.warning(f"Student quiz cache read failed for {key}: {e}")
+            value = None
+
+        if value is None:
+            value = build()
+            if value is None:
+                # Unknown quiz or code; not cached, so a quiz created a moment later is found
+                return None
+            self.builds += 1
+            try:
+                caches[self.alias].set(key, value, self.ttl)
+            except Exception as e:
+                logger.warning(f"Student quiz cache write failed for {key}: {e}")
+
+        self.local.set(key, value)
+        return value
+
+    def _build_payload(self, quiz_id: int) -> Optional[QuizPayload]:
+        quiz = Quiz.objects.filter(id=quiz_id).first()
+        return render_student_quiz(quiz) if quiz is not None else None
+
+    def _build_code_entry(self, code: str) -> Optional[Dict[str, Any]]:
+        return Quiz.objects.filter(code=code).values(
+            "title", "timer", "total_questions", quiz_id=F("id")
+        ).first()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"local": self.local.stats(), "builds": self.builds, "coalesced": self._flights.coalesced}
+
+
+student_quiz_cache = StudentQuizCache()
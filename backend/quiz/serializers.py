@@ -10,3 +10,9 @@ class QuestionSerializer(serializers.ModelSerializer):
     class Meta:
         model = Question
         fields = ['id', 'quiz', 'text', 'option_a', 'option_b', 'option_c', 'option_d', 'correct_option']
+
+class StudentQuestionSerializer(serializers.ModelSerializer):
+    """A question as shown to students taking the quiz, without the answer."""
+    class Meta:
+        model = Question
+        fields = ['id', 'quiz', 'text', 'option_a', 'option_b', 'option_c', 'option_d']
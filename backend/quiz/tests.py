@@ -1,3 +1,144 @@
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase
+from django.db.models import Count
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from accounts.models import User
+from attempts.models import Attempt
+from backend.pagination import InvalidPageRequest, KeysetPaginator
+from .importing import import_questions, rows_from_list
+from .models import Quiz, Question
+
+
+class KeysetPaginatorTests(TestCase):
+    def setUp(self):
+        self.teacher = User.objects.create_user(email="teacher@example.com", password="pw", username="teacher", role="teacher")
+        self.quiz = Quiz.objects.create(teacher=self.teacher, title="Plants")
+        # Many ties on score, so the id tiebreak decides the order
+        for i in range(7):
+            student = User.objects.create_user(email=f"s{i}@example.com", password="pw", username=f"s{i}", role="student")
+            Attempt.objects.create(student=student, quiz=self.quiz, score=[50, 90][i % 2])
+        self.paginator = KeysetPaginator({"attempted_at": "attempted_at", "score": "score"}, default_sort="-attempted_at")
+
+    def _walk(self, queryset, sort, limit=2):
+        seen, cursor = [], None
+        while True:
+            params = {"sort": sort, "limit": limit}
+            if cursor:
+                params["cursor"] = cursor
+            rows, info = self.paginator.paginate(queryset, params)
+            seen.extend(rows)
+            cursor = info["next_cursor"]
+            if not cursor:
+                return seen
+
+    def test_walks_ties_without_gaps_or_duplicates(self):
+        attempts = Attempt.objects.filter(quiz=self.quiz)
+        for sort in ("score", "-score", "attempted_at", "-attempted_at"):
+            ids = [a.id for a in self._walk(attempts, sort)]
+            self.assertEqual(sorted(ids), sorted(attempts.values_list("id", flat=True)), sort)
+        scores = [(a.score, a.id) for a in self._walk(attempts, "-score")]
+        self.assertEqual(scores, sorted(scores, key=lambda s: (-s[0], -s[1])))
+
+    def test_annotated_sort(self):
+        for title, attempts in (("None", 0), ("Two", 2), ("Also two", 2)):
+            quiz = Quiz.objects.create(teacher=self.teacher, title=title)
+            for student in User.objects.filter(role="student")[:attempts]:
+                Attempt.objects.create(student=student, quiz=quiz, score=10)
+        paginator = KeysetPaginator({"attempts": "attempts_count"}, default_sort="-attempts")
+        quizzes = Quiz.objects.annotate(attempts_count=Count("attempts"))
+        seen, cursor = [], None
+        while True:
+            rows, info = paginator.paginate(quizzes, {"limit": 1, **({"cursor": cursor} if cursor else {})})
+            seen.extend((q.attempts_count, q.id) for q in rows)
+            cursor = info["next_cursor"]
+            if not cursor:
+                break
+        self.assertEqual([count for count, _ in seen], [7, 2, 2, 0])
+        self.assertEqual(len(set(seen)), 4)
+
+    def test_rejects_bad_parameters(self):
+        attempts = Attempt.objects.all()
+        for params in ({"sort": "title"}, {"cursor": "not-a-cursor"}, {"limit": "ten"}, {"limit": 0}):
+            with self.assertRaises(InvalidPageRequest, msg=params):
+                self.paginator.paginate(attempts, params)
+
+        _, info = self.paginator.paginate(attempts, {"sort": "score", "limit": 1})
+        with self.assertRaises(InvalidPageRequest):
+            self.paginator.paginate(attempts, {"sort": "-attempted_at", "cursor": info["next_cursor"]})
+
+    def test_limit_is_capped(self):
+        _, info = self.paginator.paginate(Attempt.objects.all(), {"limit": 10_000})
+        self.assertEqual(info["limit"], self.paginator.max_page_size)
+
+    def test_endpoint_returns_400_for_bad_cursor(self):
+        client = APIClient()
+        client.force_authenticate(self.teacher)
+        resp = client.get(f"/api/quiz/{self.quiz.id}/attempts/", {"cursor": "garbage"})
+        self.assertEqual(resp.status_code, 400)
+        resp = client.get("/api/quiz/recent-quizzes/", {"sort": "-attempts", "limit": 1})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["total_attempts"], 7)
+
+
+class ImportQuestionsTests(TestCase):
+    GOOD = {"text": "Gas released?", "options": ["Oxygen", "Helium", "Neon", "Argon"], "correct": 0}
+    BAD = {"text": "Pigment?", "options": ["Carotene", "Carotene", "Melanin"], "correct": 7}
+
+    def setUp(self):
+        self.teacher = User.objects.create_user(email="teacher@example.com", password="pw", username="teacher", role="teacher")
+        self.quiz = Quiz.objects.create(teacher=self.teacher, title="Plants", total_questions=0)
+        self.client = APIClient()
+        self.client.force_authenticate(self.teacher)
+        self.url = f"/api/quiz/{self.quiz.id}/add-questions/"
+
+    def test_rejected_row_rolls_back_everything(self):
+        report = import_questions(self.quiz, rows_from_list([self.GOOD, self.BAD, "not a question"]), batch_size=1)
+        self.assertEqual((report["created"], report["rejected"]), (0, 2))
+        self.assertEqual([e["row"] for e in report["errors"]], [2, 3])
+        self.assertIn("wrong_option_count", report["errors"][0]["errors"])
+        self.assertFalse(Question.objects.filter(quiz=self.quiz).exists())
+
+    def test_partial_keeps_valid_rows(self):
+        report = import_questions(self.quiz, rows_from_list([self.GOOD, self.BAD, self.GOOD]), partial=True, batch_size=1)
+        self.assertEqual((report["created"], report["rejected"], report["total_questions"]), (2, 1, 2))
+        self.quiz.refresh_from_db()
+        self.assertEqual(self.quiz.total_questions, 2)
+        self.assertEqual(set(Question.objects.filter(quiz=self.quiz).values_list("correct_option", flat=True)), {"A"})
+
+    def test_accepts_generator_and_csv_shapes(self):
+        rows = [
+            {"question": "Sky?", "options": ["red", "blue", "green", "pink"], "answer": 1},
+            {"text": "Sun?", "option_a": "star", "option_b": "moon", "option_c": "rock", "option_d": "gas", "correct_option": "a"},
+        ]
+        report = import_questions(self.quiz, rows_from_list(rows))
+        self.assertEqual(report["created"], 2)
+        self.assertEqual(sorted(Question.objects.filter(quiz=self.quiz).values_list("correct_option", flat=True)), ["A", "B"])
+
+    def _upload(self, name, data, **extra):
+        return self.client.post(self.url, {"file": SimpleUploadedFile(name, data), **extra}, format="multipart")
+
+    def test_csv_upload(self):
+        resp = self._upload("q.csv", b"text,a,b,c,d,correct_option\nSky?,red,blue,green,pink,B\n")
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(resp.json()["created"], 1)
+
+    def test_unreadable_files_are_rejected(self):
+        cases = [
+            ("q.csv", b"text,a,b,c,d,correct_option\n\xff\xfe,red,blue,green,pink,B\n"),
+            ("q.jsonl", b'{"text": "\xff"}\n'),
+            ("q.json", b""),
+            ("q.json", b"hello"),
+            ("q.json", b'[{"text": "Sky?", "options": ["red", "blue", "green", "pink"], "correct": 1}, {"text": '),
+            ("q.json", b"[1, 2"),
+        ]
+        for name, data in cases:
+            resp = self._upload(name, data, partial="true")
+            self.assertEqual(resp.status_code, 400, (name, data))
+            self.assertEqual(resp.json()["created"], 0)
+        self.assertFalse(Question.objects.filter(quiz=self.quiz).exists())
+
+    def test_file_without_rows_is_rejected(self):
+        resp = self._upload("q.csv", b"text,a,b,c,d,correct_option\n")
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(resp.json()["detail"], "No questions found in the file")
@@ -1,13 +1,18 @@
+import os
 from rest_framework import status, permissions
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from .models import Quiz, Question
-from .serializers import QuizSerializer, QuestionSerializer
+from .models import Quiz
+from .serializers import QuizSerializer
 from attempts.models import Attempt, SavedAnswer
+from attempts.grading import grade_saved_attempt
 from django.shortcuts import get_object_or_404
 from django.utils.timezone import now
 from datetime import timedelta
-from django.db.models import Avg, Count
+from django.db.models import Avg, Count, F, Max, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from backend.pagination import KeysetPaginator, InvalidPageRequest
+from .importing import import_questions, rows_from_list, rows_from_csv_upload, rows_from_jsonl_upload, rows_from_json_upload
 
 
 class QuizCreateView(APIView):
@@ -29,78 +34,137 @@ class QuizCreateView(APIView):
 
 
 class AddQuestionsView(APIView):
+    """
+    POST /api/quiz/<quiz_id>/add-questions/
+    Imports questions into the teacher's quiz, either as JSON {"questions": [...]}
+    or as an uploaded `file` (.csv, .jsonl/.ndjson or a .json array) parsed as it
+    is read. Rows are validated one by one and inserted in batches in a single
+    transaction. A rejected row rolls back the whole import unless `partial=true`.
+    """
     permission_classes = [permissions.IsAuthenticated]
 
+    UPLOAD_READERS = {
+        ".csv": rows_from_csv_upload,
+        ".jsonl": rows_from_jsonl_upload,
+        ".ndjson": rows_from_jsonl_upload,
+        ".json": rows_from_json_upload,
+    }
+
     def post(self, request, quiz_id):
         try:
             quiz = Quiz.objects.get(id=quiz_id, teacher=request.user)
         except Quiz.DoesNotExist:
             return Response({"detail": "Quiz not found or not authorized"}, status=status.HTTP_404_NOT_FOUND)
 
-        questions = request.data.get('questions', [])
-        for q in questions:
-            Question.objects.create(
-                quiz=quiz,
-                text=q['text'],
-                option_a=q['options'][0],
-                option_b=q['options'][1],
-                option_c=q['options'][2],
-                option_d=q['options'][3],
-                correct_option=chr(65 + q['correct']) 
-            )
-
-        return Response({"message": "Questions added successfully!"}, status=status.HTTP_201_CREATED)
+        upload = request.FILES.get('file')
+        if upload is not None:
+            extension = os.path.splitext(upload.name or '')[1].lower()
+            reader = self.UPLOAD_READERS.get(extension)
+            if reader is None:
+                return Response(
+                    {"detail": "Unsupported file type; upload .csv, .jsonl or .json", "supported": sorted(self.UPLOAD_READERS)},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            rows = reader(upload)
+        else:
+            questions = request.data.get('questions', [])
+            if not isinstance(questions, list):
+                return Response({"detail": "questions must be a list"}, status=status.HTTP_400_BAD_REQUEST)
+            rows = rows_from_list(questions)
+
+        partial = str(request.data.get('partial', '')).lower() in ('1', 'true', 'yes')
+        report = import_questions(quiz, rows, partial=partial)
+
+        if report["malformed"]:
+            return Response({"detail": "Could not read the uploaded file", **report}, status=status.HTTP_400_BAD_REQUEST)
+        if report["rejected"] and not partial:
+            return Response({"detail": "Invalid questions", **report}, status=status.HTTP_400_BAD_REQUEST)
+        if upload is not None and not report["created"] and not report["rejected"]:
+            return Response({"detail": "No questions found in the file", **report}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"message": "Questions added successfully!", **report}, status=status.HTTP_201_CREATED)
 
 
 class GetRecentQuizzesView(APIView):
+    """
+    GET /api/quiz/recent-quizzes/?sort=-created_at&limit=50&cursor=...
+    Returns a page of the teacher's quizzes with their attempt counts, plus
+    totals over all of them. `sort` is created_at or attempts (prefix '-' for
+    descending); pass back `next_cursor` as `cursor` for the next page.
+    """
     permission_classes = [permissions.IsAuthenticated]
 
+    paginator = KeysetPaginator({"created_at": "created_at", "attempts": "attempts_count"}, default_sort="-created_at")
+
     def get(self, request):
         user = request.user
-        quizes = Quiz.objects.filter(teacher=user).order_by('-created_at')
+        quizzes_qs = Quiz.objects.filter(teacher=user).annotate(attempts_count=Count("attempts"))
+
+        try:
+            page, page_info = self.paginator.paginate(quizzes_qs, request.query_params)
+        except InvalidPageRequest as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
         data = []
-        for quiz in quizes:
+        for quiz in page:
             data.append({
                 "id": quiz.id,
                 "title": quiz.title,
                 "code": quiz.code,
                 "created_at": quiz.created_at,
                 "total_questions": quiz.total_questions,
-                "attempts_count": quiz.attempts.count()
+                "attempts_count": quiz.attempts_count,
             })
-        return Response(data, status=status.HTTP_200_OK)
+
+        summary = Quiz.objects.filter(teacher=user).aggregate(
+            total=Count("id", distinct=True),
+            attempt_total=Count("attempts"),
+            active=Count("id", distinct=True, filter=Q(attempts__isnull=False)),
+        )
+        return Response({
+            "quizzes": data,
+            "total_quizzes": summary["total"],
+            "total_attempts": summary["attempt_total"],
+            "active_quizzes": summary["active"],
+            **page_info,
+        }, status=status.HTTP_200_OK)
 
 
 
 class GetAllStudentQuizzesView(APIView):
     """
-    GET /api/quiz/<quiz_id>/attempts/
-    Returns list of all students who attempted a specific quiz,
-    with their score, attempt time, and identifying info.
+    GET /api/quiz/<quiz_id>/attempts/?sort=-attempted_at&limit=50&cursor=...
+    Returns a page of the students who attempted a specific quiz, with their
+    score, attempt time and identifying info. `sort` is attempted_at or score
+    (prefix '-' for descending); pass back `next_cursor` as `cursor` for the next page.
     """
     permission_classes = [permissions.IsAuthenticated]  # optional: restrict to teachers
 
+    paginator = KeysetPaginator({"attempted_at": "attempted_at", "score": "score"}, default_sort="-attempted_at")
+
     def get(self, request, quiz_id):
-        # 1️⃣ Verify that the quiz exists
         quiz = get_object_or_404(Quiz, id=quiz_id)
 
-        # 2️⃣ Fetch all attempts for this quiz (order by latest attempt time)
+        # Stats are stored on the attempt at grading time; attempts from before that
+        # (not yet backfilled) are counted in a subquery instead
+        answers = SavedAnswer.objects.filter(attempt=OuterRef("pk")).order_by().values("attempt")
         attempts_qs = (
             Attempt.objects.filter(quiz=quiz)
-            .select_related("student")          # optimize student fetching
-            .order_by("-attempted_at")         # <-- use attempted_at (not created_at)
+            .select_related("student")
+            .annotate(
+                correct_count=Coalesce("correct_answers", Subquery(
+                    answers.filter(selected_option=F("question__correct_option")).annotate(n=Count("id")).values("n")[:1]
+                ), 0),
+                answered_count=Coalesce("total_questions", Subquery(answers.annotate(n=Count("id")).values("n")[:1]), 0),
+            )
         )
 
-        # 3️⃣ Build response data
-        data = []
-        for attempt in attempts_qs:
-            # compute saved answers + correct count
-            saved_answers = SavedAnswer.objects.filter(attempt=attempt).select_related("question")
-            correct_count = sum(
-                sa.selected_option == sa.question.correct_option for sa in saved_answers
-            )
+        try:
+            page, page_info = self.paginator.paginate(attempts_qs, request.query_params)
+        except InvalidPageRequest as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+        data = []
+        for attempt in page:
             data.append({
                 "attempt_id": attempt.id,
                 "student_id": attempt.student.id,
@@ -108,19 +172,23 @@ class GetAllStudentQuizzesView(APIView):
                 "student_email": getattr(attempt.student, "email", None),
                 "quiz_title": quiz.title,
                 "score": round(attempt.score, 2),
-                "correct_answers": correct_count,
-                "total_questions": len(saved_answers),
-                "attempted_at": attempt.attempted_at.isoformat(), 
+                "correct_answers": attempt.correct_count,
+                "total_questions": attempt.answered_count,
+                "attempted_at": attempt.attempted_at.isoformat(),
             })
 
+        summary = Attempt.objects.filter(quiz=quiz).aggregate(total=Count("id"), average=Avg("score"), highest=Max("score"))
         return Response({
             "quiz_id": quiz.id,
             "quiz_title": quiz.title,
-            "total_attempts": len(data),
+            "total_attempts": summary["total"],
+            "average_score": round(summary["average"] or 0, 2),
+            "highest_score": round(summary["highest"] or 0, 2),
             "attempts": data,
             "quiz_code": quiz.code,
+            **page_info,
         }, status=status.HTTP_200_OK)
-    
+
 
 class GetAttemptResultForTeacherView(APIView):
     """
@@ -135,41 +203,18 @@ class GetAttemptResultForTeacherView(APIView):
         except Attempt.DoesNotExist:
             return Response({"detail": "Attempt not found."}, status=status.HTTP_404_NOT_FOUND)
 
-        saved_answers = SavedAnswer.objects.filter(attempt=attempt).select_related("question")
-
-        results = []
-        for sa in saved_answers:
-            q = sa.question
-            option_text_map = {
-                "A": q.option_a,
-                "B": q.option_b,
-                "C": q.option_c,
-                "D": q.option_d,
-            }
-            results.append({
-                "question_id": q.id,
-                "question_text": q.text,
-                "selected_option": sa.selected_option,
-                "selected_option_text": option_text_map.get(sa.selected_option, ""),
-                "correct_option": q.correct_option,
-                "correct_option_text": option_text_map.get(q.correct_option, ""),
-                "is_correct": sa.selected_option == q.correct_option,
-            })
-
-        correct_count = sum(r["is_correct"] for r in results)
-        total_questions = len(results)
-        score = attempt.score
+        graded = grade_saved_attempt(attempt)
 
         return Response({
             "attempt_id": attempt.id,
             "quiz_title": attempt.quiz.title,
             "student_name": attempt.student.get_full_name() or attempt.student.username,
             "student_email": getattr(attempt.student, "email", None),
-            "score": round(score, 2),
-            "correct_answers": correct_count,
-            "total_questions": total_questions,
+            "score": round(attempt.score, 2),
+            "correct_answers": graded.correct_count,
+            "total_questions": graded.total_questions,
             "attempted_at": attempt.attempted_at.isoformat(),
-            "results": results,
+            "results": graded.results,
         }, status=status.HTTP_200_OK)
 
 
@@ -1,4 +1,4 @@
-import React, { useState, useEffect, useMemo } from "react";
+import React, { useState, useEffect } from "react";
 import { useNavigate, Link } from "react-router-dom";
 import { 
   LogOut, 
@@ -19,6 +19,7 @@ function HomeS() {
   const navigate = useNavigate();
   const [loading, setLoading] = useState(true);
   const [attempts, setAttempts] = useState([]);
+  const [stats, setStats] = useState({ total: 0, avg: 0, best: 0 });
   const [code, setCode] = useState("");
   const [verifying, setVerifying] = useState(false);
   const [verifyStatus, setVerifyStatus] = useState({ type: "", message: "" });
@@ -27,8 +28,13 @@ function HomeS() {
   useEffect(() => {
     const fetchAttempts = async () => {
       try {
-        const res = await api.get("/attempts/recent-quizzes/");
-        setAttempts(res.data);
+        const res = await api.get("/attempts/recent-quizzes/", { params: { limit: 5 } });
+        setAttempts(res.data.attempts);
+        setStats({
+          total: res.data.total_attempts,
+          avg: Math.round(res.data.average_score),
+          best: Math.round(res.data.best_score),
+        });
       } catch (err) {
         console.error("Failed to fetch attempts:", err);
       } finally {
@@ -74,18 +80,6 @@ function HomeS() {
     }
   };
 
-  // Compute Stats
-  const stats = useMemo(() => {
-    if (!attempts.length) return { total: 0, avg: 0, best: 0 };
-    
-    const scores = attempts.map(a => a.score);
-    const total = attempts.length;
-    const avg = Math.round(scores.reduce((a, b) => a + b, 0) / total);
-    const best = Math.max(...scores);
-
-    return { total, avg, best };
-  }, [attempts]);
-
   const getScoreColor = (score) => {
     if (score >= 80) return "text-emerald-400 bg-emerald-500/10 border-emerald-500/20";
     if (score >= 50) return "text-violet-400 bg-violet-500/10 border-violet-500/20";
@@ -15,40 +15,44 @@ import api from "../../services/api";
 
 function RecentQuizzes() {
   const [attempts, setAttempts] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [search, setSearch] = useState("");
   const [sortUser, setSortUser] = useState("newest"); // "newest", "oldest", "score_high", "score_low"
   const navigate = useNavigate();
 
+  // Attempts are paginated and sorted by the server
+  const SORT_PARAMS = { newest: "-attempted_at", oldest: "attempted_at", score_high: "-score", score_low: "score" };
+
+  const fetchAttempts = async (cursor = null) => {
+    const res = await api.get("/attempts/recent-quizzes/", {
+      params: { sort: SORT_PARAMS[sortUser], ...(cursor ? { cursor } : {}) },
+    });
+    setAttempts((prev) => (cursor ? [...prev, ...res.data.attempts] : res.data.attempts));
+    setNextCursor(res.data.next_cursor);
+  };
+
   useEffect(() => {
-    const fetchAttempts = async () => {
-      try {
-        const res = await api.get("/attempts/recent-quizzes/");
-        setAttempts(res.data);
-      } catch (error) {
-        console.error("Error fetching recent quizzes:", error);
-      }
-    };
-    fetchAttempts();
-  }, []);
-
-  // Filter & Sort Logic
+    fetchAttempts().catch((error) => console.error("Error fetching recent quizzes:", error));
+  }, [sortUser]);
+
+  const loadMore = async () => {
+    setLoadingMore(true);
+    try {
+      await fetchAttempts(nextCursor);
+    } catch (error) {
+      console.error("Error fetching more attempts:", error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
+  // Search within the loaded pages; order comes from the server
   const filteredAttempts = useMemo(() => {
-    let filtered = attempts.filter(a => 
+    return attempts.filter(a => 
       a.quiz.title.toLowerCase().includes(search.toLowerCase())
     );
-
-    if (sortUser === "newest") {
-      filtered.sort((a, b) => new Date(b.attempted_at) - new Date(a.attempted_at));
-    } else if (sortUser === "oldest") {
-      filtered.sort((a, b) => new Date(a.attempted_at) - new Date(b.attempted_at));
-    } else if (sortUser === "score_high") {
-      filtered.sort((a, b) => b.score - a.score);
-    } else if (sortUser === "score_low") {
-      filtered.sort((a, b) => a.score - b.score);
-    }
-    
-    return filtered;
-  }, [attempts, search, sortUser]);
+  }, [attempts, search]);
 
   const getScoreColor = (score) => {
     if (score >= 80) return "text-emerald-400 bg-emerald-500/10 border-emerald-500/20";
@@ -164,6 +168,18 @@ function RecentQuizzes() {
              )}
            </AnimatePresence>
         </div>
+
+        {nextCursor && (
+           <div className="flex justify-center">
+              <button
+                 onClick={loadMore}
+                 disabled={loadingMore}
+                 className="px-5 py-2.5 rounded-xl bg-slate-800 text-sm text-slate-300 font-medium hover:bg-slate-700 disabled:opacity-50 transition-colors"
+              >
+                 {loadingMore ? "Loading..." : "Load more attempts"}
+              </button>
+           </div>
+        )}
       </div>
     </div>
   );
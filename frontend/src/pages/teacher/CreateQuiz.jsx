@@ -187,7 +187,26 @@ function CreateQuiz() {
         },
       });
 
-      const aiData = aiRes.data.result?.questions || [];
+      // Generation runs in a background job; poll until it finishes, but not forever
+      const POLL_INTERVAL_MS = 2000;
+      const POLL_TIMEOUT_MS = 10 * 60 * 1000;
+      const pollDeadline = Date.now() + POLL_TIMEOUT_MS;
+      let job = aiRes.data;
+      while (job.status === "queued" || job.status === "running") {
+        if (Date.now() > pollDeadline) {
+          await api.post(`/ai/generate-quiz/jobs/${job.job_id}/cancel/`).catch(() => {});
+          throw new Error("Quiz generation timed out, please try again");
+        }
+        await new Promise((resolve) => setTimeout(resolve, POLL_INTERVAL_MS));
+        const jobRes = await api.get(`/ai/generate-quiz/jobs/${job.job_id}/`);
+        job = jobRes.data;
+      }
+
+      if (job.status !== "succeeded") {
+        throw new Error("Quiz generation " + job.status + (job.error ? ": " + job.error : ""));
+      }
+
+      const aiData = job.result?.questions || [];
 
       // Only update local state with AI results, do NOT create quiz yet
       const formatted = aiData.map((q) => ({
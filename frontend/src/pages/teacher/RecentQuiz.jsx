@@ -18,48 +18,52 @@ import api from "../../services/api";
 
 function RecentTeacherQuizzes() {
   const [quizzes, setQuizzes] = useState([]);
+  const [summary, setSummary] = useState({ total_quizzes: 0, total_attempts: 0, active_quizzes: 0 });
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [search, setSearch] = useState("");
   const [sortUser, setSortUser] = useState("newest"); // "newest", "oldest", "attempts"
   const navigate = useNavigate();
 
+  // Quizzes are paginated and sorted by the server
+  const SORT_PARAMS = { newest: "-created_at", oldest: "created_at", attempts: "-attempts" };
+
+  const fetchQuizzes = async (cursor = null) => {
+    const res = await api.get("/quiz/recent-quizzes/", {
+      params: { sort: SORT_PARAMS[sortUser], ...(cursor ? { cursor } : {}) },
+    });
+    setQuizzes((prev) => (cursor ? [...prev, ...res.data.quizzes] : res.data.quizzes));
+    setSummary(res.data);
+    setNextCursor(res.data.next_cursor);
+  };
+
   useEffect(() => {
-    const fetchQuizzes = async () => {
-      try {
-        const res = await api.get("/quiz/recent-quizzes/");
-        setQuizzes(res.data);
-      } catch (err) {
-        console.error("Error fetching teacher quizzes:", err);
-      }
-    };
-    fetchQuizzes();
-  }, []);
+    fetchQuizzes().catch((err) => console.error("Error fetching teacher quizzes:", err));
+  }, [sortUser]);
+
+  const loadMore = async () => {
+    setLoadingMore(true);
+    try {
+      await fetchQuizzes(nextCursor);
+    } catch (err) {
+      console.error("Error fetching more quizzes:", err);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
 
   const copyToClipboard = (code) => {
     navigator.clipboard.writeText(code);
     // Optional: Add toast notification Logic here
   };
 
-  // Filter & Sort Logic
+  // Search within the loaded pages; order comes from the server
   const filteredQuizzes = useMemo(() => {
-    let filtered = quizzes.filter(q => 
+    return quizzes.filter(q => 
       q.title.toLowerCase().includes(search.toLowerCase()) || 
       q.code.toLowerCase().includes(search.toLowerCase())
     );
-
-    if (sortUser === "newest") {
-      filtered.sort((a, b) => new Date(b.created_at) - new Date(a.created_at));
-    } else if (sortUser === "oldest") {
-      filtered.sort((a, b) => new Date(a.created_at) - new Date(b.created_at));
-    } else if (sortUser === "attempts") {
-      filtered.sort((a, b) => b.attempts_count - a.attempts_count);
-    }
-    
-    return filtered;
-  }, [quizzes, search, sortUser]);
-
-  // Summary Stats
-  const totalAttempts = useMemo(() => quizzes.reduce((acc, curr) => acc + curr.attempts_count, 0), [quizzes]);
-  const activeQuizzesCount = useMemo(() => quizzes.filter(q => q.attempts_count > 0).length, [quizzes]);
+  }, [quizzes, search]);
 
   return (
     <div className="min-h-screen bg-slate-950 text-slate-200 font-sans selection:bg-violet-500/30 p-6 md:p-8 lg:p-12">
@@ -95,7 +99,7 @@ function RecentTeacherQuizzes() {
            <div className="bg-slate-900/50 border border-slate-800 p-4 rounded-xl flex items-center justify-between">
               <div>
                 <p className="text-slate-500 text-sm font-medium">Total Quizzes</p>
-                <p className="text-2xl font-bold text-white">{quizzes.length}</p>
+                <p className="text-2xl font-bold text-white">{summary.total_quizzes}</p>
               </div>
               <div className="p-3 bg-violet-500/10 rounded-lg">
                 <Layout className="text-violet-400 w-5 h-5" />
@@ -104,7 +108,7 @@ function RecentTeacherQuizzes() {
            <div className="bg-slate-900/50 border border-slate-800 p-4 rounded-xl flex items-center justify-between">
               <div>
                 <p className="text-slate-500 text-sm font-medium">Total Attempts</p>
-                <p className="text-2xl font-bold text-white">{totalAttempts}</p>
+                <p className="text-2xl font-bold text-white">{summary.total_attempts}</p>
               </div>
               <div className="p-3 bg-fuchsia-500/10 rounded-lg">
                 <Users className="text-fuchsia-400 w-5 h-5" />
@@ -113,7 +117,7 @@ function RecentTeacherQuizzes() {
            <div className="bg-slate-900/50 border border-slate-800 p-4 rounded-xl flex items-center justify-between">
               <div>
                 <p className="text-slate-500 text-sm font-medium">Active (Attempts &gt; 0)</p>
-                <p className="text-2xl font-bold text-white">{activeQuizzesCount}</p>
+                <p className="text-2xl font-bold text-white">{summary.active_quizzes}</p>
               </div>
               <div className="p-3 bg-cyan-500/10 rounded-lg">
                 <BarChart2 className="text-cyan-400 w-5 h-5" />
@@ -212,6 +216,18 @@ function RecentTeacherQuizzes() {
              )}
            </AnimatePresence>
         </div>
+
+        {nextCursor && (
+           <div className="flex justify-center">
+              <button
+                 onClick={loadMore}
+                 disabled={loadingMore}
+                 className="px-5 py-2.5 rounded-xl bg-slate-800 text-sm text-slate-300 font-medium hover:bg-slate-700 disabled:opacity-50 transition-colors"
+              >
+                 {loadingMore ? "Loading..." : "Load more quizzes"}
+              </button>
+           </div>
+        )}
       </div>
     </div>
   );
@@ -74,9 +74,10 @@ function ResultTeacher() {
 
     try {
       const token = localStorage.getItem("access_token");
-      const response = await axios.post(
+      const post = () => axios.post(
         "http://127.0.0.1:8000/api/ai/analyze-weak-topics/",
-        { quiz_results: result.results },
+        // The stored analysis of the attempt is reused; quiz_results is the fallback for unsaved results
+        { attempt_id: result.attempt_id, quiz_results: result.results },
         {
           headers: {
             "Content-Type": "application/json",
@@ -84,6 +85,19 @@ function ResultTeacher() {
           },
         }
       );
+      let response = await post();
+      // 202: a background worker is still analyzing this attempt; poll, but not forever
+      const POLL_INTERVAL_MS = 2000;
+      const POLL_TIMEOUT_MS = 2 * 60 * 1000;
+      const pollDeadline = Date.now() + POLL_TIMEOUT_MS;
+      while (response.status === 202) {
+        if (Date.now() > pollDeadline) {
+          setAnalysisError("Analysis is taking longer than expected. Please try again later.");
+          return;
+        }
+        await new Promise((resolve) => setTimeout(resolve, POLL_INTERVAL_MS));
+        response = await post();
+      }
 
       if (
         response.data &&
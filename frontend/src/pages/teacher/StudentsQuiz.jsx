@@ -23,13 +23,27 @@ function StudentsAttempts() {
   const [error, setError] = useState(null);
   const [search, setSearch] = useState("");
   const [sortUser, setSortUser] = useState("latest"); // "latest", "highest", "lowest"
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const navigate = useNavigate();
 
+  // Attempts are paginated and sorted by the server
+  const SORT_PARAMS = { latest: "-attempted_at", highest: "-score", lowest: "score" };
+
+  const fetchAttempts = async (cursor = null) => {
+    const res = await api.get(`/quiz/${quizId}/attempts/`, {
+      params: { sort: SORT_PARAMS[sortUser], ...(cursor ? { cursor } : {}) },
+    });
+    setQuizData((prev) =>
+      cursor && prev ? { ...res.data, attempts: [...prev.attempts, ...res.data.attempts] } : res.data
+    );
+    setNextCursor(res.data.next_cursor);
+  };
+
   useEffect(() => {
-    const fetchAttempts = async () => {
+    const loadFirstPage = async () => {
       try {
-        const res = await api.get(`/quiz/${quizId}/attempts/`);
-        setQuizData(res.data);
+        await fetchAttempts();
       } catch (err) {
         console.error("Error fetching quiz attempts:", err);
         setError("Could not load student attempts.");
@@ -38,41 +52,39 @@ function StudentsAttempts() {
       }
     };
 
-    fetchAttempts();
-  }, [quizId]);
+    loadFirstPage();
+  }, [quizId, sortUser]);
+
+  const loadMore = async () => {
+    setLoadingMore(true);
+    try {
+      await fetchAttempts(nextCursor);
+    } catch (err) {
+      console.error("Error fetching more attempts:", err);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
 
   const copyToClipboard = (code) => {
     navigator.clipboard.writeText(code);
     // Optional: Add toast notification Logic here
   };
 
-  // Derived Stats
-  const stats = useMemo(() => {
-    if (!quizData?.attempts || quizData.attempts.length === 0) return { avg: 0, highest: 0 };
-    const scores = quizData.attempts.map(a => a.score);
-    const avg = Math.round(scores.reduce((a, b) => a + b, 0) / scores.length);
-    const highest = Math.max(...scores);
-    return { avg, highest };
-  }, [quizData]);
+  // Derived Stats (over every attempt, computed by the server)
+  const stats = useMemo(() => ({
+    avg: Math.round(quizData?.average_score || 0),
+    highest: quizData?.highest_score || 0,
+  }), [quizData]);
 
-  // Filter & Sort Logic
+  // Search within the loaded pages; order comes from the server
   const filteredAttempts = useMemo(() => {
     if (!quizData?.attempts) return [];
 
-    let filtered = quizData.attempts.filter(a => 
+    return quizData.attempts.filter(a => 
       a.student_name.toLowerCase().includes(search.toLowerCase())
     );
-
-    if (sortUser === "latest") {
-      filtered.sort((a, b) => new Date(b.attempted_at) - new Date(a.attempted_at));
-    } else if (sortUser === "highest") {
-      filtered.sort((a, b) => b.score - a.score);
-    } else if (sortUser === "lowest") {
-      filtered.sort((a, b) => a.score - b.score);
-    }
-
-    return filtered;
-  }, [quizData, search, sortUser]);
+  }, [quizData, search]);
 
   const getScoreColor = (score) => {
     if (score >= 80) return "text-emerald-400 bg-emerald-500/10 border-emerald-500/20";
@@ -295,6 +307,18 @@ function StudentsAttempts() {
            )}
         </div>
 
+        {nextCursor && (
+           <div className="flex justify-center">
+              <button
+                 onClick={loadMore}
+                 disabled={loadingMore}
+                 className="px-5 py-2.5 rounded-xl bg-slate-800 text-sm text-slate-300 font-medium hover:bg-slate-700 disabled:opacity-50 transition-colors"
+              >
+                 {loadingMore ? "Loading..." : "Load more attempts"}
+              </button>
+           </div>
+        )}
+
       </div>
     </div>
   );